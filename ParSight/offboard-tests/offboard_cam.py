@@ -3,14 +3,25 @@ import numpy as np
 
 import datetime
 import imageio
+import os
+import sys
+
+# colour profiles are shared with the onboard detector
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsight"))
+from parsight.color_profiles import load_profiles, MultiProfileClassifier
+from parsight.subpixel import refine_blob
+
+# box colour for the non-primary profiles (BGR)
+PROFILE_COLORS = [(0, 165, 255), (255, 0, 255), (255, 255, 0), (0, 255, 255)]
 
 class ColorObjectTracker:
-    def __init__(self):
-        # Target color to track (red), and HSV tolerance values
-        self.target_rgb = (255, 54, 54)
-        self.hue_tol = 10
-        self.sat_tol = 100
-        self.val_tol = 100
+    def __init__(self, profile_names=("red_ball_webcam",), profile_file=None):
+        # Named colour profiles to track, all evaluated in one classification pass
+        # the first one is the primary target used for the assessment counts ('p' cycles it)
+        profiles = load_profiles(profile_file)
+        self.profiles = [profiles[name] for name in profile_names]
+        self.primary = 0
+        self.classifier = MultiProfileClassifier(self.profiles)
 
         self.false_positive_mode = False
         self.false_positive_total_frames = 0
@@ -23,54 +34,52 @@ class ColorObjectTracker:
         self.gif_recording = False
         self.gif_frames = []
 
-        # Initialize color bounds
-        self.set_target_color()
+        # working buffers, sized on the first frame (see setup_buffers)
+        self.buffer_shape = None
 
         # Initialize camera
         self.cap = cv2.VideoCapture(0)
         if not self.cap.isOpened():
             raise Exception("Error: Could not access the camera.")
 
-    def rgb_to_hsv(self):
-        rgb_array = np.uint8([[list(self.target_rgb)]])
-        hsv_array = cv2.cvtColor(rgb_array, cv2.COLOR_RGB2HSV)
-        return tuple(hsv_array[0][0]) 
-
-    def set_target_color(self):
-        hsv_color = self.rgb_to_hsv()
-        h, s, v = hsv_color
-        self.lower_bound = np.array([
-            max(h - self.hue_tol, 0),
-            max(s - self.sat_tol, 0),
-            max(v - self.val_tol, 0)])
-        self.upper_bound = np.array([
-            min(h + self.hue_tol, 179),
-            min(s + self.sat_tol, 255),
-            min(v + self.val_tol, 255)])
-
-    def find_object_contour_and_center(self, frame):
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        mask = cv2.inRange(hsv, self.lower_bound, self.upper_bound)
-        mask = cv2.GaussianBlur(mask, (5, 5), 2)
+    def setup_buffers(self, frame_shape, size=128, display_size=200):
+        # preallocate every per-frame image so the loop does not allocate
+        if self.buffer_shape == frame_shape:
+            return
+        self.buffer_shape = frame_shape
+        min_dim = min(frame_shape[0], frame_shape[1])
+        self.blurred_frame = np.empty((min_dim, min_dim, 3), dtype=np.uint8)
+        self.resized_frame = np.empty((size, size, 3), dtype=np.uint8)
+        self.display_frame = np.empty((display_size, display_size, 3), dtype=np.uint8)
+        self.blurred_masks = [np.empty((size, size), dtype=np.uint8) for _ in self.profiles]
+
+    def find_objects(self, frame):
+        # one classification pass gives a label image per profile
+        labels = self.classifier.classify(frame)
+        return [self.find_object_contour_and_center(label, profile, blurred, i == self.primary)
+                for i, (label, profile, blurred) in enumerate(zip(labels, self.profiles, self.blurred_masks))]
+
+    def find_object_contour_and_center(self, mask, profile, blurred_mask, verbose=False):
+        mask = cv2.GaussianBlur(mask, (profile.blur_size, profile.blur_size), 2, dst=blurred_mask)
         contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         best_contour, best_center, best_score, valid_contours = None, None, 0.0, []
         for cnt in contours:
             valid_contours.append(cnt)
             area = cv2.contourArea(cnt)
             perimeter = cv2.arcLength(cnt, True)
-            if perimeter == 0 or area < 20: continue
+            if perimeter == 0 or area < profile.min_area: continue
             circularity = 4 * np.pi * area / (perimeter ** 2)
-            if circularity > 0.8:
-                score = circularity * 2*np.log(area)
-                if score > best_score and score > 5:
-                    M = cv2.moments(cnt)
-                    if M["m00"] > 0:
-                        cx = int(M["m10"] / M["m00"])
-                        cy = int(M["m01"] / M["m00"])
+            if circularity > profile.min_circularity:
+                score = profile.score(area, circularity)
+                if score > best_score and score > profile.min_score:
+                    # sub-pixel centre from the blurred mask
+                    refined = refine_blob(mask, cv2.boundingRect(cnt))
+                    if refined is not None:
                         best_contour = cnt
-                        best_center = (cx, cy)
+                        best_center = refined[0]
                         best_score = score
-                        print(f"Best contour score: {best_score:.2f}")
+                        if verbose:
+                            print(f"Best contour score: {best_score:.2f}")
         return best_contour, best_center, valid_contours
 
     def start(self):
@@ -81,7 +90,8 @@ class ColorObjectTracker:
                     print("Failed to grab frame.")
                     break
 
-                # Crop to center square
+                # Crop to center square (a view, no copy)
+                self.setup_buffers(frame.shape)
                 h, w, _ = frame.shape
                 min_dim = min(h, w)
                 start_x = (w - min_dim) // 2
@@ -89,11 +99,12 @@ class ColorObjectTracker:
                 cropped_frame = frame[start_y:start_y + min_dim, start_x:start_x + min_dim]
 
                 # Blur and resize
-                blurred_frame = cv2.GaussianBlur(cropped_frame, (5, 5), 0)
-                resized_frame = cv2.resize(blurred_frame, (128, 128))
+                blurred_frame = cv2.GaussianBlur(cropped_frame, (5, 5), 0, dst=self.blurred_frame)
+                resized_frame = cv2.resize(blurred_frame, (128, 128), dst=self.resized_frame)
 
-                # Find object
-                contour, center, valid_contours = self.find_object_contour_and_center(resized_frame)
+                # Find objects, one result per profile
+                results = self.find_objects(resized_frame)
+                contour, center, valid_contours = results[self.primary]
 
                 # --- Evaluation logic ---
                 if self.assessment_mode:
@@ -119,10 +130,17 @@ class ColorObjectTracker:
                     cv2.rectangle(resized_frame, (x, y), (x + w, y + h), (255, 255, 255), 1)
 
                 if center:
-                    cv2.circle(resized_frame, center, 1, (0, 255, 0), -1)
+                    cv2.circle(resized_frame, (int(round(center[0])), int(round(center[1]))), 1, (0, 255, 0), -1)
+
+                # Draw the other profiles' best contours in their own colour
+                for i, (other_contour, _, _) in enumerate(results):
+                    if i == self.primary or other_contour is None:
+                        continue
+                    x, y, w, h = cv2.boundingRect(other_contour)
+                    cv2.rectangle(resized_frame, (x, y), (x + w, y + h), PROFILE_COLORS[i % len(PROFILE_COLORS)], 1)
 
                 # Display
-                display_frame = cv2.resize(resized_frame, (200, 200), interpolation=cv2.INTER_NEAREST)
+                display_frame = cv2.resize(resized_frame, (200, 200), dst=self.display_frame, interpolation=cv2.INTER_NEAREST)
                 # display_frame = cv2.resize(resized_frame, (800, 800), interpolation=cv2.INTER_NEAREST)
                 cv2.imshow('Color Object Tracker', display_frame)
 
@@ -183,6 +201,10 @@ class ColorObjectTracker:
                         else:
                             print("    No frames assessed.")
 
+                elif key == ord('p'):
+                    self.primary = (self.primary + 1) % len(self.profiles)
+                    print(f"🎯 Primary profile: {self.profiles[self.primary].name}")
+
                 elif key == ord('s'):
                     self.gif_recording = not self.gif_recording
                     if self.gif_recording:
@@ -206,7 +228,7 @@ class ColorObjectTracker:
             cv2.destroyAllWindows()
 
 
-# Example usage
+# Example usage: python offboard_cam.py [profile ...], e.g. python offboard_cam.py red_ball_webcam white_ball
 if __name__ == "__main__":
-    tracker = ColorObjectTracker()
+    tracker = ColorObjectTracker(sys.argv[1:] or ("red_ball_webcam",))
     tracker.start()
@@ -0,0 +1,103 @@
+################################################
+# Descriptions
+################################################
+
+'''
+adaptive processing resolution for the compute node
+picks the width the detector runs at from a ladder of levels, using the
+apparent ball radius, the detection confidence, the centre uncertainty and the
+measured stage latency
+scales up when the ball is small, lost, uncertain or its centre is not precise
+enough and there is latency budget left, scales down when the ball is large or
+the stage runs over budget
+a change needs several agreeing frames in a row so the scale does not flicker
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import numpy as np
+
+
+################################################
+# Adaptive Resolution Controller
+################################################
+
+
+class AdaptiveResolutionController:
+
+    def __init__(self, levels=(64, 96, 128, 192, 256), start_width=128,
+                 min_radius_px=4.0, max_radius_px=12.0, min_confidence=0.6, max_center_sigma=None,
+                 latency_budget_s=0.008, latency_smoothing=0.2, patience=5):
+        # processing widths, smallest to largest
+        self.levels = sorted(levels)
+        self.level = int(np.argmin([abs(w - start_width) for w in self.levels]))
+        # ball radius window (in processed pixels) we want to keep the ball inside
+        self.min_radius_px = min_radius_px
+        self.max_radius_px = max_radius_px
+        self.min_confidence = min_confidence
+        # centre standard deviation (in the caller's units) above which more pixels are needed
+        self.max_center_sigma = max_center_sigma
+        # stage latency budget and its exponential moving average
+        self.latency_budget_s = latency_budget_s
+        self.latency_smoothing = latency_smoothing
+        self.latency_s = None
+        # consecutive frames voting for the same change before it happens
+        self.patience = patience
+        self.votes = 0
+
+    @property
+    def width(self):
+        return self.levels[self.level]
+
+    def reset(self, width=None):
+        if width is not None:
+            self.level = int(np.argmin([abs(w - width) for w in self.levels]))
+        self.latency_s = None
+        self.votes = 0
+
+    def predicted_latency(self, level):
+        # detector cost grows with the pixel count
+        return self.latency_s * (self.levels[level] / self.width) ** 2
+
+    def update(self, radius_px, confidence, latency_s, center_sigma=None):
+        # radius/confidence/center_sigma are None when nothing was detected this frame
+        if self.latency_s is None:
+            self.latency_s = latency_s
+        else:
+            self.latency_s += self.latency_smoothing * (latency_s - self.latency_s)
+
+        # decide which way this frame wants to move
+        direction = 0
+        over_budget = self.latency_s > self.latency_budget_s
+        lost = radius_px is None or confidence is None or confidence < self.min_confidence
+        imprecise = self.max_center_sigma is not None and center_sigma is not None and center_sigma > self.max_center_sigma
+        if over_budget:
+            direction = -1
+        elif lost or imprecise or radius_px < self.min_radius_px:
+            direction = 1
+        elif radius_px > self.max_radius_px:
+            direction = -1
+
+        # clamp to the ladder and only scale up if the budget allows it
+        new_level = min(max(self.level + direction, 0), len(self.levels) - 1)
+        if direction > 0 and new_level != self.level and self.predicted_latency(new_level) > self.latency_budget_s:
+            new_level = self.level
+        # a scale up must not push a currently sized ball past the top of the window
+        if direction > 0 and not lost and radius_px * self.levels[new_level] / self.width > self.max_radius_px:
+            new_level = self.level
+
+        # hysteresis: only move after enough agreeing frames
+        if new_level == self.level:
+            self.votes = 0
+            return False
+        if self.votes * direction < 0:
+            self.votes = 0
+        self.votes += direction
+        if abs(self.votes) < self.patience:
+            return False
+        self.level = new_level
+        self.votes = 0
+        return True
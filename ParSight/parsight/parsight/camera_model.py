@@ -0,0 +1,114 @@
+################################################
+# Descriptions
+################################################
+
+'''
+calibrated pinhole camera model for the compute node
+intrinsics and distortion come from ros-bag-scripts/calibrate_camera.py (JSON)
+and are rescaled to whatever size the frames arrive at, since the camera node
+only resizes (x and y scale independently, the optical centre moves with them)
+only the detected centre is undistorted (cv2.undistortPoints back into pixel
+coordinates of the ideal pinhole camera), the image itself never is, so the
+correction costs a few microseconds per frame instead of a full remap
+running this module (python -m parsight.camera_model calibration.json) prints
+the correction across the frame and its cost
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import json
+import time
+
+import cv2
+import numpy as np
+
+
+################################################
+# Camera Model
+################################################
+
+
+class CameraModel:
+
+    def __init__(self, camera_matrix, dist_coeffs, image_size):
+        self.camera_matrix = np.array(camera_matrix, dtype=np.float64).reshape(3, 3)
+        self.dist_coeffs = np.array(dist_coeffs, dtype=np.float64).ravel()
+        self.image_size = tuple(int(v) for v in image_size)
+        # scratch for the single point per frame
+        self.point = np.empty((1, 1, 2), dtype=np.float64)
+        # more iterations than the default 5, strong distortion needs them towards the edge
+        # (past the area the board covered a fitted k3 can fold over and nothing converges,
+        # so calibrate with the board reaching into the corners)
+        self.criteria = (cv2.TERM_CRITERIA_COUNT | cv2.TERM_CRITERIA_EPS, 20, 1e-6)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            calibration = json.load(f)
+        return cls(calibration["camera_matrix"], calibration["dist_coeffs"], calibration["image_size"])
+
+    def save(self, path, **extra):
+        with open(path, "w") as f:
+            json.dump(dict(extra, camera_matrix=self.camera_matrix.tolist(), dist_coeffs=self.dist_coeffs.tolist(),
+                           image_size=list(self.image_size)), f, indent=2)
+
+    def scaled_to(self, width, height):
+        # same camera, frames resized to width x height
+        sx, sy = width / self.image_size[0], height / self.image_size[1]
+        camera_matrix = self.camera_matrix.copy()
+        camera_matrix[0, 0] *= sx
+        camera_matrix[0, 2] = (camera_matrix[0, 2] + 0.5) * sx - 0.5
+        camera_matrix[1, 1] *= sy
+        camera_matrix[1, 2] = (camera_matrix[1, 2] + 0.5) * sy - 0.5
+        return CameraModel(camera_matrix, self.dist_coeffs, (width, height))
+
+    @property
+    def focal_length_pixels(self):
+        # horizontal focal length, what the footprint and metres per pixel maths use
+        return float(self.camera_matrix[0, 0])
+
+    @property
+    def principal_point(self):
+        return float(self.camera_matrix[0, 2]), float(self.camera_matrix[1, 2])
+
+    def undistort(self, point):
+        # pixel in the distorted image -> pixel of the ideal pinhole camera with the same intrinsics
+        self.point[0, 0] = point
+        undistorted = cv2.undistortPoints(self.point, self.camera_matrix, self.dist_coeffs, P=self.camera_matrix,
+                                          criteria=self.criteria)
+        return float(undistorted[0, 0, 0]), float(undistorted[0, 0, 1])
+
+    def normalize(self, point):
+        # pixel in the distorted image -> undistorted direction (x / z, y / z), shared by every camera on the mount
+        self.point[0, 0] = point
+        normalized = cv2.undistortPoints(self.point, self.camera_matrix, self.dist_coeffs, criteria=self.criteria)
+        return float(normalized[0, 0, 0]), float(normalized[0, 0, 1])
+
+    def project(self, direction):
+        # undistorted direction -> pixel in this camera's (distorted) image
+        ray = np.array([[direction[0], direction[1], 1.0]])
+        pixel, _ = cv2.projectPoints(ray, np.zeros(3), np.zeros(3), self.camera_matrix, self.dist_coeffs)
+        return float(pixel[0, 0, 0]), float(pixel[0, 0, 1])
+
+
+################################################
+# Report
+################################################
+
+
+if __name__ == "__main__":
+    import sys
+    model = CameraModel.load(sys.argv[1])
+    width, height = model.image_size
+    print(f"fx {model.camera_matrix[0, 0]:.1f} fy {model.camera_matrix[1, 1]:.1f} | centre {model.principal_point}")
+    for x, y in ((width / 2, height / 2), (width * 0.75, height / 2), (width - 1, height / 2), (width - 1, height - 1)):
+        ux, uy = model.undistort((x, y))
+        print(f"({x:7.1f}, {y:7.1f}) -> ({ux:7.1f}, {uy:7.1f}) | moved {np.hypot(ux - x, uy - y):.2f} px")
+    iterations = 10000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        model.undistort((width * 0.8, height * 0.3))
+    print(f"undistort one centre: {(time.perf_counter() - start) / iterations * 1e6:.1f} us")
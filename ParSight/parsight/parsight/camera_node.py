@@ -6,6 +6,12 @@
 '''
 node subscribes to camera data from rgb_camera topic
 node publishes message with just the image
+when the compute node asks for a fovea (a window around the predicted ball),
+a native resolution crop of it is published alongside, with the crop's place
+in the sensor image as the roi of a CameraInfo with the same stamp
+while the compute node searches (parsight/search_capture), the tracking camera's
+native frames are published on camera/search/image_raw with the view's stamp,
+so a ball too small for the view can still be found
 '''
 
 
@@ -17,11 +23,13 @@ node publishes message with just the image
 # ros imports
 import rclpy
 from rclpy.node import Node
-from sensor_msgs.msg import Image
+from sensor_msgs.msg import Image, CameraInfo, RegionOfInterest
+from std_msgs.msg import Bool
 
 # image related
 import cv2
 from cv_bridge import CvBridge
+import numpy as np
 
 # other imports
 import time
@@ -33,38 +41,121 @@ import threading
 
 from rclpy.qos import QoSProfile, QoSReliabilityPolicy
 
+from parsight.fovea import native_crop
+
 ################################################
 # Class Nodes
 ################################################
 
+# capture loop for one device, every frame is handed to on_frame on this thread
+class FrameReader(threading.Thread):
+
+    def __init__(self, cap, name, on_frame):
+        super().__init__(name=f'capture-{name}', daemon=True)
+        self.cap = cap
+        self.on_frame = on_frame
+        self.running = True
+
+    def run(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            if ret == True:
+                self.on_frame(frame)
+            else:
+                time.sleep(0.005)
+
+    def stop(self):
+        self.running = False
+        self.join(timeout=1.0)
+
+
 # ros2 camera node
 class RGBCameraNode(Node):
 
-    def __init__(self, cap):
+    def __init__(self, cameras):
         super().__init__('rgb_camera_node')
-        # initiate the node
-        self.publisher_ = self.create_publisher(Image, 'camera/image_raw', 1) # qos_profile)
-        self.bridge = CvBridge()
-        self.cap = cap
-        # check for camera starting
-        if not self.cap.isOpened():
-            self.get_logger().error("Failed to open camera!")
-            raise RuntimeError("Failed to open camera!")
-        # create the timer
-        timer_period = 0.01 # 0.017 # seconds
-        self.timer = self.create_timer(timer_period, self.timer_callback)  
+        # one capture thread and topic per camera, the first is the tracking camera
+        self.cameras = []
+        for camera in cameras:
+            cap = cv2.VideoCapture(camera["device"])
+            # check for camera starting
+            if not cap.isOpened():
+                self.get_logger().error(f"Failed to open camera {camera['name']}!")
+                raise RuntimeError(f"Failed to open camera {camera['name']}!")
+            # the sensor size the frames are read at, the view is resized from it
+            if camera.get("capture_size") is not None:
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, camera["capture_size"][0])
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, camera["capture_size"][1])
+            publisher = self.create_publisher(Image, camera["topic"], 1) # qos_profile)
+            self.cameras.append(dict(camera, cap=cap, publisher=publisher))
+        # publish size of the tracking camera, the compute node adapts its processing scale at or below this
+        self.publish_size = self.cameras[0]["publish_size"]
+        # foveated capture on the tracking camera: native crop around the ball on request
+        self.fovea_size = 160           # native pixels per side of the published crop
+        self.fovea_request = None       # (x, y, width, height) in published view pixels, None when off
+        self.fovea_publisher = self.create_publisher(Image, 'camera/foveal', 1)
+        self.fovea_info_publisher = self.create_publisher(CameraInfo, 'camera/foveal/camera_info', 1)
+        self.fovea_subscriber = self.create_subscription(RegionOfInterest, 'parsight/fovea_request', self.fovea_request_callback, 1)
+        # search capture on the tracking camera: native frames while the compute node searches
+        self.search_capture = False
+        self.search_publisher = self.create_publisher(Image, 'camera/search/image_raw', 1)
+        self.search_subscriber = self.create_subscription(Bool, 'parsight/search_capture', self.search_capture_callback, 1)
         # ssed to convert between ROS and OpenCV images
         self.br = CvBridge()
-   
-    def timer_callback(self):
-        ret, frame = self.cap.read()
-        if ret == True:
-            self.publisher_.publish(self.br.cv2_to_imgmsg(cv2.resize(frame, (128, 128))))
-            self.get_logger().info('Publishing video frame')
+        # start capturing, each camera publishes from its own thread
+        self.frame_readers = []
+        for index, camera in enumerate(self.cameras):
+            reader = FrameReader(camera["cap"], camera["name"], lambda frame, index=index: self.frame_callback(index, frame))
+            reader.start()
+            self.frame_readers.append(reader)
+            self.get_logger().info(f"Camera {camera['name']} (device {camera['device']}) on {camera['topic']}")
+
+    def fovea_request_callback(self, msg):
+        # an empty window switches the fovea off
+        self.fovea_request = (msg.x_offset, msg.y_offset, msg.width, msg.height) if msg.width > 0 and msg.height > 0 else None
+
+    def search_capture_callback(self, msg):
+        if msg.data != self.search_capture:
+            self.get_logger().info(f"Search capture {'on' if msg.data else 'off'}")
+        self.search_capture = msg.data
+
+    def frame_callback(self, index, frame):
+        camera = self.cameras[index]
+        # the view and its fovea share a stamp so the compute node can pair them
+        stamp = self.get_clock().now().to_msg()
+        request = self.fovea_request
+        if index == 0 and request is not None:
+            self.publish_fovea(frame, request, stamp)
+        if index == 0 and self.search_capture:
+            search_msg = self.br.cv2_to_imgmsg(frame)
+            search_msg.header.stamp = stamp
+            self.search_publisher.publish(search_msg)
+        view_msg = self.br.cv2_to_imgmsg(cv2.resize(frame, camera["publish_size"]))
+        view_msg.header.stamp = stamp
+        camera["publisher"].publish(view_msg)
+        self.get_logger().debug(f"Publishing {camera['name']} frame")
+
+    def publish_fovea(self, frame, request, stamp):
+        native_size = (frame.shape[1], frame.shape[0])
+        x0, y0, side = native_crop(request, self.publish_size, native_size, self.fovea_size)
+        crop = frame[y0:y0 + side, x0:x0 + side]
+        # a window larger than the fovea is shrunk so the crop size stays fixed
+        if side > self.fovea_size:
+            crop = cv2.resize(crop, (self.fovea_size, self.fovea_size), interpolation=cv2.INTER_AREA)
+        info = CameraInfo()
+        info.header.stamp = stamp
+        info.width, info.height = native_size
+        info.roi.x_offset, info.roi.y_offset, info.roi.width, info.roi.height = x0, y0, side, side
+        self.fovea_info_publisher.publish(info)
+        crop_msg = self.br.cv2_to_imgmsg(np.ascontiguousarray(crop))
+        crop_msg.header.stamp = stamp
+        self.fovea_publisher.publish(crop_msg)
 
     def stop(self):
-        self.frame_reader.stop()
-        self.cap.release()
+        for reader in self.frame_readers:
+            reader.stop()
+        for camera in self.cameras:
+            camera["cap"].release()
 
 ################################################
 # Main
@@ -73,10 +164,18 @@ class RGBCameraNode(Node):
 
 def main(args=None):
 
-    cap = cv2.VideoCapture(0)
+    # tracking camera first, then any extra cameras (e.g. the wide-angle search camera)
+    # capture_size is what the sensor is read at (None keeps the driver's default), the fovea crops
+    # and the search frames come from it, so the tracking camera reads 720p
+    cameras = [
+        {"name": "narrow", "device": 0, "topic": "camera/image_raw", "publish_size": (256, 256), "capture_size": (1280, 720)},
+    ]
+    wide_camera_device = None           # device index of the wide-angle search camera, None for tracking only
+    if wide_camera_device is not None:
+        cameras.append({"name": "wide", "device": wide_camera_device, "topic": "camera/wide/image_raw", "publish_size": (256, 256)})
 
     rclpy.init(args=args)
-    node = RGBCameraNode(cap)
+    node = RGBCameraNode(cameras)
     try:
         rclpy.spin(node)
     except KeyboardInterrupt:
@@ -0,0 +1,213 @@
+################################################
+# Descriptions
+################################################
+
+'''
+named colour profiles for the ball detectors
+a profile holds the target colour and HSV tolerances, the HSV bands to reject
+(grass, sky) and the contour scoring thresholds, so switching ball type is a
+profile switch instead of a different script
+profiles ship with the defaults below and can be extended or overridden from a
+JSON file of {name: {field: value}}
+MultiProfileClassifier evaluates several profiles in one pass: one colour
+conversion, then three lookup tables give every pixel a bit per profile, and
+every profile gets its own label image from that single pass
+running this file directly checks the labels against per-profile inRange
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import json
+
+import cv2
+import numpy as np
+
+BLUR_SIGMA = 2.0    # gaussian sigma of the mask blur, the sub-pixel uncertainty depends on it
+GREEN_BAND = ([35, 50, 50], [85, 255, 255])
+BLUE_BAND = ([90, 50, 50], [130, 255, 255])
+
+
+################################################
+# Colour Profile
+################################################
+
+
+class ColorProfile:
+
+    FIELDS = ("target_rgb", "hue_tol", "sat_tol", "val_tol", "reject_bands",
+              "blur_size", "min_area", "min_circularity", "min_score")
+
+    def __init__(self, name, target_rgb, hue_tol=10, sat_tol=100, val_tol=100, reject_bands=(),
+                 blur_size=9, min_area=20, min_circularity=0.8, min_score=5.0):
+        self.name = name
+        self.target_rgb = tuple(target_rgb)
+        self.hue_tol, self.sat_tol, self.val_tol = hue_tol, sat_tol, val_tol
+        # HSV boxes removed from the target mask (low, high), inclusive like inRange
+        self.reject_bands = [(np.array(low), np.array(high)) for low, high in reject_bands]
+        # blur and contour scoring used by the detectors
+        self.blur_size = blur_size
+        self.min_area = min_area
+        self.min_circularity = min_circularity
+        self.min_score = min_score
+        self.lower_bound, self.upper_bound = self.hsv_bounds()
+
+    def hsv_bounds(self):
+        # set the colour and give bounds for tolerance
+        rgb_array = np.uint8([[list(self.target_rgb)]])
+        h, s, v = (int(c) for c in cv2.cvtColor(rgb_array, cv2.COLOR_RGB2HSV)[0][0])
+        lower = np.array([max(h - self.hue_tol, 0), max(s - self.sat_tol, 0), max(v - self.val_tol, 0)])
+        upper = np.array([min(h + self.hue_tol, 179), min(s + self.sat_tol, 255), min(v + self.val_tol, 255)])
+        return lower, upper
+
+    def score(self, area, circularity):
+        # the offboard trackers' score: round and large wins
+        return circularity * 2 * np.log(area)
+
+    def to_dict(self):
+        fields = {name: getattr(self, name) for name in self.FIELDS}
+        fields["reject_bands"] = [(low.tolist(), high.tolist()) for low, high in self.reject_bands]
+        return dict(fields, name=self.name)
+
+    @classmethod
+    def from_dict(cls, fields):
+        return cls(**fields)
+
+
+DEFAULT_PROFILES = {
+    # red ball in flight, grass and sky rejected
+    "red_ball": ColorProfile("red_ball", (200, 29, 32), 10, 100, 100, [GREEN_BAND, BLUE_BAND], blur_size=9),
+    # red ball on the laptop webcam (offboard_cam.py)
+    "red_ball_webcam": ColorProfile("red_ball_webcam", (255, 54, 54), 10, 100, 100, blur_size=5, min_score=5.0),
+    # white ball on grass (grass_version.py)
+    "white_ball": ColorProfile("white_ball", (252, 253, 253), 20, 50, 100, blur_size=5, min_score=7.0),
+}
+
+
+def load_profiles(path=None):
+    # defaults, then anything in the JSON file (new names or overrides)
+    profiles = dict(DEFAULT_PROFILES)
+    if path:
+        with open(path) as f:
+            for name, fields in json.load(f).items():
+                profiles[name] = ColorProfile(name, **fields)
+    return profiles
+
+
+def mask_profile(frame, profile, buf):
+    # target mask minus the profile's reject bands, blurred, all into the pool buffers
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=buf.hsv)
+
+    # Main target mask
+    cv2.inRange(hsv, profile.lower_bound, profile.upper_bound, dst=buf.target_mask)
+
+    # Remove the reject bands (e.g. green & blue, we want areas *not* green/blue)
+    mask = buf.target_mask
+    if profile.reject_bands:
+        cv2.inRange(hsv, profile.reject_bands[0][0], profile.reject_bands[0][1], dst=buf.reject_mask)
+        for low, high in profile.reject_bands[1:]:
+            cv2.inRange(hsv, low, high, dst=buf.band_mask)
+            cv2.bitwise_or(buf.reject_mask, buf.band_mask, dst=buf.reject_mask)
+        cv2.bitwise_not(buf.reject_mask, dst=buf.reject_mask)
+        mask = cv2.bitwise_and(buf.target_mask, buf.reject_mask, dst=buf.combined_mask)
+
+    # Blur to reduce noise
+    return cv2.GaussianBlur(mask, (profile.blur_size, profile.blur_size), BLUR_SIGMA, dst=buf.blurred_mask)
+
+
+################################################
+# Multi Profile Classifier
+################################################
+
+
+class MultiProfileClassifier:
+
+    MAX_PROFILES = 8
+    MAX_BANDS = 8
+
+    def __init__(self, profiles):
+        if len(profiles) > self.MAX_PROFILES:
+            raise ValueError(f"At most {self.MAX_PROFILES} profiles can share one pass")
+        self.profiles = list(profiles)
+        self.shape = None
+        self.build_tables()
+
+    def build_tables(self):
+        # per channel 16 bit codes: bits 0..7 are profile targets, bits 8..15 the distinct reject bands
+        lut = np.zeros((3, 256), dtype=np.uint16)
+        values = np.arange(256)
+        bands = []
+        self.keep_bits, self.test_bits = [], []
+        for i, profile in enumerate(self.profiles):
+            lut[(values >= profile.lower_bound[:, None]) & (values <= profile.upper_bound[:, None])] |= np.uint16(1 << i)
+            reject = 0
+            for low, high in profile.reject_bands:
+                key = (tuple(low), tuple(high))
+                if key not in bands:
+                    if len(bands) == self.MAX_BANDS:
+                        raise ValueError(f"At most {self.MAX_BANDS} distinct reject bands can share one pass")
+                    bands.append(key)
+                    lut[(values >= np.array(low)[:, None]) & (values <= np.array(high)[:, None])] |= np.uint16(1 << (7 + len(bands)))
+                reject |= 1 << (8 + bands.index(key))
+            # a pixel belongs to profile i when its target bit is set and none of its reject bits are
+            self.keep_bits.append(1 << i)
+            self.test_bits.append((1 << i) | reject)
+        # cv2.LUT wants a 1x256 table with one channel per image channel
+        self.lut = np.ascontiguousarray(lut.T.reshape(1, 256, 3))
+
+    def allocate(self, shape):
+        self.shape = shape
+        self.hsv = np.empty(shape, dtype=np.uint8)
+        self.channel_codes = np.empty(shape, dtype=np.uint16)
+        self.planes = [np.empty(shape[:2], dtype=np.uint16) for _ in range(3)]
+        self.masked = np.empty(shape[:2], dtype=np.uint16)
+        self.labels = [np.empty(shape[:2], dtype=np.uint8) for _ in self.profiles]
+
+    def classify(self, frame):
+        # one colour conversion and one table lookup serve every profile
+        if self.shape != frame.shape:
+            self.allocate(frame.shape)
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=self.hsv)
+        cv2.LUT(hsv, self.lut, dst=self.channel_codes)
+        h, s, v = cv2.split(self.channel_codes, self.planes)
+        codes = cv2.bitwise_and(h, s, dst=self.planes[0])
+        codes = cv2.bitwise_and(codes, v, dst=self.planes[0])
+        # per-profile label image (0/255): target bit set, no reject bit set
+        for i, (keep, test) in enumerate(zip(self.keep_bits, self.test_bits)):
+            cv2.bitwise_and(codes, test, dst=self.masked)
+            cv2.compare(self.masked, keep, cv2.CMP_EQ, dst=self.labels[i])
+        return self.labels
+
+
+################################################
+# Verification
+################################################
+
+
+def reference_mask(frame, profile):
+    # per-profile opencv path the classifier has to match
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, profile.lower_bound, profile.upper_bound)
+    for low, high in profile.reject_bands:
+        mask = cv2.bitwise_and(mask, cv2.bitwise_not(cv2.inRange(hsv, low, high)))
+    return mask
+
+
+if __name__ == "__main__":
+    import time
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (256, 256, 3), dtype=np.uint8)
+    profiles = list(DEFAULT_PROFILES.values())
+    classifier = MultiProfileClassifier(profiles)
+    labels = classifier.classify(frame)
+    for i, profile in enumerate(profiles):
+        same = np.array_equal(labels[i], reference_mask(frame, profile))
+        print(f"{profile.name:>16}: identical to inRange path: {same}")
+    for name, fn in (("one pass", lambda: classifier.classify(frame)),
+                     ("per profile", lambda: [reference_mask(frame, p) for p in profiles])):
+        start = time.perf_counter()
+        for _ in range(500):
+            fn()
+        print(f"{name:>16}: {(time.perf_counter() - start) / 500 * 1000:.3f} ms for {len(profiles)} profiles")
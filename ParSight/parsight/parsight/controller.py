@@ -0,0 +1,147 @@
+################################################
+# Descriptions
+################################################
+
+'''
+control laws used by the compute node to turn pixel error into a setpoint offset
+every law runs on a fixed-rate tick with a fixed dt, so its behaviour no longer
+depends on how fast camera frames arrive
+the derivative is taken per new estimate (observe) over the time between the
+estimates and held between ticks, a tick never differentiates a held error
+a setpoint rate limiter bounds the velocity and acceleration of the commanded
+position before the safety clamp is applied
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import numpy as np
+
+
+################################################
+# Control Laws
+################################################
+
+
+class PDController:
+
+    def __init__(self, Kp, Kd, derivative_tau=0.05):
+        # gains act on a 2D pixel error (x, y) and output a 2D position offset
+        self.Kp = Kp
+        self.Kd = Kd
+        # time constant of the first-order low pass on the derivative term
+        self.derivative_tau = derivative_tau
+        self.reset()
+
+    def reset(self):
+        # forget the history so the next update does not see a fake jump
+        self.prev_error = None
+        self.prev_time = None
+        self.d_error = np.zeros(2)
+
+    def observe(self, error, timestamp):
+        # every new estimate (in or out of the tolerance band) with its capture time in seconds,
+        # updates the first-order filtered derivative, the first sample after a reset has none
+        error = np.asarray(error, dtype=float)
+        if self.prev_error is not None:
+            dt = timestamp - self.prev_time
+            if dt <= 0:
+                return self.d_error
+            raw_d_error = (error - self.prev_error) / dt
+            alpha = dt / (self.derivative_tau + dt)
+            self.d_error = self.d_error + alpha * (raw_d_error - self.d_error)
+        self.prev_error = error
+        self.prev_time = timestamp
+        return self.d_error
+
+    def update(self, error, dt, error_rate=None):
+        # the derivative is the one held from the last observed estimate
+        error = np.asarray(error, dtype=float)
+        return self.Kp * error + self.Kd * self.d_error
+
+
+class PIDController(PDController):
+
+    def __init__(self, Kp, Ki, Kd, derivative_tau=0.05, integral_limit=50.0):
+        # integral_limit bounds the accumulated pixel-seconds (anti-windup)
+        self.Ki = Ki
+        self.integral_limit = integral_limit
+        super().__init__(Kp, Kd, derivative_tau)
+
+    def reset(self):
+        super().reset()
+        self.integral = np.zeros(2)
+
+    def update(self, error, dt, error_rate=None):
+        error = np.asarray(error, dtype=float)
+        # integrate, then clamp so a long saturation cannot wind the term up
+        self.integral = np.clip(self.integral + error * dt, -self.integral_limit, self.integral_limit)
+        return self.Kp * error + self.Ki * self.integral + self.Kd * self.d_error
+
+
+class FeedForwardPDController(PDController):
+
+    def __init__(self, Kp, Kd, Kff, derivative_tau=0.05):
+        # Kff scales the measured error rate (pixels/s between detections) into a lead term
+        self.Kff = Kff
+        super().__init__(Kp, Kd, derivative_tau)
+
+    def update(self, error, dt, error_rate=None):
+        output = super().update(error, dt)
+        if error_rate is not None:
+            output = output + self.Kff * np.asarray(error_rate, dtype=float)
+        return output
+
+
+def make_controller(control_law, Kp, Kd, Ki=0.0, Kff=0.0, derivative_tau=0.05, integral_limit=50.0):
+    # build one of the interchangeable laws by name
+    if control_law == "pd":
+        return PDController(Kp, Kd, derivative_tau)
+    if control_law == "pid":
+        return PIDController(Kp, Ki, Kd, derivative_tau, integral_limit)
+    if control_law == "pd_ff":
+        return FeedForwardPDController(Kp, Kd, Kff, derivative_tau)
+    raise ValueError(f"Unknown control law '{control_law}' (expected 'pd', 'pid' or 'pd_ff')")
+
+
+################################################
+# Setpoint Rate Limiter
+################################################
+
+
+class SetpointRateLimiter:
+
+    def __init__(self, max_velocity, max_acceleration):
+        # limits in m/s and m/s^2 on the horizontal setpoint
+        self.max_velocity = max_velocity
+        self.max_acceleration = max_acceleration
+        self.reset()
+
+    def reset(self, position=None):
+        # start from the given position (or wherever the first target is) at rest
+        self.position = None if position is None else np.asarray(position, dtype=float)
+        self.velocity = np.zeros(2)
+
+    def step(self, target, dt):
+        target = np.asarray(target, dtype=float)
+        if self.position is None:
+            self.position = target.copy()
+            return self.position.copy()
+        # velocity needed to reach the target this tick, capped in magnitude
+        # and slowed near the target so it can brake without overshooting
+        error = target - self.position
+        braking_speed = (2.0 * self.max_acceleration * np.linalg.norm(error)) ** 0.5
+        desired_velocity = self.limit_norm(error / dt, min(self.max_velocity, braking_speed))
+        # the change in velocity is capped by the acceleration limit
+        dv = self.limit_norm(desired_velocity - self.velocity, self.max_acceleration * dt)
+        self.velocity = self.velocity + dv
+        self.position = self.position + self.velocity * dt
+        return self.position.copy()
+
+    def limit_norm(self, vector, limit):
+        norm = np.linalg.norm(vector)
+        if norm > limit > 0:
+            return vector * (limit / norm)
+        return vector
@@ -0,0 +1,155 @@
+################################################
+# Descriptions
+################################################
+
+'''
+colour blob detection stage of the compute node
+masks the frame with a colour profile (target colour minus its reject bands,
+green and blue for the red ball), blurs and returns every
+blob as a candidate (center, radius, quality, sigma) in the pixels of the frame
+it was given, either through opencv or through the optional fused kernel
+centre and radius are sub-pixel (see subpixel.py), sigma is the standard
+deviation of the centre in pixels
+holds no tracking state, so the node, pipeline workers and offline tools can
+each run their own copy from the same config
+frames at or above tiled_min_height are masked in parallel stripes
+with a verifier model the top candidates are checked by the patch classifier
+extra profiles are classified in the same pass as the main one
+(MultiProfileClassifier: one colour conversion and lookup for all of them),
+detect returns the main profile's candidates and detect_all every profile's,
+this path replaces the fused kernel and the stripes while extras are set
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import cv2
+import numpy as np
+
+from parsight.color_profiles import BLUR_SIGMA, ColorProfile, MultiProfileClassifier, mask_profile
+from parsight.frame_buffers import FrameBufferPool
+from parsight.fused_kernel import FusedDetector
+from parsight.subpixel import refine_blob
+from parsight.tiled_mask import TiledMasker
+from parsight.verifier import CandidateVerifier
+
+
+################################################
+# Colour Blob Detector
+################################################
+
+
+class ColorBlobDetector:
+
+    def __init__(self, profile, min_blob_area=4, use_fused_kernel=False, tiled_min_height=480, mask_threads=4,
+                 verifier_model=None, verifier_top_k=4, verifier_drop_unverified=False, extra_profiles=()):
+        self.min_blob_area = min_blob_area
+        self.use_fused_kernel = use_fused_kernel
+        self.buffers = FrameBufferPool()
+        # optional fused kernel, only used when numba is installed
+        self.fused_detector = FusedDetector(min_blob_pixels=min_blob_area)
+        # other profiles classified alongside the main one, blurred labels per profile and frame shape
+        self.extra_profiles = [p if isinstance(p, ColorProfile) else ColorProfile.from_dict(p) for p in extra_profiles]
+        self.classifier = None
+        self.blurred_labels = {}
+        self.set_profile(profile)
+        # stripe-parallel masking for high resolution frames, pool created on first use
+        self.tiled_min_height = tiled_min_height
+        self.mask_threads = mask_threads
+        self.tiled_masker = None
+        # optional patch classifier on the top ranked candidates
+        self.verifier_model = verifier_model
+        self.verifier_top_k = verifier_top_k
+        self.verifier_drop_unverified = verifier_drop_unverified
+        self.verifier = CandidateVerifier(verifier_model, verifier_top_k, drop_unverified=verifier_drop_unverified) \
+            if verifier_model else None
+
+    def set_profile(self, profile):
+        # accepts a ColorProfile or its dict form (from config())
+        self.profile = profile if isinstance(profile, ColorProfile) else ColorProfile.from_dict(profile)
+        self.fused_bounds = self.fused_detector.pack_bounds(
+            self.profile.lower_bound, self.profile.upper_bound, self.profile.reject_bands)
+        # the main profile goes first in the shared pass, an extra of the same name is not classified twice
+        if self.extra_profiles:
+            self.profiles = [self.profile] + [p for p in self.extra_profiles if p.name != self.profile.name]
+            self.classifier = MultiProfileClassifier(self.profiles)
+            self.blurred_labels = {}
+
+    def config(self):
+        # everything needed to build an identical detector in another process
+        return {
+            "profile": self.profile.to_dict(),
+            "min_blob_area": self.min_blob_area, "use_fused_kernel": self.use_fused_kernel,
+            "tiled_min_height": self.tiled_min_height, "mask_threads": self.mask_threads,
+            "verifier_model": self.verifier_model, "verifier_top_k": self.verifier_top_k,
+            "verifier_drop_unverified": self.verifier_drop_unverified,
+            "extra_profiles": [p.to_dict() for p in self.extra_profiles]}
+
+    @property
+    def fused(self):
+        return self.use_fused_kernel and self.fused_detector.available
+
+    def detect(self, frame):
+        # candidates (center, radius, quality, sigma) in the pixels of this frame
+        if self.classifier is not None:
+            return self.detect_all(frame)[self.profile.name]
+        if self.fused:
+            candidates = self.fused_detector.detect(frame, self.fused_bounds)
+        else:
+            candidates = self.find_candidates(self.compute_mask(frame))
+        if self.verifier is not None:
+            candidates = self.verifier.verify(frame, candidates)
+        return candidates
+
+    def detect_all(self, frame):
+        # {profile name: candidates} for the main and every extra profile, from one classification pass
+        if self.classifier is None:
+            return {self.profile.name: self.detect(frame)}
+        labels = self.classifier.classify(frame)
+        if frame.shape not in self.blurred_labels:
+            self.blurred_labels[frame.shape] = [np.empty(frame.shape[:2], dtype=np.uint8) for _ in self.profiles]
+        candidates = {}
+        for profile, label, blurred in zip(self.profiles, labels, self.blurred_labels[frame.shape]):
+            cv2.GaussianBlur(label, (profile.blur_size, profile.blur_size), BLUR_SIGMA, dst=blurred)
+            candidates[profile.name] = self.find_candidates(blurred)
+        if self.verifier is not None:
+            candidates[self.profile.name] = self.verifier.verify(frame, candidates[self.profile.name])
+        return candidates
+
+    def compute_mask(self, frame):
+        # large frames go through the stripe-parallel path
+        if frame.shape[0] >= self.tiled_min_height:
+            if self.tiled_masker is None:
+                self.tiled_masker = TiledMasker(n_stripes=self.mask_threads, n_threads=self.mask_threads)
+            return self.tiled_masker.compute_mask(frame, self.profile)
+        # every stage writes into the preallocated buffers (resized if the frame changes)
+        self.buffers.ensure(frame.shape)
+        return mask_profile(frame, self.profile, self.buffers)
+
+    def close(self):
+        # the stripe pool's threads, a later large frame starts a new pool
+        if self.tiled_masker is not None:
+            self.tiled_masker.shutdown()
+            self.tiled_masker = None
+
+    def find_candidates(self, blurred_mask):
+        # every external contour is a candidate
+        contours, _ = cv2.findContours(blurred_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        detections = []
+        for cnt in contours:
+            area = cv2.contourArea(cnt)
+            if area < self.min_blob_area:
+                continue
+            # sub-pixel centre and radius from the blurred mask under the contour's box
+            refined = refine_blob(blurred_mask, cv2.boundingRect(cnt), BLUR_SIGMA)
+            if refined is None:
+                continue
+            center, radius, sigma, _ = refined
+            perimeter = cv2.arcLength(cnt, True)
+            # roundness is the per-detection quality the track confidence builds on
+            circularity = min(4 * np.pi * area / perimeter ** 2, 1.0) if perimeter > 0 else 0.0
+            detections.append((center, radius, circularity, sigma))
+        return detections
+
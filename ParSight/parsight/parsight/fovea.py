@@ -0,0 +1,124 @@
+################################################
+# Descriptions
+################################################
+
+'''
+geometry of foveated capture, shared by the camera node and the compute node
+the compute node asks for a window around the predicted ball in the pixels of
+the low resolution view it receives, the camera node turns that into a crop of
+the native sensor image (at least fovea_size native pixels, moved inside the
+frame, shrunk to fovea_size if the ball needs a larger window so the crop is
+always the same size) and reports the crop as the roi of a CameraInfo
+candidates found in the crop are mapped back to view pixels, so the ball is
+detected at native pixel density while everything downstream keeps working in
+the view's coordinates
+running this module (python -m parsight.fovea) compares detection on the view
+alone with detection on the fovea for a small ball on a large sensor image
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import time
+
+import cv2
+import numpy as np
+
+
+################################################
+# Geometry
+################################################
+
+
+def request_window(center, radius, margin, min_half, view_size):
+    # (x, y, width, height) in view pixels around the predicted ball, clipped to the view
+    half = max(margin * radius, min_half)
+    x0, y0 = max(int(np.floor(center[0] - half)), 0), max(int(np.floor(center[1] - half)), 0)
+    x1, y1 = min(int(np.ceil(center[0] + half)) + 1, view_size[0]), min(int(np.ceil(center[1] + half)) + 1, view_size[1])
+    return x0, y0, max(x1 - x0, 0), max(y1 - y0, 0)
+
+
+def native_crop(request, view_size, native_size, fovea_size):
+    # square native crop (x, y, side) covering the requested view window, kept inside the sensor image
+    x, y, w, h = request
+    sx, sy = native_size[0] / view_size[0], native_size[1] / view_size[1]
+    center = ((x + w / 2) * sx, (y + h / 2) * sy)
+    side = int(min(max(w * sx, h * sy, fovea_size), native_size[0], native_size[1]))
+    x0 = int(round(min(max(center[0] - side / 2, 0), native_size[0] - side)))
+    y0 = int(round(min(max(center[1] - side / 2, 0), native_size[1] - side)))
+    return x0, y0, side
+
+
+def crop_to_view(candidates, roi, crop_size, native_size, view_size):
+    # candidates in published crop pixels -> view pixels (pixel centres at integer coordinates)
+    x_offset, y_offset, roi_width, roi_height = roi
+    cx, cy = roi_width / crop_size[0], roi_height / crop_size[1]
+    vx, vy = view_size[0] / native_size[0], view_size[1] / native_size[1]
+    mapped = []
+    for (u, v), radius, quality, sigma in candidates:
+        x = (x_offset + (u + 0.5) * cx) * vx - 0.5
+        y = (y_offset + (v + 0.5) * cy) * vy - 0.5
+        scale = cx * vx
+        mapped.append(((x, y), radius * scale, quality, sigma * scale))
+    return mapped
+
+
+def inside(point, window):
+    x, y, w, h = window
+    return x <= point[0] < x + w and y <= point[1] < y + h
+
+
+################################################
+# Benchmark
+################################################
+
+
+def benchmark(native_size=(1280, 960), view_size=(256, 256), fovea_size=160, trials=200):
+    from parsight.color_profiles import DEFAULT_PROFILES
+    from parsight.detector import ColorBlobDetector
+    rng = np.random.default_rng(0)
+    background = np.clip(rng.normal((40, 140, 60), 20, (native_size[1], native_size[0], 3)), 0, 255).astype(np.uint8)
+    view_detector = ColorBlobDetector(DEFAULT_PROFILES["red_ball"])
+    fovea_detector = ColorBlobDetector(DEFAULT_PROFILES["red_ball"])
+    view = np.empty((view_size[1], view_size[0], 3), dtype=np.uint8)
+    frame = np.empty_like(background)
+    sx = view_size[0] / native_size[0]
+    view_errors, fovea_errors, view_missed, view_time, fovea_time = [], [], 0, 0.0, 0.0
+    for _ in range(trials):
+        # a ball about 6 native pixels across, a little over one pixel in the view
+        center = rng.uniform(100, native_size[0] - 100), rng.uniform(100, native_size[1] - 100)
+        np.copyto(frame, background)
+        cv2.circle(frame, (int(round(center[0] * 16)), int(round(center[1] * 16))), 3 * 16, (32, 29, 200), -1, shift=4)
+        truth = ((center[0] + 0.5) * sx - 0.5, (center[1] + 0.5) * view_size[1] / native_size[1] - 0.5)
+
+        start = time.perf_counter()
+        cv2.resize(frame, view_size, dst=view, interpolation=cv2.INTER_AREA)
+        found = view_detector.detect(view)
+        view_time += time.perf_counter() - start
+        if found:
+            c = min(found, key=lambda d: np.hypot(d[0][0] - truth[0], d[0][1] - truth[1]))[0]
+            view_errors.append(np.hypot(c[0] - truth[0], c[1] - truth[1]))
+        else:
+            view_missed += 1
+
+        # request around a predicted centre that is a couple of view pixels off
+        predicted = (truth[0] + rng.normal(0, 2), truth[1] + rng.normal(0, 2))
+        request = request_window(predicted, 1.0, 4.0, 8, view_size)
+        start = time.perf_counter()
+        x0, y0, side = native_crop(request, view_size, native_size, fovea_size)
+        crop = frame[y0:y0 + side, x0:x0 + side]
+        mapped = crop_to_view(fovea_detector.detect(crop), (x0, y0, side, side), (side, side), native_size, view_size)
+        fovea_time += time.perf_counter() - start
+        if mapped:
+            c = min(mapped, key=lambda d: np.hypot(d[0][0] - truth[0], d[0][1] - truth[1]))[0]
+            fovea_errors.append(np.hypot(c[0] - truth[0], c[1] - truth[1]))
+    print(f" view only: missed {view_missed}/{trials} | centre error {np.mean(view_errors):.3f} view px | "
+          f"{view_time / trials * 1000:.3f} ms (resize + detect)")
+    print(f"     fovea: missed {trials - len(fovea_errors)}/{trials} | centre error {np.mean(fovea_errors):.3f} view px | "
+          f"{fovea_time / trials * 1000:.3f} ms (crop + detect)")
+
+
+if __name__ == "__main__":
+    benchmark()
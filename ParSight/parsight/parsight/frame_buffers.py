@@ -0,0 +1,151 @@
+################################################
+# Descriptions
+################################################
+
+'''
+pool of working images for the per-frame vision pipeline
+buffers are sized on the first frame and handed to opencv through dst= so
+the steady state allocates nothing per frame (reallocated only if the
+incoming frame shape changes)
+running this file directly benchmarks the allocating path against the pooled one
+(python -m parsight.frame_buffers); measured on one desktop core the two are
+level at 128x128, where the allocations are small enough for the allocator's
+free lists, and the pooled path is about a third faster in mean and p99 from
+640x480 up (partly from the folded reject mask, one pass fewer)
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import cv2
+import numpy as np
+import time
+
+
+################################################
+# Buffer Pool
+################################################
+
+
+class FrameBufferPool:
+
+    def __init__(self):
+        self.shape = None
+        # working images for the current shape (None until the first ensure/allocate)
+        self.hsv = None
+        self.target_mask = None
+        self.band_mask = None
+        self.reject_mask = None
+        self.combined_mask = None
+        self.blurred_mask = None
+        # buffer sets already allocated, keyed by frame shape, so switching
+        # between processing resolutions does not reallocate
+        self.cache = {}
+        self.scaled_frames = {}
+
+    def ensure(self, shape):
+        # (re)allocate only when the frame shape (height, width, channels) changes
+        shape = tuple(shape)
+        if self.shape == shape:
+            return False
+        if shape in self.cache:
+            self.shape = shape
+            (self.hsv, self.target_mask, self.band_mask, self.reject_mask,
+             self.combined_mask, self.blurred_mask) = self.cache[shape]
+            return False
+        self.allocate(shape)
+        self.cache[shape] = (self.hsv, self.target_mask, self.band_mask, self.reject_mask,
+                             self.combined_mask, self.blurred_mask)
+        return True
+
+    def scaled_frame(self, width, height, channels=3):
+        # destination for resizing the incoming frame to a processing resolution
+        key = (height, width, channels)
+        if key not in self.scaled_frames:
+            self.scaled_frames[key] = np.empty(key, dtype=np.uint8)
+        return self.scaled_frames[key]
+
+    def allocate(self, shape):
+        height, width = shape[:2]
+        self.shape = tuple(shape)
+        # colour conversion output
+        self.hsv = np.empty((height, width, 3), dtype=np.uint8)
+        # single channel masks used by the colour filter
+        self.target_mask = np.empty((height, width), dtype=np.uint8)
+        self.band_mask = np.empty((height, width), dtype=np.uint8)
+        self.reject_mask = np.empty((height, width), dtype=np.uint8)
+        self.combined_mask = np.empty((height, width), dtype=np.uint8)
+        self.blurred_mask = np.empty((height, width), dtype=np.uint8)
+
+
+################################################
+# Benchmark
+################################################
+
+
+def percentile_report(name, times):
+    times_ms = times * 1000
+    print(f"{name:>10}: mean {times_ms.mean():.3f} ms | p50 {np.percentile(times_ms, 50):.3f} ms | p99 {np.percentile(times_ms, 99):.3f} ms")
+
+
+def benchmark(sizes=((128, 128), (640, 480), (1280, 720)), iterations=2000, rounds=5):
+    import tracemalloc
+    lower, upper = np.array([0, 50, 50]), np.array([10, 255, 255])
+    lower_green, upper_green = np.array([35, 50, 50]), np.array([85, 255, 255])
+    lower_blue, upper_blue = np.array([90, 50, 50]), np.array([130, 255, 255])
+
+    for size in sizes:
+        frame = np.random.randint(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+        iterations_here = max(iterations * 128 * 128 // (size[0] * size[1]), 200)
+
+        def allocating():
+            hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+            target_mask = cv2.inRange(hsv, lower, upper)
+            not_green = cv2.bitwise_not(cv2.inRange(hsv, lower_green, upper_green))
+            not_blue = cv2.bitwise_not(cv2.inRange(hsv, lower_blue, upper_blue))
+            combined_mask = cv2.bitwise_and(cv2.bitwise_and(target_mask, not_green), not_blue)
+            return cv2.GaussianBlur(combined_mask, (9, 9), 2)
+
+        pool = FrameBufferPool()
+        pool.ensure(frame.shape)
+
+        def pooled():
+            cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=pool.hsv)
+            cv2.inRange(pool.hsv, lower, upper, dst=pool.target_mask)
+            cv2.inRange(pool.hsv, lower_green, upper_green, dst=pool.reject_mask)
+            cv2.inRange(pool.hsv, lower_blue, upper_blue, dst=pool.band_mask)
+            cv2.bitwise_or(pool.reject_mask, pool.band_mask, dst=pool.reject_mask)
+            cv2.bitwise_not(pool.reject_mask, dst=pool.reject_mask)
+            cv2.bitwise_and(pool.target_mask, pool.reject_mask, dst=pool.combined_mask)
+            return cv2.GaussianBlur(pool.combined_mask, (9, 9), 2, dst=pool.blurred_mask)
+
+        # both paths must give identical masks
+        assert np.array_equal(allocating(), pooled())
+
+        # rounds alternate between the paths so drift (clock, cache, other load) hits both alike,
+        # the allocation is traced in a separate pass so tracing does not distort the timings
+        print(f"{size[0]}x{size[1]}, {iterations_here} frames x {rounds} rounds")
+        paths = (("allocating", allocating), ("pooled", pooled))
+        peaks = {}
+        for name, fn in paths:
+            tracemalloc.start()
+            for _ in range(20):
+                fn()
+            peaks[name] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        times = {name: np.empty((rounds, iterations_here)) for name, _ in paths}
+        for r in range(rounds):
+            for name, fn in paths:
+                for i in range(iterations_here):
+                    t = time.perf_counter()
+                    fn()
+                    times[name][r, i] = time.perf_counter() - t
+        for name, _ in paths:
+            percentile_report(name, times[name].ravel())
+            print(f"{'':>10}  peak traced allocation {peaks[name] / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,274 @@
+################################################
+# Descriptions
+################################################
+
+'''
+frame-level pipelining of the detection stage across worker processes
+frames are copied once into a ring of shared memory slots and only the slot
+index goes to a worker, each worker has its own task queue (a worker killed
+inside a shared queue's get would leave its lock held for everyone) and its
+own ColorBlobDetector, and sends back the candidates, a frame goes to the
+ready worker with the fewest frames outstanding
+results come back out of order, so they are held and released strictly by
+sequence number, the node applies them in order and controls on the latest
+when every slot is busy the new frame is dropped so latency stays bounded
+a result that does not come back within result_timeout is skipped and counted
+as lost, so one lost frame cannot hold back every later one
+workers report ready once their detector is built, the pipeline is only ready
+(and the node only submits) once one has, so start-up stays out of the stats
+dead workers are respawned up to max_restarts times, after that the pipeline
+reports failed and the node goes back to sequential detection
+a new detector config (colour profile switch) is queued to every worker
+between its frames, so the switch happens without respawning anything
+latency added by the pipeline and throughput are kept for reporting
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from collections import deque
+import queue
+import time
+
+import cv2
+import numpy as np
+
+from parsight.detector import ColorBlobDetector
+
+
+################################################
+# Worker
+################################################
+
+
+def apply_config(detector, config, new_config):
+    # a profile switch is applied in place, anything else builds a new detector
+    if detector is not None and {k: v for k, v in config.items() if k != "profile"} == \
+            {k: v for k, v in new_config.items() if k != "profile"}:
+        detector.set_profile(new_config["profile"])
+        return detector
+    if detector is not None:
+        detector.close()
+    return ColorBlobDetector(**new_config)
+
+
+def worker_main(index, detector_config, shm_name, slot_bytes, task_queue, result_queue):
+    # attach to the shared slots and detect until told to stop
+    # one opencv thread per worker, the pool itself provides the parallelism
+    cv2.setNumThreads(1)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    detector = ColorBlobDetector(**detector_config)
+    result_queue.put(("ready", index))
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            # a new config applies to every frame queued after it
+            if task[0] == "config":
+                detector = apply_config(detector, detector_config, task[1])
+                detector_config = task[1]
+                continue
+            _, seq, slot, shape = task
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+            start = time.perf_counter()
+            try:
+                detections = [((float(c[0]), float(c[1])), float(r), float(q), float(s)) for c, r, q, s in detector.detect(frame)]
+                error = None
+            except Exception as e:
+                detections, error = [], str(e)
+            del frame
+            result_queue.put(("result", seq, slot, detections, time.perf_counter() - start, error))
+    finally:
+        detector.close()
+        shm.close()
+
+
+################################################
+# Frame Pipeline
+################################################
+
+
+class FramePipeline:
+
+    def __init__(self, detector_config, max_shape, n_workers=3, n_slots=None, stats_window=200,
+                 result_timeout=0.5, max_restarts=3):
+        self.detector_config = detector_config
+        self.config_version = 0
+        self.max_shape = tuple(max_shape)
+        self.n_workers = n_workers
+        # two slots per worker lets one frame wait while another is processed
+        self.n_slots = n_slots or 2 * n_workers
+        self.slot_bytes = int(np.prod(self.max_shape))
+        self.result_timeout = result_timeout
+        self.max_restarts = max_restarts
+        self.shm = None
+        self.workers = []
+        self.task_queues = []
+        self.ready_workers = set()
+        self.restarts = 0
+        self.failed = False
+        # ordering state, slot_owner is the sequence a slot was last handed out for
+        self.next_seq = 0
+        self.next_apply = 0
+        self.pending = {}
+        self.done = {}
+        self.free_slots = deque(range(self.n_slots))
+        self.slot_owner = [None] * self.n_slots
+        # reporting
+        self.latencies = deque(maxlen=stats_window)
+        self.worker_latencies = deque(maxlen=stats_window)
+        self.completed_times = deque(maxlen=stats_window)
+        self.dropped = 0
+        self.lost = 0
+        self.errors = 0
+
+    @property
+    def ready(self):
+        # at least one live worker has its detector built
+        return bool(self.ready_workers) and not self.failed
+
+    def start(self):
+        # spawn, not fork, since the ROS node already runs threads
+        self.context = mp.get_context("spawn")
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * self.n_slots)
+        self.result_queue = self.context.Queue()
+        for index in range(self.n_workers):
+            self.task_queues.append(None)
+            self.workers.append(self.spawn(index))
+
+    def spawn(self, index):
+        # a fresh task queue each time, the new worker starts from the current config
+        self.task_queues[index] = self.context.Queue()
+        worker = self.context.Process(target=worker_main, daemon=True, args=(
+            index, self.detector_config, self.shm.name, self.slot_bytes, self.task_queues[index], self.result_queue))
+        worker.start()
+        return worker
+
+    def stop(self):
+        for task_queue in self.task_queues:
+            task_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=1.0)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = []
+        self.ready_workers.clear()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def revive(self):
+        # respawn dead workers, returns how many had died (failed once max_restarts is used up)
+        dead = [index for index, worker in enumerate(self.workers) if not worker.is_alive()]
+        for index in dead:
+            self.ready_workers.discard(index)
+            if self.restarts >= self.max_restarts:
+                self.failed = True
+                continue
+            self.restarts += 1
+            # frames queued to the dead worker are skipped as lost once their deadline passes
+            self.workers[index] = self.spawn(index)
+        return len(dead)
+
+    def reconfigure(self, detector_config):
+        # every worker applies the new config before the next frame it is given
+        self.detector_config = detector_config
+        self.config_version += 1
+        for task_queue in self.task_queues:
+            task_queue.put(("config", detector_config))
+
+    def submit(self, frame, context=None):
+        # copy the frame into a free slot, returns False when the frame had to be dropped
+        self.collect()
+        if not self.free_slots or not self.ready_workers or frame.nbytes > self.slot_bytes:
+            self.dropped += 1
+            return False
+        # the ready worker with the fewest frames still outstanding
+        outstanding = {index: 0 for index in self.ready_workers}
+        for seq, entry in self.pending.items():
+            if seq not in self.done and entry[4] in outstanding:
+                outstanding[entry[4]] += 1
+        worker = min(outstanding, key=outstanding.get)
+        slot = self.free_slots.popleft()
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+        np.copyto(view, frame)
+        seq = self.next_seq
+        self.next_seq += 1
+        self.slot_owner[slot] = seq
+        self.pending[seq] = (context, time.perf_counter(), slot, self.config_version, worker)
+        self.task_queues[worker].put(("frame", seq, slot, frame.shape))
+        return True
+
+    def collect(self):
+        # pull every finished result off the queue and free its slot
+        while True:
+            try:
+                message = self.result_queue.get_nowait()
+            except queue.Empty:
+                return
+            if message[0] == "ready":
+                self.ready_workers.add(message[1])
+                continue
+            _, seq, slot, detections, worker_latency, error = message
+            # a late result for a skipped frame, its slot was already given back
+            if self.slot_owner[slot] != seq:
+                continue
+            self.slot_owner[slot] = None
+            self.free_slots.append(slot)
+            if error is not None:
+                self.errors += 1
+            self.done[seq] = (detections, worker_latency)
+
+    def skip_lost(self):
+        # the oldest outstanding frame is past its deadline: give its slot back and move on
+        slot = self.pending.pop(self.next_apply)[2]
+        if self.slot_owner[slot] == self.next_apply:
+            self.slot_owner[slot] = None
+            self.free_slots.append(slot)
+        self.lost += 1
+        self.next_apply += 1
+
+    def poll(self):
+        # results in sequence order as (context, detections, worker latency, pipeline latency)
+        self.collect()
+        ready = []
+        now = time.perf_counter()
+        while self.next_apply in self.pending:
+            if self.next_apply not in self.done:
+                if now - self.pending[self.next_apply][1] > self.result_timeout:
+                    self.skip_lost()
+                    continue
+                break
+            detections, worker_latency = self.done.pop(self.next_apply)
+            context, submit_time, _, version, _ = self.pending.pop(self.next_apply)
+            self.next_apply += 1
+            # detected with a config that has since been replaced, not worth acting on
+            if version != self.config_version:
+                continue
+            self.latencies.append(now - submit_time)
+            self.worker_latencies.append(worker_latency)
+            self.completed_times.append(now)
+            ready.append((context, detections, worker_latency, now - submit_time))
+        return ready
+
+    def stats(self):
+        # throughput over the window, and the latency the pipeline adds on top of detection
+        if len(self.completed_times) < 2:
+            return None
+        span = self.completed_times[-1] - self.completed_times[0]
+        latencies = np.array(self.latencies)
+        added = latencies - np.array(self.worker_latencies)
+        return {
+            "fps": (len(self.completed_times) - 1) / span if span > 0 else 0.0,
+            "latency_mean": float(latencies.mean()),
+            "latency_p95": float(np.percentile(latencies, 95)),
+            "added_latency_mean": float(added.mean()),
+            "dropped": self.dropped,
+            "lost": self.lost,
+            "errors": self.errors}
@@ -0,0 +1,283 @@
+################################################
+# Descriptions
+################################################
+
+'''
+optional fused detection kernel for the compute node
+one pass over the BGR frame converts each pixel to HSV (same integer maths as
+cv2.COLOR_BGR2HSV), applies the target range and the green/blue rejection, and
+accumulates per-tile moment sums (count, x, y, xx, yy, xy)
+neighbouring active tiles are then merged into blobs, which become candidate
+centroids for the tracker, so the mask, blur, contour and moments passes of the
+opencv path collapse into a single cache friendly sweep
+compiled with numba on first use, when numba is not installed the node keeps
+using the opencv path
+running this file directly checks the kernel bit for bit against opencv
+(mask and moment sums) and times both paths
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import numpy as np
+import time
+
+# optional, without numba FusedDetector.available is False
+try:
+    import numba
+except ImportError:
+    numba = None
+
+HSV_SHIFT = 12
+
+
+################################################
+# Lookup Tables (match opencv's 8 bit BGR2HSV)
+################################################
+
+
+def hsv_division_tables():
+    # opencv rounds (255 << 12) / v and (180 << 12) / (6 * diff) to the nearest int
+    sdiv = np.zeros(256, dtype=np.int32)
+    hdiv = np.zeros(256, dtype=np.int32)
+    i = np.arange(1, 256, dtype=np.float64)
+    sdiv[1:] = np.round((255 << HSV_SHIFT) / i).astype(np.int32)
+    hdiv[1:] = np.round((180 << HSV_SHIFT) / (6.0 * i)).astype(np.int32)
+    return sdiv, hdiv
+
+
+################################################
+# Kernels (plain python, jitted on first use)
+################################################
+
+
+def fused_classify_tiles(frame, bounds, tile, sdiv, hdiv, sums, mask, write_mask):
+    # bounds rows: target low, target high, then (low, high) pairs of rejection ranges
+    height, width = frame.shape[0], frame.shape[1]
+    n_reject = (bounds.shape[0] - 2) // 2
+    round_half = 1 << (HSV_SHIFT - 1)
+    sums[:] = 0
+    for y in range(height):
+        ty = y // tile
+        for x in range(width):
+            b = np.int32(frame[y, x, 0])
+            g = np.int32(frame[y, x, 1])
+            r = np.int32(frame[y, x, 2])
+            # value and saturation first, most pixels fail before hue is needed
+            v = max(b, max(g, r))
+            keep = bounds[0, 2] <= v <= bounds[1, 2]
+            if keep:
+                diff = v - min(b, min(g, r))
+                s = (diff * sdiv[v] + round_half) >> HSV_SHIFT
+                keep = bounds[0, 1] <= s <= bounds[1, 1]
+            if keep:
+                if v == r:
+                    h = g - b
+                elif v == g:
+                    h = b - r + 2 * diff
+                else:
+                    h = r - g + 4 * diff
+                h = (h * hdiv[diff] + round_half) >> HSV_SHIFT
+                if h < 0:
+                    h += 180
+                keep = bounds[0, 0] <= h <= bounds[1, 0]
+            # every rejection range must miss
+            if keep:
+                for k in range(n_reject):
+                    lo = 2 + 2 * k
+                    if (bounds[lo, 0] <= h <= bounds[lo + 1, 0] and bounds[lo, 1] <= s <= bounds[lo + 1, 1]
+                            and bounds[lo, 2] <= v <= bounds[lo + 1, 2]):
+                        keep = False
+                        break
+            if write_mask:
+                mask[y, x] = 255 if keep else 0
+            if keep:
+                tx = x // tile
+                sums[ty, tx, 0] += 1
+                sums[ty, tx, 1] += x
+                sums[ty, tx, 2] += y
+                sums[ty, tx, 3] += x * x
+                sums[ty, tx, 4] += y * y
+                sums[ty, tx, 5] += x * y
+
+
+def merge_tiles(sums, min_tile_pixels, labels, blobs):
+    # 8-connected flood fill over active tiles, each blob sums its tiles' moments
+    n_ty, n_tx = sums.shape[0], sums.shape[1]
+    labels[:] = -1
+    stack = np.empty((n_ty * n_tx, 2), dtype=np.int64)
+    n_blobs = 0
+    for sy in range(n_ty):
+        for sx in range(n_tx):
+            if labels[sy, sx] >= 0 or sums[sy, sx, 0] < min_tile_pixels or n_blobs >= blobs.shape[0]:
+                continue
+            blobs[n_blobs, :] = 0
+            labels[sy, sx] = n_blobs
+            stack[0, 0], stack[0, 1] = sy, sx
+            top = 1
+            while top > 0:
+                top -= 1
+                cy, cx = stack[top, 0], stack[top, 1]
+                for m in range(6):
+                    blobs[n_blobs, m] += sums[cy, cx, m]
+                for dy in range(-1, 2):
+                    for dx in range(-1, 2):
+                        ny, nx = cy + dy, cx + dx
+                        if 0 <= ny < n_ty and 0 <= nx < n_tx and labels[ny, nx] < 0 and sums[ny, nx, 0] >= min_tile_pixels:
+                            labels[ny, nx] = n_blobs
+                            stack[top, 0], stack[top, 1] = ny, nx
+                            top += 1
+            n_blobs += 1
+    return n_blobs
+
+
+################################################
+# Fused Detector
+################################################
+
+
+class FusedDetector:
+
+    def __init__(self, tile=8, min_tile_pixels=2, min_blob_pixels=4, max_blobs=32):
+        self.tile = tile
+        self.min_tile_pixels = min_tile_pixels
+        self.min_blob_pixels = min_blob_pixels
+        self.max_blobs = max_blobs
+        self.sdiv, self.hdiv = hsv_division_tables()
+        self.available = numba is not None
+        self.classify = None
+        self.merge = None
+        self.shape = None
+
+    def compile(self):
+        # jit on first use so importing the node stays cheap
+        if self.classify is None:
+            self.classify = numba.njit(cache=True, nogil=True)(fused_classify_tiles)
+            self.merge = numba.njit(cache=True, nogil=True)(merge_tiles)
+
+    def allocate(self, shape):
+        # tile sums, tile labels and blob table sized once per frame shape
+        self.shape = shape
+        n_ty = -(-shape[0] // self.tile)
+        n_tx = -(-shape[1] // self.tile)
+        self.sums = np.zeros((n_ty, n_tx, 6), dtype=np.int64)
+        self.labels = np.empty((n_ty, n_tx), dtype=np.int64)
+        self.blobs = np.zeros((self.max_blobs, 6), dtype=np.int64)
+        self.no_mask = np.empty((1, 1), dtype=np.uint8)
+
+    def pack_bounds(self, lower, upper, reject_ranges):
+        rows = [lower, upper]
+        for low, high in reject_ranges:
+            rows.extend([low, high])
+        return np.array(rows, dtype=np.int32)
+
+    def run(self, frame, bounds, mask=None):
+        # returns the (n, 6) moment table of the merged blobs
+        self.compile()
+        if self.shape != frame.shape:
+            self.allocate(frame.shape)
+        write_mask = mask is not None
+        self.classify(frame, bounds, self.tile, self.sdiv, self.hdiv, self.sums,
+                      mask if write_mask else self.no_mask, write_mask)
+        n_blobs = self.merge(self.sums, self.min_tile_pixels, self.labels, self.blobs)
+        return self.blobs[:n_blobs]
+
+    def detect(self, frame, bounds):
+        # candidates as (center, radius, quality, sigma) in frame pixels
+        detections = []
+        for m00, m10, m01, m20, m02, m11 in self.run(frame, bounds):
+            if m00 < self.min_blob_pixels:
+                continue
+            cx, cy = m10 / m00, m01 / m00
+            # a filled disc of area A has det(cov) = (A / 4pi)^2, so compare the two areas
+            var_x = m20 / m00 - cx * cx
+            var_y = m02 / m00 - cy * cy
+            cov_xy = m11 / m00 - cx * cy
+            det = max(var_x * var_y - cov_xy * cov_xy, 0.0)
+            disc_area = 4 * np.pi * det ** 0.5
+            quality = min(m00, disc_area) / max(m00, disc_area) if disc_area > 0 else 0.0
+            # pixel count moments are already sub-pixel, sigma from the 0/1 edge model (subpixel.binary_center_sigma)
+            radius = (m00 / np.pi) ** 0.5
+            detections.append(((cx, cy), radius, quality, 1.0 / np.sqrt(12 * np.pi * max(radius, 0.5))))
+        return detections
+
+
+################################################
+# Verification and Benchmark
+################################################
+
+
+def opencv_mask(frame, lower, upper, reject_ranges):
+    # the existing opencv classification, before the blur
+    import cv2
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, lower, upper)
+    for low, high in reject_ranges:
+        mask = cv2.bitwise_and(mask, cv2.bitwise_not(cv2.inRange(hsv, low, high)))
+    return mask
+
+
+def tile_sums_from_mask(mask, tile):
+    # reference tile moments computed with numpy from a mask
+    ys, xs = np.nonzero(mask)
+    xs, ys = xs.astype(np.int64), ys.astype(np.int64)
+    n_ty, n_tx = -(-mask.shape[0] // tile), -(-mask.shape[1] // tile)
+    sums = np.zeros((n_ty, n_tx, 6), dtype=np.int64)
+    index = (ys // tile, xs // tile)
+    for m, values in enumerate((np.ones_like(xs), xs, ys, xs * xs, ys * ys, xs * ys)):
+        np.add.at(sums[..., m], index, values)
+    return sums
+
+
+def verify(frame, lower, upper, reject_ranges, tile=8):
+    # bit exact check of the fused kernel against opencv (works without numba, just slowly)
+    detector = FusedDetector(tile=tile)
+    bounds = detector.pack_bounds(lower, upper, reject_ranges)
+    reference = opencv_mask(frame, lower, upper, reject_ranges)
+    detector.allocate(frame.shape)
+    mask = np.empty(frame.shape[:2], dtype=np.uint8)
+    if detector.available:
+        detector.run(frame, bounds, mask)
+    else:
+        fused_classify_tiles(frame, bounds, tile, detector.sdiv, detector.hdiv, detector.sums, mask, True)
+    mask_ok = np.array_equal(mask, reference)
+    sums_ok = np.array_equal(detector.sums, tile_sums_from_mask(reference, tile))
+    return mask_ok, sums_ok
+
+
+def benchmark(size=128, iterations=2000):
+    import cv2
+    lower, upper = np.array([170, 131, 100]), np.array([179, 255, 255])
+    reject_ranges = [(np.array([35, 50, 50]), np.array([85, 255, 255])),
+                     (np.array([90, 50, 50]), np.array([130, 255, 255]))]
+    rng = np.random.default_rng(0)
+    # uniform noise hits every branch of the hsv maths, grass-like noise is what we fly over
+    noise = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    mask_ok, sums_ok = verify(noise, lower, upper, reject_ranges)
+    print(f"bit exact mask: {mask_ok} | bit exact tile moments: {sums_ok}")
+    frame = np.clip(rng.normal((40, 140, 60), 20, (size, size, 3)), 0, 255).astype(np.uint8)
+    cv2.circle(frame, (size // 3, size // 2), size // 12, (32, 29, 200), -1)
+    if numba is None:
+        print("numba not installed, skipping timing")
+        return
+
+    detector = FusedDetector()
+    bounds = detector.pack_bounds(lower, upper, reject_ranges)
+    detector.detect(frame, bounds)
+
+    def opencv_path():
+        mask = cv2.GaussianBlur(opencv_mask(frame, lower, upper, reject_ranges), (9, 9), 2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return [cv2.moments(c) for c in contours]
+
+    for name, fn in (("opencv", opencv_path), ("fused", lambda: detector.detect(frame, bounds))):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        print(f"{name:>7}: {(time.perf_counter() - start) / iterations * 1000:.3f} ms per frame")
+
+
+if __name__ == "__main__":
+    benchmark()
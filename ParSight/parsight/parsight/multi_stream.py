@@ -0,0 +1,212 @@
+################################################
+# Descriptions
+################################################
+
+'''
+extra camera streams for the compute node (e.g. a wide-angle search camera
+next to the narrow tracking camera)
+every CameraStream runs its own detector and candidate tracker on its own
+thread, always on the newest frame (older ones are dropped), and keeps its
+target as a direction: undistorted normalised image coordinates, which any
+other camera on the same mount can turn back into its own pixels
+fuse_estimates merges the per-camera targets, once in the same pixels, into
+one estimate: the most precise one and every other one that agrees with it,
+weighted by inverse variance
+StreamStats keeps throughput, detection latency and frame age per stream
+the detector and tracker belong to the stream's thread: a colour profile
+switch is posted with set_profile and applied by that thread between frames,
+and an exception on a frame is logged and counted without stopping the thread
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+from collections import deque
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from parsight.camera_model import CameraModel
+from parsight.detector import ColorBlobDetector
+from parsight.tracker import MultiTargetTracker
+
+
+################################################
+# Stream Stats
+################################################
+
+
+class StreamStats:
+
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.ages = deque(maxlen=window)
+        self.times = deque(maxlen=window)
+        self.dropped = 0
+        self.errors = 0
+
+    def record(self, latency, age, now):
+        # latency: detection stage, age: capture to result
+        self.latencies.append(latency)
+        self.ages.append(age)
+        self.times.append(now)
+
+    def summary(self):
+        if len(self.times) < 2:
+            return None
+        span = self.times[-1] - self.times[0]
+        latencies = np.array(self.latencies)
+        return {
+            "fps": (len(self.times) - 1) / span if span > 0 else 0.0,
+            "latency_mean": float(latencies.mean()),
+            "latency_p95": float(np.percentile(latencies, 95)),
+            "age_mean": float(np.mean(self.ages)),
+            "dropped": self.dropped,
+            "errors": self.errors}
+
+
+################################################
+# Camera Stream
+################################################
+
+
+class CameraStream:
+
+    def __init__(self, name, topic, detector_config, process_width=128, hfov_deg=None, vfov_deg=None,
+                 calibration=None, track_gate_fraction=0.15, logger=None):
+        self.name = name
+        self.logger = logger
+        self.topic = topic
+        self.detector = ColorBlobDetector(**detector_config)
+        self.process_width = process_width
+        # geometry: a calibration file, or the field of view for an ideal pinhole camera
+        self.hfov_deg, self.vfov_deg = hfov_deg, vfov_deg
+        self.calibration = calibration
+        self.camera_model = None
+        self.track_gate_fraction = track_gate_fraction
+        self.tracker = None
+        self.frame_size = None
+        self.stats = StreamStats()
+        # newest frame slot and the latest estimate, shared with the ROS thread
+        self.condition = threading.Condition()
+        self.pending = None
+        self.pending_profile = None
+        self.estimate = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=f"stream-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+
+    def submit(self, frame, capture_time):
+        # newest frame wins, a frame still waiting is dropped
+        with self.condition:
+            if self.pending is not None:
+                self.stats.dropped += 1
+            self.pending = (frame, capture_time)
+            self.condition.notify()
+
+    def set_profile(self, profile):
+        # applied by the stream's thread before its next frame, never while it detects
+        with self.condition:
+            self.pending_profile = profile
+
+    def setup(self, frame):
+        height, width = frame.shape[:2]
+        self.frame_size = (width, height)
+        if self.calibration is not None:
+            self.camera_model = CameraModel.load(self.calibration).scaled_to(width, height)
+        else:
+            fx = (width / 2) / np.tan(np.radians(self.hfov_deg) / 2)
+            fy = (height / 2) / np.tan(np.radians(self.vfov_deg) / 2) if self.vfov_deg else fx
+            self.camera_model = CameraModel([[fx, 0, (width - 1) / 2], [0, fy, (height - 1) / 2], [0, 0, 1]], [], (width, height))
+        self.tracker = MultiTargetTracker(gate_px=self.track_gate_fraction * width)
+        self.process_scale = min(self.process_width / width, 1.0)
+        self.process_size = (int(round(width * self.process_scale)), int(round(height * self.process_scale)))
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    self.detector.close()
+                    return
+                frame, capture_time = self.pending
+                self.pending = None
+                profile, self.pending_profile = self.pending_profile, None
+                # the old colour's target says nothing about the new one
+                if profile is not None:
+                    self.estimate = None
+            start = time.perf_counter()
+            try:
+                if profile is not None:
+                    self.detector.set_profile(profile)
+                    if self.tracker is not None:
+                        self.tracker.reset()
+                self.process(frame, capture_time)
+            except Exception as e:
+                # one bad frame must not end the stream for the rest of the flight
+                self.stats.errors += 1
+                if self.stats.errors == 1 or self.stats.errors % 100 == 0:
+                    message = f"camera {self.name} frame failed ({self.stats.errors} so far): {e!r}"
+                    if self.logger is not None:
+                        self.logger.error(message)
+                    else:
+                        print(message)
+                continue
+            now = time.time()
+            self.stats.record(time.perf_counter() - start, now - capture_time, now)
+
+    def process(self, frame, capture_time):
+        if self.frame_size is None:
+            self.setup(frame)
+        scale = self.process_scale
+        small = frame if scale == 1.0 else cv2.resize(frame, self.process_size, interpolation=cv2.INTER_AREA)
+        detections = [((c[0] / scale, c[1] / scale), r / scale, q, s / scale) for c, r, q, s in self.detector.detect(small)]
+        target = self.tracker.update(detections, capture_time)
+        if target is None:
+            return
+        # direction of the ball, and its uncertainty in the same normalised units
+        direction = self.camera_model.normalize(target.position)
+        sigma = target.sigma / self.camera_model.focal_length_pixels
+        with self.condition:
+            self.estimate = (direction, sigma, target.confidence, capture_time)
+
+    def latest(self, now, max_age):
+        # the last estimate if it is recent enough
+        with self.condition:
+            estimate = self.estimate
+        if estimate is None or now - estimate[3] > max_age:
+            return None
+        return estimate
+
+
+################################################
+# Fusion
+################################################
+
+
+def fuse_estimates(estimates, gate):
+    # estimates: (center, sigma, confidence) in the same pixels -> one (center, sigma, confidence) or None
+    if not estimates:
+        return None
+    anchor = min(estimates, key=lambda e: e[1])
+    members = [e for e in estimates if np.hypot(e[0][0] - anchor[0][0], e[0][1] - anchor[0][1]) <= gate]
+    weights = np.array([1.0 / max(e[1], 1e-3) ** 2 for e in members])
+    centers = np.array([e[0] for e in members], dtype=float)
+    center = (weights[:, None] * centers).sum(axis=0) / weights.sum()
+    return (float(center[0]), float(center[1])), float(weights.sum() ** -0.5), max(e[2] for e in members)
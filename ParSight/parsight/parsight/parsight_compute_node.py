@@ -7,6 +7,8 @@ node subscribes to camera data from rgb_camera topic
 node computes the bounding box via red colour mask
 node computes the distances and sends vision_pose and setpoint_position 
 accordingly to move the amount required
+while searching, the camera node is asked for its native frames and the ball
+is looked for in those (masked in parallel stripes) instead of the small view
 '''
 
 
@@ -22,7 +24,8 @@ from std_srvs.srv import Trigger
 # ros imports for realsense and mavros
 from geometry_msgs.msg import PoseArray, PoseStamped, Point, Quaternion
 from nav_msgs.msg import Odometry
-from sensor_msgs.msg import Image
+from sensor_msgs.msg import Image, CameraInfo, RegionOfInterest
+from std_msgs.msg import String, Bool
 
 # reliability imports
 from rclpy.qos import QoSProfile, QoSReliabilityPolicy
@@ -35,6 +38,20 @@ import numpy as np
 import time
 import os
 
+# control laws and setpoint limiting
+from parsight.controller import make_controller, SetpointRateLimiter
+from parsight.frame_buffers import FrameBufferPool
+from parsight.adaptive_resolution import AdaptiveResolutionController
+from parsight.camera_model import CameraModel
+from parsight.tracker import MultiTargetTracker
+from parsight.roi_tracker import RoiTracker, DetectionScheduler
+from parsight.search import SearchPlanner
+from parsight.color_profiles import load_profiles
+from parsight.detector import ColorBlobDetector
+from parsight.frame_pipeline import FramePipeline
+from parsight.fovea import request_window, crop_to_view, inside
+from parsight.multi_stream import CameraStream, StreamStats, fuse_estimates
+
 bridge = CvBridge()
 
 ################################################
@@ -66,21 +83,93 @@ class DroneControlNode(Node):
         self.init_x, self.init_y = 2.0, 1.8     # where we start the drone
         
         # movement parameters 
-        self.frame_pixel_tol = 5                # how to center to only hover
+        self.frame_pixel_tol = 5                # how to center to only hover (reference pixels, fractions are fine)
         self.Kp = 0.020 #0.0141                 # proportional gain
         self.Kd = 0.002 #0.001                  # derivative gain
-
-        # colour filter settings
-        target_rgb=(200, 29, 32)  # target color to track, in RGB format (ex: red)
-        hue_tol=10                # tolerance range for hue in HSV space (large = less strict)
-        sat_tol=100               # tolerance for saturation (large = more dull and bright)
-        val_tol=100               # tolerance for value/brightness (large = more lighting conds)
+        self.Ki = 0.0                           # integral gain (only used by "pid")
+        self.Kff = 0.0                          # velocity feed-forward gain (only used by "pd_ff")
+        self.control_law = "pd"                 # "pd", "pid" or "pd_ff"
+        self.control_rate_hz = 50.0             # fixed rate of the control tick
+        self.estimate_timeout = 0.3             # seconds before a detection is too old to act on
+        self.max_setpoint_velocity = 1.5        # m/s limit on the horizontal setpoint
+        self.max_setpoint_acceleration = 3.0    # m/s^2 limit on the horizontal setpoint
+
+        # processing resolution
+        self.adaptive_resolution = True         # let ball size, confidence and latency pick the scale
+        self.reference_width = 128              # width the gains and pixel tolerance were tuned at
+        self.latency_budget = 0.008             # seconds allowed for the detection stage
+        self.min_ball_radius = 2.5              # processing pixels, a smaller ball scales the resolution up
+        self.max_center_sigma = 0.25            # reference pixels of centre uncertainty before scaling up
+
+        # candidate tracking
+        self.min_blob_area = 4                  # smallest blob (processing pixels) kept as a candidate
+        self.track_gate_fraction = 0.15         # association gate as a fraction of the frame width
+        self.use_fused_kernel = False           # single-pass numba kernel instead of the opencv mask path
+        self.hybrid_tracking = False            # full detection every N frames, cheap roi tracking in between
+        self.max_detection_interval = 6         # largest N, reached while the roi tracker keeps agreeing
+        self.min_roi_confidence = 0.6           # roi tracker confidence below which a full detection runs
+
+        # foveated capture
+        self.foveated = False                   # ask the camera node for a native resolution crop around the ball
+        self.fovea_margin = 4.0                 # requested window half side in ball radii
+        self.fovea_min_half = 8                 # smallest requested window half side (view pixels)
+        self.verifier_model = None              # .npz from ros-bag-scripts/train_verifier.py, None skips verification
+        self.verifier_top_k = 4                 # candidates per frame the verifier looks at
+        self.verifier_drop_unverified = False   # also drop the candidates ranked below the top k (never scored)
+
+        # pipelining
+        self.pipelined = False                  # run detection on a pool of worker processes
+        self.pipeline_workers = 3               # worker processes (leave a core for ROS)
+        self.pipeline_report_period = 5.0       # seconds between throughput/latency reports
+        self.pipeline_result_timeout = 0.25     # seconds before a frame's missing result is skipped as lost
+        self.pipeline_poll_period = 1.0 / 30    # seconds between result polls, about the camera frame period
+
+        # search parameters
+        self.search_pattern = "spiral"          # "spiral" or "lawnmower"
+        self.search_timeout = 1.0               # seconds without the ball before searching
+        self.search_exit_confidence = 0.7       # track confidence that ends a search
+        self.search_prediction_horizon = 1.0    # seconds the last ball velocity is extrapolated
+        self.search_high_resolution = True      # detect on the camera's native frames while searching (tiled mask at 480 rows and up)
+        self.search_frame_timeout = 0.5         # seconds without a native frame before the views are used again
+
+        # colour filter settings (target colour, tolerances and reject bands live in the profile)
+        self.color_profile = "red_ball"         # named profile, switch at runtime on /parsight/color_profile
+        self.color_profile_file = None          # optional JSON file adding or overriding profiles
+        self.extra_color_profiles = []          # profiles classified in the same pass and drawn on /camera/segmented, e.g. ["white_ball"]
+
+        # camera calibration
+        self.camera_calibration = None          # JSON from ros-bag-scripts/calibrate_camera.py, None uses the nominal focal length
+
+        # extra cameras on the same mount, each detected on its own thread and fused with the tracking camera
+        # e.g. {"name": "wide", "topic": "/camera/wide/image_raw", "hfov_deg": 120.0} or with "calibration": "wide.json"
+        self.extra_cameras = []
+        self.stream_max_age = 0.1               # seconds before another camera's estimate is too old to fuse
+        self.stream_report_period = 5.0         # seconds between per-camera throughput/latency reports
 
         ###########################
         # OTHER SETUP (DON'T TOUCH)
 
-        # init the colour filter
-        self.set_target_color(target_rgb, hue_tol, sat_tol, val_tol)
+        # init the colour filter from the named profile
+        self.color_profiles = load_profiles(self.color_profile_file)
+
+        # detection stage (optional fused kernel falls back to the opencv path without numba)
+        self.detector = ColorBlobDetector(self.color_profiles[self.color_profile], self.min_blob_area, self.use_fused_kernel,
+                                          verifier_model=self.verifier_model, verifier_top_k=self.verifier_top_k,
+                                          verifier_drop_unverified=self.verifier_drop_unverified,
+                                          extra_profiles=[self.color_profiles[name] for name in self.extra_color_profiles])
+        self.extra_detections = {}
+        if self.use_fused_kernel and not self.detector.fused:
+            self.get_logger().warn('numba not installed, using the OpenCV mask path')
+        self.pipeline = None
+        # the fovea gets its own detector so its buffers stay sized for the crop
+        self.fovea_detector = ColorBlobDetector(**self.single_profile_config())
+        # so do the native search frames, tall enough to be masked in stripes
+        self.search_detector = ColorBlobDetector(**self.single_profile_config())
+        # one detection stream per extra camera, they share the tracking camera's detector settings
+        self.streams = [CameraStream(camera["name"], camera["topic"], self.single_profile_config(), self.reference_width,
+                                     camera.get("hfov_deg"), camera.get("vfov_deg"), camera.get("calibration"),
+                                     self.track_gate_fraction, self.get_logger()) for camera in self.extra_cameras]
+        self.primary_stats = StreamStats()
 
         # safety net on the ball
         self.bounds = {"x_min": -1*self.square_size, "x_max": self.square_size, "y_min": -1*self.square_size, "y_max": self.square_size, "z_min": 0.0, "z_max": self.max_searching_height}
@@ -103,19 +192,54 @@ class DroneControlNode(Node):
 
         # camera parameters
         self.REAL_DIAMETER_MM = 42.67       # Standard golf ball diameter in mm
+        self.camera_model = None            # calibrated model rescaled to the incoming frames
         self.FOCAL_LENGTH_MM = 26           # iPhone 14 Plus main camera focal length in mm
         self.SENSOR_WIDTH_MM = 4.93         # Approximate sensor size: 5.095 mm (H) × 4.930 mm (W)
-        self.DOWN_SAMPLE_FACTOR = 4         # Downsample factor used in calculation
 
         # frame parameters (updated in first frame)
         self.frame_width, self.frame_height = None, None
         self.camera_frame_center = None
-        self.FOCAL_LENGTH_PIXELS = None
-
-        # derivative parameters
-        self.prev_p_error_x = 0
-        self.prev_p_error_y = 0
-        self.prev_time = self.get_clock().now()
+        self.FOCAL_LENGTH_PIXELS = None     # in incoming (full frame) pixels, whatever the processing scale
+        self.buffers = FrameBufferPool()
+
+        # processing scale parameters (updated whenever the scale changes)
+        self.resolution = AdaptiveResolutionController(start_width=self.reference_width, latency_budget_s=self.latency_budget,
+                                                       min_radius_px=self.min_ball_radius, max_center_sigma=self.max_center_sigma)
+        self.process_width, self.process_height = None, None
+        self.process_scale = 1.0
+        self.curr_radius, self.curr_confidence, self.curr_sigma = None, None, None
+        self.curr_target = None
+        self.tracker = None
+
+        # foveated capture state: views wait for the crop with the same stamp
+        self.fovea_active = False
+        self.pending_view = None
+        self.pending_fovea = None
+        self.fovea_infos = {}
+        self.last_frame_time, self.frame_interval = None, 0.0
+
+        # hybrid mode, the roi tracker works in processing pixels (sequential path only)
+        self.roi_tracker = RoiTracker()
+        self.scheduler = DetectionScheduler(max_interval=self.max_detection_interval, min_confidence=self.min_roi_confidence)
+
+        # controller, runs on its own timer using the latest estimate
+        self.control_dt = 1.0 / self.control_rate_hz
+        self.controller = make_controller(self.control_law, self.Kp, self.Kd, Ki=self.Ki, Kff=self.Kff)
+        self.rate_limiter = SetpointRateLimiter(self.max_setpoint_velocity, self.max_setpoint_acceleration)
+        self.latest_error = None
+        self.latest_error_rate = None
+        self.latest_error_time = None
+        self.control_timer = self.create_timer(self.control_dt, self.control_tick)
+
+        # search, enabled once launched and driven from the control tick
+        self.searching_enabled = False
+        self.search = SearchPlanner(self.bounds, pattern=self.search_pattern)
+        self.last_seen_time = None
+        self.last_ball_world = None
+        self.last_ball_velocity = np.zeros(2)
+        # high resolution search: native frames replace the views while they keep coming
+        self.search_capture = False
+        self.last_search_frame_time = None
         
         ############################
         # SUBSCRIBER/PUBLISHER SETUP
@@ -128,6 +252,31 @@ class DroneControlNode(Node):
         self.image_publisher = self.create_publisher(Image, '/camera/segmented', 1)
         self.get_logger().info('Publishing to Processed Camera Output!')
 
+        # foveated capture, request out and native crops (with their place in the sensor image) in
+        if self.foveated:
+            self.fovea_request_publisher = self.create_publisher(RegionOfInterest, '/parsight/fovea_request', 1)
+            self.fovea_subscriber = self.create_subscription(Image, '/camera/foveal', self.fovea_callback, 1)
+            self.fovea_info_subscriber = self.create_subscription(CameraInfo, '/camera/foveal/camera_info', self.fovea_info_callback, 1)
+            self.get_logger().info('Foveated capture enabled')
+
+        # high resolution search, capture request out and native frames in
+        if self.search_high_resolution:
+            self.search_capture_publisher = self.create_publisher(Bool, '/parsight/search_capture', 1)
+            self.search_subscriber = self.create_subscription(Image, '/camera/search/image_raw', self.search_frame_callback, 1)
+            self.get_logger().info('High resolution search enabled')
+
+        # extra cameras, frames go straight to their stream's thread
+        for stream in self.streams:
+            self.create_subscription(Image, stream.topic, lambda msg, stream=stream: self.stream_input_callback(stream, msg), 1)
+            stream.start()
+            self.get_logger().info(f'Fusing camera {stream.name} from {stream.topic}')
+        if self.streams:
+            self.stream_timer = self.create_timer(self.stream_report_period, self.report_streams)
+
+        # runtime colour profile switching
+        self.profile_subscriber = self.create_subscription(String, '/parsight/color_profile', self.color_profile_callback, 1)
+        self.get_logger().info(f'Tracking colour profile {self.color_profile}')
+
         # subscriber to RealSense or Vicon pose data
         if test_type == "realsense":
             # Subscriber to RealSense pose data
@@ -185,23 +334,33 @@ class DroneControlNode(Node):
         # capture the current position for landing
         self.set_pose_initial()
         self.set_position.z = self.desired_flight_height
+        self.enable_search()
         return
 
     def testing_procedure(self):
         # set the drone to continuously hover and track the ball
+        self.controller.reset()
+        self.rate_limiter.reset((self.set_position.x, self.set_position.y))
         self.testing = True
+        self.enable_search()
         return
 
     def landing_procedure(self):
         # drone will land at the captured position (back where the people are)
         # also at a lower height
         self.testing = False
+        self.searching_enabled = False
+        self.search.stop()
+        self.set_search_capture(False)
         self.set_position.z = 0.1
         return
 
     def abort_procedure(self):
         # safety land will just immediately lower the drone
         self.testing = False
+        self.searching_enabled = False
+        self.search.stop()
+        self.set_search_capture(False)
         self.set_position.z = 0.0
         response.success = True
         response.message = "Success"
@@ -266,151 +425,488 @@ class DroneControlNode(Node):
         # Publish the message to the /mavros/setpoint_position/local topic
         self.setpoint_publisher.publish(setpoint_msg)
 
+    def color_profile_callback(self, msg):
+        # switch the ball type without restarting the node
+        if msg.data not in self.color_profiles:
+            self.get_logger().warn(f'Unknown colour profile {msg.data}, keeping {self.color_profile}')
+            return
+        self.set_color_profile(msg.data)
+
     def frame_input_callback(self, msg):
+        # native search frames stand in for the views, the tracker is fed one camera frame once
+        if self.search_frames_live():
+            return
         # convert ROS Image message to OpenCV image
         current_frame = self.br.imgmsg_to_cv2(msg)
+        # with a fovea requested, the view waits for the crop taken from the same sensor frame
+        if self.foveated and self.fovea_active:
+            self.pair_view(self.stamp_key(msg.header.stamp), current_frame)
+            return
         # run the full processing on the frame to change setpoint
-        self.full_image_processing(current_frame)
+        self.full_image_processing(current_frame, self.stamp_key(msg.header.stamp) / 1e9)
         return
 
+    def stream_input_callback(self, stream, msg):
+        # only hand the frame over, detection runs on the stream's own thread
+        stream.submit(self.br.imgmsg_to_cv2(msg), self.stamp_key(msg.header.stamp) / 1e9)
+
+    def search_frame_callback(self, msg):
+        # a frame still in flight after the search ended is dropped, as is any before the first view
+        if not self.search_capture or self.FOCAL_LENGTH_PIXELS is None:
+            return
+        self.last_search_frame_time = time.time()
+        self.search_image_processing(self.br.imgmsg_to_cv2(msg), self.stamp_key(msg.header.stamp) / 1e9)
+
+    def search_frames_live(self):
+        return self.search_capture and self.last_search_frame_time is not None and \
+            time.time() - self.last_search_frame_time < self.search_frame_timeout
+
+    def fovea_info_callback(self, msg):
+        # where the next crop sits in the sensor image, kept until its crop arrives
+        self.fovea_infos[self.stamp_key(msg.header.stamp)] = (
+            (msg.roi.x_offset, msg.roi.y_offset, msg.roi.width, msg.roi.height), (msg.width, msg.height))
+        while len(self.fovea_infos) > 4:
+            del self.fovea_infos[min(self.fovea_infos)]
+
+    def fovea_callback(self, msg):
+        stamp = self.stamp_key(msg.header.stamp)
+        info = self.fovea_infos.pop(stamp, None)
+        if info is None:
+            return
+        fovea = (self.br.imgmsg_to_cv2(msg),) + info
+        # the view may already be waiting, otherwise the crop waits for it
+        if self.pending_view is not None and self.pending_view[0] == stamp:
+            frame = self.pending_view[1]
+            self.pending_view = None
+            self.full_image_processing(frame, stamp / 1e9, fovea)
+        else:
+            self.pending_fovea = (stamp, fovea)
+
+    def pair_view(self, stamp, frame):
+        if self.pending_fovea is not None and self.pending_fovea[0] == stamp:
+            fovea = self.pending_fovea[1]
+            self.pending_fovea = None
+            self.full_image_processing(frame, stamp / 1e9, fovea)
+            return
+        # no crop for the previous view came, process it alone before waiting on this one
+        if self.pending_view is not None:
+            self.full_image_processing(self.pending_view[1], self.pending_view[0] / 1e9)
+        self.pending_view = (stamp, frame)
+
+    def stamp_key(self, stamp):
+        return stamp.sec * 1000000000 + stamp.nanosec
+
     ################################################
     # IMAGE PROCESSING
     ################################################
 
-    def full_image_processing(self, frame):
+    def full_image_processing(self, frame, timestamp, fovea=None):
+        # timestamp is the frame's capture time (s) from the camera node's header stamp, so
+        # transport and queueing jitter never reach the tracker or the controller's derivative
         self.t1 = time.time()
         # the first time, we set up parameters
         if self.FOCAL_LENGTH_PIXELS is None: self.first_time_setup_image_parameters(frame)
-        # take the frame and find the object center
-        center = self.find_object_center(frame)
-        # if the center exists, we assign to current ball position
+        # take the frame at the processing scale
+        process_frame = self.scale_frame_for_processing(frame)
+        # pipelined: hand the frame to the workers, results are applied as they come back in order
+        if self.pipeline is not None and self.pipeline.ready:
+            self.pipeline.submit(process_frame, (frame, self.process_scale, timestamp))
+            self.poll_pipeline()
+            return
+        # sequential: find the object center right here (also while the workers are starting)
+        stage_start = time.perf_counter()
+        center = self.find_object_center(process_frame, timestamp, fovea)
+        stage_latency = time.perf_counter() - stage_start
+        self.apply_detection(frame, center, stage_latency, timestamp)
+        if self.foveated:
+            self.request_fovea(center, timestamp)
+        return
+
+    def search_image_processing(self, frame, timestamp):
+        # the whole sensor frame is detected, the result is applied as if it came from the view
+        self.t1 = time.time()
+        native_size = (frame.shape[1], frame.shape[0])
+        view_size = (self.frame_width, self.frame_height)
+        stage_start = time.perf_counter()
+        mapped = crop_to_view(self.search_detector.detect(frame), (0, 0) + native_size, native_size, native_size, view_size)
+        # to processing pixels, select_target divides by the scale again
+        scale = self.process_scale
+        center = self.select_target([((c[0] * scale, c[1] * scale), r * scale, q, s * scale) for c, r, q, s in mapped],
+                                    scale, timestamp)
+        stage_latency = time.perf_counter() - stage_start
+        # the search frames' cost says nothing about the views', so the processing scale is left alone
+        view = cv2.resize(frame, view_size, interpolation=cv2.INTER_AREA)
+        self.apply_detection(view, center, stage_latency, timestamp, adapt=False)
+
+    def apply_detection(self, frame, center, stage_latency, timestamp, adapt=True):
+        # frame age from the header stamp on the same clock as the CameraStream ages, so the report compares
+        now = time.time()
+        self.primary_stats.record(stage_latency, now - timestamp, now)
+        # the other cameras' recent estimates refine the centre, or stand in when this camera lost the ball
+        primary_seen = center is not None
+        if self.streams:
+            center = self.fuse_streams(center, timestamp)
+        # if the center exists, we assign to current ball position (in full frame pixels)
         if center:
             self.curr_center = center
             # draw the center on the frame
-            cv2.circle(frame, self.curr_center, 1, (0, 255, 0), -1)
+            cv2.circle(frame, (int(round(self.curr_center[0])), int(round(self.curr_center[1]))), 1, (0, 255, 0), -1)
             # calculate the offset from the frame center
             offset_x_pixels, offset_y_pixels = self.mini_calculate_golf_ball_metrics()
-            # then based on how far off we are, instruct the drone's setpoint to move that much
-            self.move_drone(offset_x_pixels, offset_y_pixels)
+            # while searching, only a confident detection ends the search
+            if not self.search.active or self.curr_confidence >= self.search_exit_confidence:
+                if self.search.active:
+                    self.stop_search()
+                # hand the offset to the controller, the control tick moves the setpoint
+                self.update_estimate(offset_x_pixels, offset_y_pixels, timestamp)
+                self.update_ball_world_position(offset_x_pixels, offset_y_pixels)
+        # pick the scale for the next frame from this one's size, confidence and cost
+        if self.adaptive_resolution and adapt:
+            radius = self.curr_radius if primary_seen else None
+            confidence = self.curr_confidence if primary_seen else None
+            sigma = self.curr_sigma if primary_seen else None
+            if self.resolution.update(radius, confidence, stage_latency, sigma):
+                self.set_processing_scale(self.resolution.width)
+        # candidates of the extra profiles for comparison in the field (sequential path only)
+        if self.extra_detections:
+            self.draw_extra_profiles(frame)
         # always publish the images regadless if a frame was drawn in or not
         self.image_publisher.publish(bridge.cv2_to_imgmsg(frame))
         return
 
-    def find_object_center(self, frame):
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-
-        # Main red mask
-        target_mask = cv2.inRange(hsv, self.lower_bound, self.upper_bound)
-
-        # Remove green
-        lower_green = np.array([35, 50, 50])
-        upper_green = np.array([85, 255, 255])
-        green_mask = cv2.inRange(hsv, lower_green, upper_green)
-
-        # Remove blue
-        lower_blue = np.array([90, 50, 50])
-        upper_blue = np.array([130, 255, 255])
-        blue_mask = cv2.inRange(hsv, lower_blue, upper_blue)
+    def draw_extra_profiles(self, frame):
+        # one colour per extra profile, candidates come in processing pixels
+        colors = [(0, 165, 255), (255, 0, 255), (255, 255, 0), (0, 255, 255)]
+        for k, name in enumerate(sorted(self.extra_detections)):
+            for c, r, _, _ in self.extra_detections[name]:
+                cv2.circle(frame, (int(round(c[0] / self.process_scale)), int(round(c[1] / self.process_scale))),
+                           max(int(round(r / self.process_scale)), 1), colors[k % len(colors)], 1)
+        self.extra_detections = {}
+
+    def fuse_streams(self, center, timestamp):
+        # every estimate in this camera's full frame pixels: (center, sigma, confidence)
+        estimates = []
+        if center is not None:
+            estimates.append((center, self.curr_target.sigma, self.curr_confidence))
+        # the other cameras' estimates are gated against this frame's capture stamp, both are header stamps
+        for stream in self.streams:
+            estimate = stream.latest(timestamp, self.stream_max_age)
+            if estimate is None:
+                continue
+            direction, sigma, confidence, _ = estimate
+            # the shared direction back into this camera's pixels
+            if self.camera_model is not None:
+                pixel = self.camera_model.project(direction)
+            else:
+                pixel = (self.camera_frame_center[0] + self.FOCAL_LENGTH_PIXELS * direction[0],
+                         self.camera_frame_center[1] + self.FOCAL_LENGTH_PIXELS * direction[1])
+            # a wide camera sees balls this one cannot steer to directly, those are still worth moving towards
+            estimates.append((pixel, sigma * self.FOCAL_LENGTH_PIXELS, confidence))
+        fused = fuse_estimates(estimates, self.track_gate_fraction * self.frame_width)
+        if fused is None:
+            return None
+        center, sigma, self.curr_confidence = fused
+        self.curr_sigma = sigma * self.reference_width / self.frame_width
+        return center
+
+    def report_streams(self):
+        # per-camera throughput, detection latency and frame age
+        for name, stats in [("primary", self.primary_stats)] + [(stream.name, stream.stats) for stream in self.streams]:
+            summary = stats.summary()
+            if summary:
+                self.get_logger().info(
+                    f"camera {name} {summary['fps']:.1f} fps | latency mean {summary['latency_mean'] * 1000:.1f} ms "
+                    f"p95 {summary['latency_p95'] * 1000:.1f} ms | age {summary['age_mean'] * 1000:.1f} ms | "
+                    f"dropped {summary['dropped']} | errors {summary['errors']}")
+
+    def poll_pipeline(self):
+        if self.pipeline is None:
+            return
+        # dead workers are respawned, once that keeps failing detection goes back to this process
+        dead = self.pipeline.revive()
+        if dead:
+            self.get_logger().warn(f'{dead} pipeline workers died, ' + (
+                'falling back to sequential detection' if self.pipeline.failed else 'restarted them'))
+        if self.pipeline.failed:
+            self.pipeline_timer.cancel()
+            self.pipeline.stop()
+            self.pipeline = None
+            return
+        # apply finished frames strictly in order, the last one applied is what control sees
+        for (frame, process_scale, timestamp), detections, worker_latency, _ in self.pipeline.poll():
+            center = self.select_target(detections, process_scale, timestamp)
+            self.apply_detection(frame, center, worker_latency, timestamp)
+        # periodic throughput and added latency report
+        now = time.time()
+        if now - self.last_pipeline_report > self.pipeline_report_period:
+            self.last_pipeline_report = now
+            stats = self.pipeline.stats()
+            if stats:
+                self.get_logger().info(
+                    f"pipeline {stats['fps']:.1f} fps | latency mean {stats['latency_mean'] * 1000:.1f} ms "
+                    f"p95 {stats['latency_p95'] * 1000:.1f} ms | added {stats['added_latency_mean'] * 1000:.1f} ms | "
+                    f"dropped {stats['dropped']} | lost {stats['lost']} | errors {stats['errors']}")
+
+    def scale_frame_for_processing(self, frame):
+        # resize into a cached buffer, or use the frame as is at full scale
+        if self.process_width == self.frame_width:
+            return frame
+        dst = self.buffers.scaled_frame(self.process_width, self.process_height, frame.shape[2])
+        return cv2.resize(frame, (self.process_width, self.process_height), dst=dst, interpolation=cv2.INTER_AREA)
+
+    def find_object_center(self, frame, timestamp, fovea=None):
+        # hybrid mode: between full detections the locked ball is followed on a small window
+        if self.hybrid_tracking and self.roi_tracker.ready and not self.scheduler.detection_due():
+            result = self.roi_tracker.track(frame)
+            self.scheduler.tracked(result[2] if result else None)
+            if result is not None and result[2] >= self.min_roi_confidence:
+                return self.select_target([result], self.process_scale, timestamp)
+        # mask the frame, turn every blob into a candidate and let the tracker pick
+        tracked_center = self.roi_tracker.center if self.roi_tracker.ready else None
+        if self.extra_color_profiles:
+            # one classification pass for every profile, the extras are only drawn
+            detections = self.detector.detect_all(frame)
+            self.extra_detections = {name: found for name, found in detections.items() if name != self.color_profile}
+            detections = detections[self.color_profile]
+        else:
+            detections = self.detector.detect(frame)
+        if fovea is not None:
+            detections = self.merge_fovea(detections, fovea)
+        center = self.select_target(detections, self.process_scale, timestamp)
+        if self.hybrid_tracking:
+            self.update_roi_tracker(frame, tracked_center, center)
+        return center
+
+    def merge_fovea(self, detections, fovea):
+        # inside the crop the native resolution candidates replace the ones from the view
+        crop, roi, native_size = fovea
+        view_size = (self.frame_width, self.frame_height)
+        sx, sy = self.frame_width / native_size[0], self.frame_height / native_size[1]
+        window = (roi[0] * sx, roi[1] * sy, roi[2] * sx, roi[3] * sy)
+        scale = self.process_scale
+        kept = [d for d in detections if not inside((d[0][0] / scale, d[0][1] / scale), window)]
+        mapped = crop_to_view(self.fovea_detector.detect(crop), roi, (crop.shape[1], crop.shape[0]), native_size, view_size)
+        # back to processing pixels, select_target divides by the scale again
+        return kept + [((c[0] * scale, c[1] * scale), r * scale, q, s * scale) for c, r, q, s in mapped]
+
+    def request_fovea(self, center, timestamp):
+        # ask for a window around where the locked ball will be on the next frame
+        if self.last_frame_time is not None:
+            self.frame_interval = timestamp - self.last_frame_time
+        self.last_frame_time = timestamp
+        msg = RegionOfInterest()
+        if center is not None:
+            target = self.curr_target
+            predicted = target.predict(timestamp + self.frame_interval)
+            msg.x_offset, msg.y_offset, msg.width, msg.height = request_window(
+                predicted, target.radius, self.fovea_margin, self.fovea_min_half, (self.frame_width, self.frame_height))
+            self.fovea_active = msg.width > 0 and msg.height > 0
+        elif self.fovea_active:
+            # lost, switch the fovea off (empty window) and stop holding views back
+            self.fovea_active = False
+            self.fovea_request_publisher.publish(msg)
+            if self.pending_view is not None:
+                (stamp, pending), self.pending_view = self.pending_view, None
+                self.full_image_processing(pending, stamp / 1e9)
+            return
+        else:
+            return
+        self.fovea_request_publisher.publish(msg)
 
-        # Invert green and blue masks (we want areas *not* green/blue)
-        not_green = cv2.bitwise_not(green_mask)
-        not_blue = cv2.bitwise_not(blue_mask)
+    def update_roi_tracker(self, frame, tracked_center, center):
+        # rebuild the ball model from the full detection and let the scheduler pick the next N
+        if center is None:
+            self.scheduler.detected(tracked_center, None, 0.0)
+            self.roi_tracker.reset()
+            return
+        target, scale = self.curr_target, self.process_scale
+        position = (target.position[0] * scale, target.position[1] * scale)
+        self.scheduler.detected(tracked_center, position, target.radius * scale)
+        self.roi_tracker.init(frame, position, target.radius * scale, target.sigma * scale)
+
+    def select_target(self, detections, process_scale, timestamp):
+        # candidates come in processing pixels, the tracker works in full frame pixels
+        detections = [((c[0] / process_scale, c[1] / process_scale), r / process_scale, q, s / process_scale) for c, r, q, s in detections]
+        target = self.tracker.update(detections, timestamp)
+        if target is None:
+            return None
+        # radius goes back to processing pixels for the adaptive resolution
+        self.curr_radius = target.radius * self.process_scale
+        self.curr_confidence = target.confidence
+        self.curr_target = target
+        # centre uncertainty in reference pixels, the units the control tolerances are in
+        self.curr_sigma = target.sigma * self.reference_width / self.frame_width
+        # sub-pixel centre, only rounded for drawing
+        return (float(target.position[0]), float(target.position[1]))
 
-        # Combine masks: keep red, remove green & blue
-        combined_mask = cv2.bitwise_and(target_mask, not_green)
-        combined_mask = cv2.bitwise_and(combined_mask, not_blue)
 
-        # Blur to reduce noise
-        blurred_mask = cv2.GaussianBlur(combined_mask, (9, 9), 2)
+    def mini_calculate_golf_ball_metrics(self):
+        # only the centre is undistorted, never the image
+        center = self.camera_model.undistort(self.curr_center) if self.camera_model is not None else self.curr_center
+        # using the frame center and current ball center, find offset
+        offset_x_pixels = center[0] - self.camera_frame_center[0]
+        offset_y_pixels = center[1] - self.camera_frame_center[1]
+        # express in reference-width pixels so gains do not depend on resolution
+        reference_scale = self.reference_width / self.frame_width
+        return offset_x_pixels * reference_scale, offset_y_pixels * reference_scale
 
-        # Find contours
-        contours, _ = cv2.findContours(blurred_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        if contours:
-            print("111")
-            largest = max(contours, key=cv2.contourArea)
-            M = cv2.moments(largest)
-            if M["m00"] > 0:
-                cx = int(M["m10"] / M["m00"])
-                cy = int(M["m01"] / M["m00"])
-                return (cx, cy)
 
-        # Fallback: center of mass of whole mask
-        M = cv2.moments(blurred_mask)
-        if M["m00"] > 0:
-            print("222")
-            cx = int(M["m10"] / M["m00"])
-            cy = int(M["m01"] / M["m00"])
-            return (cx, cy)
+    def update_estimate(self, p_error_x, p_error_y, timestamp):
+        # store the newest pixel error along with its rate between detections
+        curr_time = self.get_clock().now()
+        error = np.array([p_error_x, p_error_y], dtype=float)
+        # the law's derivative moves only here, with the frame's capture time
+        self.controller.observe(error, timestamp)
+        if self.latest_error is not None:
+            dt = (curr_time - self.latest_error_time).nanoseconds / 1e9
+            # only trust the rate when detections are a sensible distance apart
+            if self.control_dt / 4 < dt < self.estimate_timeout:
+                self.latest_error_rate = (error - self.latest_error) / dt
+        self.latest_error = error
+        self.latest_error_time = curr_time
+        self.t2 = time.time()
+        print(self.t2 - self.t1)
 
-        return None
+    def control_tick(self):
+        # fixed-rate control loop, independent of the camera frame rate
+        if self.latest_error is not None:
+            age = (self.get_clock().now() - self.latest_error_time).nanoseconds / 1e9
+            if age <= self.estimate_timeout:
+                self.move_drone(self.latest_error[0], self.latest_error[1])
+                return
+            # estimate went stale, hold position and restart the law cleanly
+            self.controller.reset()
+            self.latest_error = None
+            self.latest_error_rate = None
+        # no fresh estimate, search once the ball has been gone long enough
+        if self.searching_enabled and self.FOCAL_LENGTH_PIXELS is not None and self.lost_duration() > self.search_timeout:
+            self.search_step()
 
+    ################################################
+    # SEARCH
+    ################################################
 
-    def mini_calculate_golf_ball_metrics(self):
-        # using the frame center and current ball center, find offset
-        offset_x_pixels = self.curr_center[0] - self.camera_frame_center[0]
-        offset_y_pixels = self.curr_center[1] - self.camera_frame_center[1]
-        return offset_x_pixels, offset_y_pixels
+    def enable_search(self):
+        # the search timeout counts from here, a ball in view at take-off gets the tracker time to confirm it
+        if not self.searching_enabled:
+            self.last_seen_time = self.get_clock().now()
+        self.searching_enabled = True
+
+    def lost_duration(self):
+        # seconds since the last confident detection (forever if never seen)
+        if self.last_seen_time is None:
+            return float("inf")
+        return (self.get_clock().now() - self.last_seen_time).nanoseconds / 1e9
+
+    def meters_per_reference_pixel(self):
+        # ground distance of one reference-width pixel at the current altitude
+        focal_reference = self.FOCAL_LENGTH_PIXELS * self.reference_width / self.frame_width
+        return max(self.position.z, 0.1) / focal_reference
+
+    def camera_footprint_half_width(self):
+        # half the ground width the camera sees at the current altitude
+        return max(self.position.z, 0.1) * (self.frame_width / 2) / self.FOCAL_LENGTH_PIXELS
+
+    def update_ball_world_position(self, p_error_x, p_error_y):
+        # same axis convention as move_drone: image x moves world y, image y moves world x
+        curr_time = self.get_clock().now()
+        mpp = self.meters_per_reference_pixel()
+        ball_world = np.array([self.position.x - p_error_y * mpp, self.position.y - p_error_x * mpp])
+        if self.last_ball_world is not None:
+            dt = (curr_time - self.last_seen_time).nanoseconds / 1e9
+            if 0 < dt < self.estimate_timeout:
+                self.last_ball_velocity = (ball_world - self.last_ball_world) / dt
+        self.last_ball_world = ball_world
+        self.last_seen_time = curr_time
+
+    def predicted_ball_position(self):
+        # extrapolate the last seen ball position for a short horizon
+        if self.last_ball_world is None:
+            return np.array([self.position.x, self.position.y])
+        horizon = min(self.lost_duration(), self.search_prediction_horizon)
+        return self.last_ball_world + self.last_ball_velocity * horizon
+
+    def search_step(self):
+        # fly the coverage pattern at search height, marking what the camera has seen
+        half_width = self.camera_footprint_half_width()
+        position = (self.position.x, self.position.y)
+        if not self.search.active:
+            self.search.start(self.predicted_ball_position(), half_width)
+            self.rate_limiter.reset((self.set_position.x, self.set_position.y))
+            self.get_logger().info(f'Ball lost, starting {self.search_pattern} search')
+            self.set_search_capture(True)
+        waypoint = self.search.next_waypoint(position, half_width)
+        limited = self.rate_limiter.step(waypoint, self.control_dt)
+        self.set_position.x = float(limited[0])
+        self.set_position.y = float(limited[1])
+        self.set_position.z = self.max_searching_height
+
+    def stop_search(self):
+        # confident detection, drop back to tracking height and resume the control law
+        self.search.stop()
+        self.set_search_capture(False)
+        self.controller.reset()
+        self.set_position.z = self.desired_flight_height
+        self.get_logger().info('Ball reacquired, search stopped')
 
+    def set_search_capture(self, on):
+        # ask the camera node for native frames (or stop them), the views carry on until the first arrives
+        if not self.search_high_resolution or on == self.search_capture:
+            return
+        self.search_capture = on
+        self.last_search_frame_time = None
+        # the roi tracker follows the views, which are skipped in between
+        self.roi_tracker.reset()
+        self.scheduler.reset()
+        msg = Bool()
+        msg.data = on
+        self.search_capture_publisher.publish(msg)
 
     def move_drone(self, p_error_x, p_error_y):
         # calculate the vector length
         vector_length = self.calculate_pixel_difference(p_error_x, p_error_y)
-        print("moving drone triggered", vector_length)
-        # if the length is close enough, no change to setpoint, we don't move
-        if vector_length <= self.frame_pixel_tol: 
-            print("*** HOVERING ***")
-            if self.testing:
-                self.set_position.x = self.position.x
-                self.set_position.y = self.position.y
-                self.set_position.z = self.desired_flight_height
-            return
-        # if we made it past here, then we want to move
-        print("*** MOVE ***")
-        # calculate derivative component
-        curr_time = self.get_clock().now()
-        dt = (curr_time - self.prev_time).nanoseconds / 1e9  # convert ns to seconds
-        if dt == 0: dt = 1e-6  # prevent division by zero
-        d_error_x = (p_error_x - self.prev_p_error_x) / dt
-        d_error_y = (p_error_y - self.prev_p_error_y) / dt
-        # PD control signal
-        move_x = self.Kp * p_error_x + self.Kd * d_error_x
-        move_y = self.Kp * p_error_y + self.Kd * d_error_y
-        # update the drone's position with the scaled values
+        # if the length is close enough, we hover where we are
+        if vector_length <= self.frame_pixel_tol:
+            target = np.array([self.position.x, self.position.y])
+        else:
+            # control signal from the selected law at the fixed tick dt
+            move_x, move_y = self.controller.update((p_error_x, p_error_y), self.control_dt, self.latest_error_rate)
+            target = np.array([self.position.x - move_y, self.position.y - move_x])
+        # update the drone's position through the rate limiter (clamped when sent)
         if self.testing:
-            self.set_position.x = self.position.x - move_y
-            self.set_position.y = self.position.y - move_x
+            limited = self.rate_limiter.step(target, self.control_dt)
+            self.set_position.x = float(limited[0])
+            self.set_position.y = float(limited[1])
             self.set_position.z = self.desired_flight_height
-        # save current state for next iteration
-        self.prev_p_error_x = p_error_x
-        self.prev_p_error_y = p_error_y
-        self.prev_time = curr_time
-        self.t2 = time.time()
-
-        print(self.t2 - self.t1)
+        else:
+            self.rate_limiter.reset()
 
 
     ################################################
     # IMAGE PROCESSING HELPERS
     ################################################
 
-    def rgb_to_hsv(self, rgb):
-        # convert RGB to HSV
-        rgb_array = np.uint8([[list(rgb)]])
-        hsv_array = cv2.cvtColor(rgb_array, cv2.COLOR_RGB2HSV)
-        return tuple(hsv_array[0][0]) 
-
-    def set_target_color(self, rgb_color, hue_tol=10, sat_tol=100, val_tol=100):
-        # set the colour and give bounds for tolerance
-        hsv_color = self.rgb_to_hsv(rgb_color)
-        h, s, v = hsv_color
-        self.lower_bound = np.array([
-            max(h - hue_tol, 0),
-            max(s - sat_tol, 0),
-            max(v - val_tol, 0)])
-        self.upper_bound = np.array([
-            min(h + hue_tol, 179),
-            min(s + sat_tol, 255),
-            min(v + val_tol, 255)])
+    def set_color_profile(self, name):
+        # new profile for the detector, old tracks belong to the old colour
+        self.color_profile = name
+        self.detector.set_profile(self.color_profiles[name])
+        self.fovea_detector.set_profile(self.color_profiles[name])
+        self.search_detector.set_profile(self.color_profiles[name])
+        # the streams' detectors and trackers are only touched on their own threads
+        for stream in self.streams:
+            stream.set_profile(self.color_profiles[name])
+        if self.tracker is not None:
+            self.tracker.reset()
+        self.roi_tracker.reset()
+        self.scheduler.reset()
+        # workers switch between frames, results detected with the old profile are discarded
+        if self.pipeline is not None:
+            self.pipeline.reconfigure(self.single_profile_config())
+        self.get_logger().info(f'Switched to colour profile {name}')
+
+    def single_profile_config(self):
+        # detector config without the extra profiles, for the detectors whose extras nobody reads
+        return dict(self.detector.config(), extra_profiles=[])
 
     def calculate_pixel_difference(self, x, y):
         # calculate vector lengths
@@ -420,9 +916,57 @@ class DroneControlNode(Node):
     def first_time_setup_image_parameters(self, frame):
         self.frame_height, self.frame_width, _ = frame.shape
         self.camera_frame_center = (self.frame_width / 2, self.frame_height / 2)
-        self.FOCAL_LENGTH_PIXELS = ((self.FOCAL_LENGTH_MM / self.SENSOR_WIDTH_MM) * self.frame_width) / self.DOWN_SAMPLE_FACTOR
+        # the camera node resizes the whole sensor image, so the nominal focal length scales with the incoming width
+        self.FOCAL_LENGTH_PIXELS = (self.FOCAL_LENGTH_MM / self.SENSOR_WIDTH_MM) * self.frame_width
+        # calibrated intrinsics replace the nominal focal length and the offsets are taken from the optical centre
+        if self.camera_calibration is not None:
+            self.camera_model = CameraModel.load(self.camera_calibration).scaled_to(self.frame_width, self.frame_height)
+            self.camera_frame_center = self.camera_model.principal_point
+            self.FOCAL_LENGTH_PIXELS = self.camera_model.focal_length_pixels
+            self.get_logger().info(f'Using camera calibration {self.camera_calibration}')
+        # association gate follows the incoming frame size
+        self.tracker = MultiTargetTracker(gate_px=self.track_gate_fraction * self.frame_width)
+        # start processing at the reference width, never above the incoming width
+        self.resolution.levels = [w for w in self.resolution.levels if w <= self.frame_width] or [self.frame_width]
+        self.resolution.reset(min(self.reference_width, self.frame_width))
+        self.set_processing_scale(self.resolution.width)
+        # worker pool sized for the largest frame it can be handed
+        if self.pipelined:
+            self.pipeline = FramePipeline(self.single_profile_config(), frame.shape, self.pipeline_workers,
+                                          result_timeout=self.pipeline_result_timeout)
+            self.pipeline.start()
+            self.last_pipeline_report = time.time()
+            # frames poll on arrival, the timer flushes results (and deadlines) when frames stop coming
+            self.pipeline_timer = self.create_timer(self.pipeline_poll_period, self.poll_pipeline)
+            self.get_logger().info(f'Pipelined detection on {self.pipeline_workers} workers')
         return
 
+    def set_processing_scale(self, process_width):
+        # detections are mapped back to full frame pixels before any intrinsics are used,
+        # so only the resize and the working buffers follow the processing scale
+        self.process_width = min(int(process_width), self.frame_width)
+        self.process_scale = self.process_width / self.frame_width
+        self.process_height = int(round(self.frame_height * self.process_scale))
+        # size the working buffers once per scale so the per-frame path does not allocate
+        self.detector.buffers.ensure((self.process_height, self.process_width, 3))
+        # the roi tracker's window and model are in the old processing pixels
+        self.roi_tracker.reset()
+        self.scheduler.reset()
+        self.get_logger().info(f'Processing at {self.process_width}x{self.process_height}')
+        return
+
+    def destroy_node(self):
+        # stop the worker pool and free the shared frames before the node goes away
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+        for stream in self.streams:
+            stream.stop()
+        # and the detectors' mask threads
+        for detector in (self.detector, self.fovea_detector, self.search_detector):
+            detector.close()
+        super().destroy_node()
+
     def set_pose_initial(self):
         # Put the current position into maintained position
         self.set_position.x = self.init_x
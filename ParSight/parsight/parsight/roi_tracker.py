@@ -0,0 +1,219 @@
+################################################
+# Descriptions
+################################################
+
+'''
+cheap frame to frame tracking of the locked ball between full detections
+RoiTracker keeps a hue/saturation histogram of the ball taken at the last full
+detection, and on the following frames only converts a small window around the
+ball to HSV, back-projects the histogram and runs mean shift on it
+its confidence is how much of the ball's original back-projection is still
+under the window, so a ball that leaves, is covered or changes look drops it
+DetectionScheduler decides when the full detector runs: every N frames, or
+straight away when the tracker is unsure, with N growing while the full
+detections keep agreeing with the tracker and falling back to 1 when they do not
+running this module (python -m parsight.roi_tracker) compares the cost and
+accuracy of full detection every frame with the hybrid on a moving ball
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import time
+
+import cv2
+import numpy as np
+
+HIST_BINS = (16, 8)             # hue, saturation bins of the ball model
+HIST_RANGES = (0, 180, 0, 256)
+
+
+################################################
+# ROI Tracker
+################################################
+
+
+class RoiTracker:
+
+    def __init__(self, search_scale=3.0, min_window=8, min_saturation=50, min_value=50):
+        # window side as a multiple of the ball diameter, and never smaller than min_window pixels
+        self.search_scale = search_scale
+        self.min_window = min_window
+        # pixels darker or greyer than this do not go into the model (same floor as the colour profiles)
+        self.model_lower = np.array([0, min_saturation, min_value])
+        self.model_upper = np.array([179, 255, 255])
+        self.term_criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.5)
+        self.reset()
+
+    def reset(self):
+        self.hist = None
+        self.center, self.radius, self.sigma = None, None, None
+        self.reference_mass = None
+
+    @property
+    def ready(self):
+        return self.hist is not None
+
+    def window(self, shape, center, radius):
+        # square search window around the ball, clipped to the frame
+        half = max(self.search_scale * radius, self.min_window / 2)
+        x0, y0 = max(int(center[0] - half), 0), max(int(center[1] - half), 0)
+        x1, y1 = min(int(np.ceil(center[0] + half)) + 1, shape[1]), min(int(np.ceil(center[1] + half)) + 1, shape[0])
+        return x0, y0, x1, y1
+
+    def back_project(self, frame, roi):
+        x0, y0, x1, y1 = roi
+        hsv = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2HSV)
+        return hsv, cv2.calcBackProject([hsv], [0, 1], self.hist, HIST_RANGES, 1)
+
+    def ball_window(self, center, radius, roi):
+        # the ball's own box inside the search window, in window coordinates
+        x0, y0 = roi[0], roi[1]
+        r = max(int(np.ceil(radius)), 1)
+        return (int(round(center[0])) - x0 - r, int(round(center[1])) - y0 - r, 2 * r + 1, 2 * r + 1)
+
+    def init(self, frame, center, radius, sigma):
+        # model the ball from the pixels of the full detection
+        roi = self.window(frame.shape, center, radius)
+        x0, y0, x1, y1 = roi
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            self.reset()
+            return
+        hsv = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2HSV)
+        ball_mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
+        cv2.circle(ball_mask, (int(round(center[0])) - x0, int(round(center[1])) - y0), max(int(round(radius)), 1), 255, -1)
+        cv2.bitwise_and(ball_mask, cv2.inRange(hsv, self.model_lower, self.model_upper), dst=ball_mask)
+        hist = cv2.calcHist([hsv], [0, 1], ball_mask, list(HIST_BINS), HIST_RANGES)
+        if hist.sum() <= 0:
+            self.reset()
+            return
+        self.hist = cv2.normalize(hist, None, 0, 255, cv2.NORM_MINMAX)
+        self.center, self.radius, self.sigma = (float(center[0]), float(center[1])), float(radius), float(sigma)
+        _, back = self.back_project(frame, roi)
+        self.reference_mass = max(float(back.sum()), 1.0)
+
+    def track(self, frame):
+        # (center, radius, confidence, sigma) in frame pixels, or None when there is no model
+        if not self.ready:
+            return None
+        roi = self.window(frame.shape, self.center, self.radius)
+        x0, y0, x1, y1 = roi
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return None
+        _, back = self.back_project(frame, roi)
+        start = self.ball_window(self.center, self.radius, roi)
+        _, (bx, by, bw, bh) = cv2.meanShift(back, start, self.term_criteria)
+        # float centre from the back-projection under the converged box
+        M = cv2.moments(back[by:by + bh, bx:bx + bw])
+        if M["m00"] <= 0:
+            return None
+        cx, cy = x0 + bx + M["m10"] / M["m00"], y0 + by + M["m01"] / M["m00"]
+        confidence = min(M["m00"] / 255 / (self.reference_mass / 255), 1.0)
+        # less of the ball under the box means a less certain centre
+        sigma = self.sigma + (1.0 - confidence) * self.radius / 2
+        self.center = (cx, cy)
+        return self.center, self.radius, confidence, sigma
+
+
+################################################
+# Detection Scheduler
+################################################
+
+
+class DetectionScheduler:
+
+    def __init__(self, min_interval=1, max_interval=6, min_confidence=0.6, agreement_px=2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # below this tracker confidence the next frame gets a full detection
+        self.min_confidence = min_confidence
+        # tracker and detector within max(agreement_px, radius / 2) count as agreeing
+        self.agreement_px = agreement_px
+        self.reset()
+
+    def reset(self):
+        self.interval = self.min_interval
+        self.frames_since_detection = 0
+        self.force = True
+
+    def detection_due(self):
+        return self.force or self.frames_since_detection + 1 >= self.interval
+
+    def tracked(self, confidence):
+        # a frame handled by the roi tracker
+        self.frames_since_detection += 1
+        if confidence is None or confidence < self.min_confidence:
+            self.force = True
+
+    def detected(self, tracked_center, detected_center, radius):
+        # a full detection: widen the interval while the tracker was right, drop it when not
+        self.frames_since_detection = 0
+        self.force = False
+        if detected_center is None:
+            self.interval = self.min_interval
+            self.force = True
+        elif tracked_center is not None:
+            error = np.hypot(tracked_center[0] - detected_center[0], tracked_center[1] - detected_center[1])
+            if error <= max(self.agreement_px, radius / 2):
+                self.interval = min(self.interval + 1, self.max_interval)
+            else:
+                self.interval = self.min_interval
+
+
+################################################
+# Benchmark
+################################################
+
+
+def benchmark(size=(256, 256), frames=600):
+    from parsight.color_profiles import DEFAULT_PROFILES
+    from parsight.detector import ColorBlobDetector
+    rng = np.random.default_rng(0)
+    background = np.clip(rng.normal((40, 140, 60), 20, (size[1], size[0], 3)), 0, 255).astype(np.uint8)
+    detector = ColorBlobDetector(DEFAULT_PROFILES["red_ball"])
+    tracker, scheduler = RoiTracker(), DetectionScheduler()
+    frame = np.empty_like(background)
+
+    def ball_at(i):
+        t = i / 60
+        return (size[0] / 2 + 70 * np.cos(t), size[1] / 2 + 50 * np.sin(1.7 * t)), 8.0
+
+    def render(i):
+        np.copyto(frame, background)
+        (x, y), r = ball_at(i)
+        cv2.circle(frame, (int(round(x * 16)), int(round(y * 16))), int(r * 16), (32, 29, 200), -1, shift=4)
+        return frame
+
+    def best(detections):
+        return max(detections, key=lambda d: d[1] * d[2]) if detections else None
+
+    for name in ("full", "hybrid"):
+        scheduler.reset()
+        tracker.reset()
+        times, errors, full_runs = np.empty(frames), np.empty(frames), 0
+        for i in range(frames):
+            render(i)
+            start = time.perf_counter()
+            if name == "hybrid" and tracker.ready and not scheduler.detection_due():
+                result = tracker.track(frame)
+                scheduler.tracked(result[2] if result else None)
+                center = result[0] if result else None
+            else:
+                tracked = tracker.center if tracker.ready else None
+                found = best(detector.detect(frame))
+                full_runs += 1
+                center = found[0] if found else None
+                scheduler.detected(tracked, center, found[1] if found else 0.0)
+                if found is not None:
+                    tracker.init(frame, found[0], found[1], found[3])
+            times[i] = time.perf_counter() - start
+            truth = ball_at(i)[0]
+            errors[i] = np.hypot(center[0] - truth[0], center[1] - truth[1]) if center else np.nan
+        print(f"{name:>7}: {times.mean() * 1000:.3f} ms per frame | full detections {full_runs}/{frames} | "
+              f"centre error mean {np.nanmean(errors):.2f} px max {np.nanmax(errors):.2f} px | lost {np.isnan(errors).sum()}")
+
+
+if __name__ == "__main__":
+    benchmark()
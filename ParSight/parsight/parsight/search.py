@@ -0,0 +1,120 @@
+################################################
+# Descriptions
+################################################
+
+'''
+search planner for acquiring and reacquiring the ball
+generates a spiral or lawnmower coverage pattern inside the safety bounds,
+centred on (or starting nearest to) the last predicted ball position,
+lawnmower rows are swept in order outward from the row nearest that point
+keeps a coverage grid of the ground the camera footprint has already seen and
+skips waypoints whose footprint is already covered
+the compute node stops the search as soon as a confident detection returns
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import numpy as np
+
+
+################################################
+# Search Planner
+################################################
+
+
+class SearchPlanner:
+
+    def __init__(self, bounds, cell_size=0.2, overlap=0.3, reach_tol=0.15, covered_fraction=0.9, pattern="spiral"):
+        # bounds is the node's safety dict, only x/y are used
+        self.x_min, self.x_max = bounds["x_min"], bounds["x_max"]
+        self.y_min, self.y_max = bounds["y_min"], bounds["y_max"]
+        self.cell_size = cell_size
+        self.overlap = overlap                      # fraction of footprint shared by neighbouring passes
+        self.reach_tol = reach_tol                  # metres from a waypoint to count it as reached
+        self.covered_fraction = covered_fraction    # footprint fraction seen before a waypoint is skipped
+        self.pattern = pattern
+        nx = int(np.ceil((self.x_max - self.x_min) / cell_size))
+        ny = int(np.ceil((self.y_max - self.y_min) / cell_size))
+        self.covered = np.zeros((nx, ny), dtype=bool)
+        self.waypoints = []
+        self.active = False
+
+    def cell_range(self, center, half_width):
+        # grid index window for a square footprint
+        x0 = int(np.clip((center[0] - half_width - self.x_min) / self.cell_size, 0, self.covered.shape[0]))
+        x1 = int(np.clip(np.ceil((center[0] + half_width - self.x_min) / self.cell_size), 0, self.covered.shape[0]))
+        y0 = int(np.clip((center[1] - half_width - self.y_min) / self.cell_size, 0, self.covered.shape[1]))
+        y1 = int(np.clip(np.ceil((center[1] + half_width - self.y_min) / self.cell_size), 0, self.covered.shape[1]))
+        return slice(x0, x1), slice(y0, y1)
+
+    def mark_covered(self, position, half_width):
+        # the ground under the camera footprint has been looked at
+        self.covered[self.cell_range(position, half_width)] = True
+
+    def footprint_covered(self, waypoint, half_width):
+        window = self.covered[self.cell_range(waypoint, half_width)]
+        return window.size == 0 or window.mean() >= self.covered_fraction
+
+    def clip(self, point):
+        return np.array([np.clip(point[0], self.x_min, self.x_max), np.clip(point[1], self.y_min, self.y_max)])
+
+    def start(self, bias_point, half_width):
+        # bias_point is the last predicted ball position (or the drone position if none)
+        self.active = True
+        spacing = max(2 * half_width * (1 - self.overlap), self.cell_size)
+        if self.pattern == "lawnmower":
+            self.waypoints = self.lawnmower(bias_point, spacing)
+        else:
+            self.waypoints = self.spiral(bias_point, spacing)
+
+    def stop(self):
+        self.active = False
+        self.waypoints = []
+
+    def reset_coverage(self):
+        self.covered[:] = False
+
+    def spiral(self, center, spacing):
+        # archimedean spiral r = spacing * theta / 2pi, sampled about every spacing metres
+        max_radius = np.hypot(self.x_max - self.x_min, self.y_max - self.y_min)
+        waypoints, theta = [self.clip(center)], 0.0
+        while True:
+            radius = spacing * theta / (2 * np.pi)
+            if radius > max_radius:
+                break
+            point = self.clip(np.asarray(center) + radius * np.array([np.cos(theta), np.sin(theta)]))
+            if np.linalg.norm(point - waypoints[-1]) >= spacing / 2:
+                waypoints.append(point)
+            theta += spacing / max(radius, spacing)
+        return waypoints
+
+    def lawnmower(self, start_point, spacing):
+        # rows along y, swept in order from the row nearest the start point to the nearer edge,
+        # then once across to the rows on the other side, so no covered row is crossed twice
+        rows = np.arange(self.x_min + spacing / 2, self.x_max, spacing)
+        nearest = int(np.argmin(np.abs(rows - start_point[0])))
+        if nearest < len(rows) - 1 - nearest:
+            order = np.concatenate((rows[nearest::-1], rows[nearest + 1:]))
+        else:
+            order = np.concatenate((rows[nearest:], rows[:nearest][::-1]))
+        waypoints, forward = [], start_point[1] <= (self.y_min + self.y_max) / 2
+        for x in order:
+            ends = (self.y_min, self.y_max) if forward else (self.y_max, self.y_min)
+            waypoints.extend([np.array([x, ends[0]]), np.array([x, ends[1]])])
+            forward = not forward
+        return waypoints
+
+    def next_waypoint(self, position, half_width):
+        # drop waypoints already reached or already seen, restart when the area is covered
+        self.mark_covered(position, half_width)
+        while self.waypoints and (
+                np.linalg.norm(self.waypoints[0] - np.asarray(position)) < self.reach_tol
+                or self.footprint_covered(self.waypoints[0], half_width)):
+            self.waypoints.pop(0)
+        if not self.waypoints:
+            self.reset_coverage()
+            self.start(position, half_width)
+        return self.waypoints[0]
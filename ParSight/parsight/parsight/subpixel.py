@@ -0,0 +1,96 @@
+################################################
+# Descriptions
+################################################
+
+'''
+sub-pixel centre and radius of a blob, with an uncertainty estimate
+the blurred mask is used as a soft coverage map: intensity weighted moments
+over the blob's window give a float centre, and the mass under the blur
+(which the blur preserves) gives the radius of the disc with that area
+the uncertainty comes from the edge: every edge pixel of the 0/1 mask moves
+the blob by a uniform +-1/2 pixel (variance 1/12), and across a blurred edge
+the w(1 - w) of the coverage w adds up to blur_sigma / sqrt(pi) per edge pixel,
+so the w(1 - w) weighted moments rescaled by that give the standard deviation
+of the centre and of the radius in pixels
+for a plain 0/1 mask (fused kernel) only the radius is known, the same edge
+model then gives sigma = 1 / sqrt(12 pi r)
+running this file directly compares it with the contour centroid on discs at
+known sub-pixel positions
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import cv2
+import numpy as np
+
+
+################################################
+# Refinement
+################################################
+
+
+def binary_center_sigma(radius):
+    # edge pixels of a disc of radius r each move the centre by a uniform +-1/2 pixel
+    return 1.0 / np.sqrt(12 * np.pi * max(radius, 0.5))
+
+
+def refine_blob(mask, rect, blur_sigma=2.0):
+    # mask: blurred 0-255 mask, rect: (x, y, w, h) window holding the whole blob
+    # returns (center, radius, center_sigma, radius_sigma) in pixels of the mask
+    x, y, w, h = rect
+    window = mask[y:y + h, x:x + w].astype(np.float32) * (1.0 / 255.0)
+    mass = float(window.sum())
+    if mass <= 0:
+        return None
+    # moments of the coverage map, pixel centres at integer coordinates like cv2.moments
+    xs = np.arange(x, x + w, dtype=np.float32)
+    ys = np.arange(y, y + h, dtype=np.float32)
+    column_mass, row_mass = window.sum(axis=0), window.sum(axis=1)
+    cx = float(column_mass @ xs) / mass
+    cy = float(row_mass @ ys) / mass
+    radius = (mass / np.pi) ** 0.5
+    # quantisation variance of the edge, from the blurred edge profile
+    edge = window * (1.0 - window) * (np.sqrt(np.pi) / (12 * blur_sigma))
+    var_x = float(edge.sum(axis=0) @ (xs - cx) ** 2) / mass ** 2
+    var_y = float(edge.sum(axis=1) @ (ys - cy) ** 2) / mass ** 2
+    center_sigma = ((var_x + var_y) / 2) ** 0.5
+    radius_sigma = float(edge.sum()) ** 0.5 / (2 * np.pi * radius)
+    return (cx, cy), radius, center_sigma, radius_sigma
+
+
+################################################
+# Verification
+################################################
+
+
+def render_disc(size, center, radius, supersample=8):
+    # anti-aliased binary disc rendered on a fine grid, averaged down to coverage, then thresholded like inRange
+    fine = np.zeros((size * supersample, size * supersample), dtype=np.uint8)
+    c = ((center[0] + 0.5) * supersample - 0.5, (center[1] + 0.5) * supersample - 0.5)
+    cv2.circle(fine, (int(round(c[0] * 16)), int(round(c[1] * 16))), int(round(radius * supersample * 16)), 255, -1, shift=4)
+    coverage = cv2.resize(fine, (size, size), interpolation=cv2.INTER_AREA)
+    return np.where(coverage >= 128, 255, 0).astype(np.uint8)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    for radius in (2.5, 4.0, 8.0):
+        contour_err, refined_err, rounded_err, radius_err, sigmas = [], [], [], [], []
+        for _ in range(300):
+            center = rng.uniform(30, 34, 2)
+            mask = render_disc(64, center, radius)
+            blurred = cv2.GaussianBlur(mask, (9, 9), 2)
+            cnt = max(cv2.findContours(blurred, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0], key=cv2.contourArea)
+            M = cv2.moments(cnt)
+            contour_center = np.array([M["m10"] / M["m00"], M["m01"] / M["m00"]])
+            refined, r, sigma, _ = refine_blob(blurred, cv2.boundingRect(cnt))
+            contour_err.append(np.hypot(*(contour_center - center)))
+            rounded_err.append(np.hypot(*(np.round(contour_center) - center)))
+            refined_err.append(np.hypot(*(np.array(refined) - center)))
+            radius_err.append(abs(r - radius))
+            sigmas.append(sigma)
+        print(f"r={radius:>4}: centre error rounded {np.mean(rounded_err):.3f} px | contour {np.mean(contour_err):.3f} px | "
+              f"refined {np.mean(refined_err):.3f} px (sigma {np.mean(sigmas):.3f}) | radius error {np.mean(radius_err):.3f} px")
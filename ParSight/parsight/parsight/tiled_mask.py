@@ -0,0 +1,104 @@
+################################################
+# Descriptions
+################################################
+
+'''
+stripe-parallel mask and blur for high resolution frames (720p / 1080p search)
+the frame is cut into horizontal stripes, each with a halo of rows above and
+below as wide as the blur radius, and every stripe runs colour conversion,
+masking and blur on a thread pool (opencv releases the GIL)
+only the interior rows of each stripe are copied into the full mask, so the
+result matches the single threaded mask exactly, and the blobs are then found
+once on the merged mask
+the pool lives as long as its detector, ColorBlobDetector.close shuts it down
+running this module (python -m parsight.tiled_mask) checks that and times both paths
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import cv2
+import numpy as np
+
+from parsight.color_profiles import mask_profile
+from parsight.frame_buffers import FrameBufferPool
+
+
+################################################
+# Tiled Masker
+################################################
+
+
+class TiledMasker:
+
+    def __init__(self, n_stripes=4, n_threads=4):
+        self.n_stripes = n_stripes
+        self.executor = ThreadPoolExecutor(max_workers=n_threads)
+        self.shape, self.halo = None, None
+
+    def allocate(self, shape, halo):
+        # stripe bounds and per-stripe scratch buffers, once per frame shape and blur size
+        self.shape, self.halo = shape, halo
+        height = shape[0]
+        edges = np.linspace(0, height, self.n_stripes + 1).astype(int)
+        self.stripes = []
+        for y0, y1 in zip(edges[:-1], edges[1:]):
+            h0, h1 = max(y0 - halo, 0), min(y1 + halo, height)
+            pool = FrameBufferPool()
+            pool.allocate((h1 - h0, shape[1], 3))
+            self.stripes.append((y0, y1, h0, h1, pool))
+        self.mask = np.empty(shape[:2], dtype=np.uint8)
+
+    def mask_stripe(self, frame, stripe, profile):
+        # same stages as ColorBlobDetector.compute_mask, on the stripe plus its halo
+        y0, y1, h0, h1, buf = stripe
+        blurred = mask_profile(frame[h0:h1], profile, buf)
+        # only the interior rows are valid, the halo rows belong to the neighbours
+        self.mask[y0:y1] = blurred[y0 - h0:y1 - h0]
+
+    def compute_mask(self, frame, profile):
+        # rows each stripe borrows from its neighbours so the blur sees real data at the seams
+        halo = profile.blur_size // 2
+        if self.shape != frame.shape or self.halo != halo:
+            self.allocate(frame.shape, halo)
+        futures = [self.executor.submit(self.mask_stripe, frame, stripe, profile) for stripe in self.stripes]
+        for future in futures:
+            future.result()
+        return self.mask
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+################################################
+# Verification and Benchmark
+################################################
+
+
+def benchmark(size=(1920, 1080), iterations=100):
+    from parsight.color_profiles import DEFAULT_PROFILES
+    from parsight.detector import ColorBlobDetector
+    rng = np.random.default_rng(0)
+    frame = np.clip(rng.normal((40, 140, 60), 20, (size[1], size[0], 3)), 0, 255).astype(np.uint8)
+    cv2.circle(frame, (size[0] // 3, size[1] // 2), 30, (32, 29, 200), -1)
+    # put a ball right on a stripe seam as well
+    cv2.circle(frame, (size[0] // 2, size[1] // 4), 30, (32, 29, 200), -1)
+    single = ColorBlobDetector(DEFAULT_PROFILES["red_ball"], tiled_min_height=size[1] + 1)
+    tiled = ColorBlobDetector(**dict(single.config(), tiled_min_height=0))
+    print(f"identical mask: {np.array_equal(single.compute_mask(frame), tiled.compute_mask(frame))}")
+    print(f"single: {sorted(single.detect(frame))}")
+    print(f" tiled: {sorted(tiled.detect(frame))}")
+    for name, detector in (("single", single), ("tiled", tiled)):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            detector.detect(frame)
+        print(f"{name:>7}: {(time.perf_counter() - start) / iterations * 1000:.2f} ms per frame")
+
+
+if __name__ == "__main__":
+    benchmark()
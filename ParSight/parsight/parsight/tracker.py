@@ -0,0 +1,162 @@
+################################################
+# Descriptions
+################################################
+
+'''
+multi-candidate tracker for the compute node
+every red blob becomes a detection, detections are associated to existing
+tracks with a gated assignment (hungarian if scipy is around, greedy
+nearest-neighbour otherwise), and each track keeps a constant velocity
+estimate and a confidence built up over its history
+the target is the most confident established track, and the lock only moves
+to another track when that one is clearly better, so one bad frame of a red
+flag or shirt cannot steal the lock
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import numpy as np
+
+# optional, the greedy assignment is used when scipy is not installed
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+
+################################################
+# Track
+################################################
+
+
+class Track:
+
+    def __init__(self, track_id, center, radius, quality, sigma, timestamp):
+        self.track_id = track_id
+        self.position = np.array(center, dtype=float)
+        self.velocity = np.zeros(2)
+        self.radius = radius
+        self.sigma = sigma
+        self.confidence = quality
+        self.hits = 1
+        self.misses = 0
+        self.last_time = timestamp
+
+    def predict(self, timestamp):
+        # constant velocity prediction to the current frame time
+        dt = max(timestamp - self.last_time, 0.0)
+        return self.position + self.velocity * dt
+
+    def update(self, center, radius, quality, sigma, timestamp, alpha=0.6, beta=0.3, confidence_gain=0.3):
+        # alpha-beta filter on position and velocity
+        dt = max(timestamp - self.last_time, 1e-3)
+        predicted = self.position + self.velocity * dt
+        residual = np.asarray(center, dtype=float) - predicted
+        self.position = predicted + alpha * residual
+        self.velocity = self.velocity + (beta / dt) * residual
+        self.radius = radius
+        self.sigma = sigma
+        # confidence follows the quality of the detections it keeps getting
+        self.confidence += confidence_gain * (quality - self.confidence)
+        self.hits += 1
+        self.misses = 0
+        self.last_time = timestamp
+
+    def mark_missed(self, timestamp, confidence_decay=0.7):
+        # coast on the prediction and lose confidence
+        self.position = self.predict(timestamp)
+        self.last_time = timestamp
+        self.confidence *= confidence_decay
+        self.misses += 1
+
+    def score(self, min_hits):
+        # history matters: a fresh track cannot outscore an established one
+        return self.confidence * min(self.hits / min_hits, 1.0)
+
+
+################################################
+# Multi Target Tracker
+################################################
+
+
+class MultiTargetTracker:
+
+    def __init__(self, gate_px=40.0, max_misses=8, min_hits=3, switch_margin=0.2, max_tracks=8):
+        # gate_px is in full frame pixels around each predicted track position
+        self.gate_px = gate_px
+        self.max_misses = max_misses
+        self.min_hits = min_hits
+        self.switch_margin = switch_margin
+        self.max_tracks = max_tracks
+        self.tracks = []
+        self.target_id = None
+        self.next_id = 0
+
+    def reset(self):
+        self.tracks = []
+        self.target_id = None
+
+    def associate(self, predictions, centers):
+        # returns (track index, detection index) pairs inside the gate
+        if len(predictions) == 0 or len(centers) == 0:
+            return []
+        cost = np.linalg.norm(predictions[:, None, :] - centers[None, :, :], axis=2)
+        gated = cost > self.gate_px
+        if linear_sum_assignment is not None:
+            rows, cols = linear_sum_assignment(np.where(gated, 1e6, cost))
+            return [(r, c) for r, c in zip(rows, cols) if not gated[r, c]]
+        # greedy nearest neighbour on the sorted gated pairs
+        pairs, used_tracks, used_detections = [], set(), set()
+        for flat in np.argsort(cost, axis=None):
+            r, c = np.unravel_index(flat, cost.shape)
+            if gated[r, c]:
+                break
+            if r in used_tracks or c in used_detections:
+                continue
+            pairs.append((r, c))
+            used_tracks.add(r)
+            used_detections.add(c)
+        return pairs
+
+    def update(self, detections, timestamp):
+        # detections: list of (center, radius, quality, sigma) in full frame pixels
+        centers = np.array([d[0] for d in detections], dtype=float).reshape(-1, 2)
+        predictions = np.array([t.predict(timestamp) for t in self.tracks], dtype=float).reshape(-1, 2)
+        pairs = self.associate(predictions, centers)
+
+        matched_tracks = {r for r, _ in pairs}
+        matched_detections = {c for _, c in pairs}
+        for r, c in pairs:
+            center, radius, quality, sigma = detections[c]
+            self.tracks[r].update(center, radius, quality, sigma, timestamp)
+        for r, track in enumerate(self.tracks):
+            if r not in matched_tracks:
+                track.mark_missed(timestamp)
+
+        # unmatched detections start new tracks, best quality first
+        for c in sorted(set(range(len(detections))) - matched_detections, key=lambda c: -detections[c][2]):
+            center, radius, quality, sigma = detections[c]
+            self.tracks.append(Track(self.next_id, center, radius, quality, sigma, timestamp))
+            self.next_id += 1
+
+        # drop dead tracks and keep the table small
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        self.tracks.sort(key=lambda t: -t.score(self.min_hits))
+        del self.tracks[self.max_tracks:]
+        return self.select_target()
+
+    def select_target(self):
+        # keep the current lock unless another track is clearly better
+        established = [t for t in self.tracks if t.hits >= self.min_hits]
+        current = next((t for t in self.tracks if t.track_id == self.target_id), None)
+        best = established[0] if established else None
+        if current is not None and (best is None or best.score(self.min_hits) < current.score(self.min_hits) + self.switch_margin):
+            best = current
+        self.target_id = best.track_id if best is not None else None
+        # only report a target that was actually seen this frame
+        if best is None or best.misses > 0:
+            return None
+        return best
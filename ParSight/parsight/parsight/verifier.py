@@ -0,0 +1,179 @@
+################################################
+# Descriptions
+################################################
+
+'''
+optional verification stage for the blob candidates
+colour and roundness alone still let through red flags, tees and clothing, so
+the top K candidates (ranked by the profile score) are cut out as small
+patches around the blob, described with HOG style gradient histograms and
+scored by a linear classifier
+candidates ranked below K are passed on unscored and unchanged (the verifier
+only has a say over the ones it looked at), unless drop_unverified is set
+patch and feature buffers are allocated once and the gradients, histograms and
+scores are computed for the whole batch of candidates at once, so K patches
+cost well under a millisecond
+the weights come from ros-bag-scripts/train_verifier.py (a .npz file), without
+a model the stage is simply not used
+running this module (python -m parsight.verifier [model.npz]) times the stage,
+with random weights when no model is given
+'''
+
+
+################################################
+# Imports and Setup
+################################################
+
+import time
+
+import cv2
+import numpy as np
+
+PATCH_SIZE = 24         # side of the patch the classifier sees
+CELL_SIZE = 6           # histogram cell side, blocks are 2x2 cells at a one cell stride
+ORIENTATIONS = 9        # unsigned gradient orientation bins
+CONTEXT = 3.0           # patch side as a multiple of the blob radius
+MIN_WINDOW = 8.0        # smallest window (pixels of the frame) a patch is cut from
+
+
+################################################
+# Patch Features
+################################################
+
+
+def patch_features(gray, out=None):
+    # HOG style descriptor for a batch of grey patches (n, size, size), computed with numpy
+    # so it does not depend on the objdetect module of the installed opencv
+    n, size = gray.shape[0], gray.shape[1]
+    cells = size // CELL_SIZE
+    gx = np.zeros(gray.shape, dtype=np.float32)
+    gy = np.zeros(gray.shape, dtype=np.float32)
+    gx[:, :, 1:-1] = gray[:, :, 2:] - gray[:, :, :-2]
+    gy[:, 1:-1, :] = gray[:, 2:, :] - gray[:, :-2, :]
+    magnitude = np.hypot(gx, gy)
+    orientation = np.arctan2(gy, gx) % np.pi
+    bins = np.minimum((orientation * (ORIENTATIONS / np.pi)).astype(np.int64), ORIENTATIONS - 1)
+    # histogram index of every pixel: patch, cell row, cell column, orientation bin
+    rows = np.arange(size) // CELL_SIZE
+    cell_index = (rows[:, None] * cells + rows[None, :]) * ORIENTATIONS
+    index = (np.arange(n)[:, None, None] * cells * cells * ORIENTATIONS + cell_index + bins).ravel()
+    hist = np.bincount(index, weights=magnitude.ravel(), minlength=n * cells * cells * ORIENTATIONS)
+    hist = hist.reshape(n, cells, cells, ORIENTATIONS)
+    # overlapping 2x2 cell blocks, each L2 normalised
+    blocks = np.concatenate([hist[:, :-1, :-1], hist[:, :-1, 1:], hist[:, 1:, :-1], hist[:, 1:, 1:]], axis=3)
+    blocks /= np.sqrt((blocks ** 2).sum(axis=3, keepdims=True)) + 1e-6
+    features = blocks.reshape(n, -1)
+    if out is None:
+        return features.astype(np.float32)
+    out[:n] = features
+    return out[:n]
+
+
+def feature_length(patch_size=PATCH_SIZE):
+    blocks = patch_size // CELL_SIZE - 1
+    return blocks * blocks * 4 * ORIENTATIONS
+
+
+def extract_patch(frame, center, radius, dst, context=CONTEXT):
+    # square window around the blob, scaled to the patch size in a single warp
+    size = dst.shape[0]
+    window = max(context * 2 * radius, MIN_WINDOW)
+    scale = size / window
+    M = np.array([[scale, 0.0, size / 2 - scale * center[0]],
+                  [0.0, scale, size / 2 - scale * center[1]]])
+    return cv2.warpAffine(frame, M, (size, size), dst=dst, flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def candidate_rank(candidate):
+    # same score the offboard trackers rank contours by: round and large wins
+    _, radius, quality, _ = candidate
+    area = max(np.pi * radius ** 2, 1.0)
+    return quality * 2 * np.log(area)
+
+
+################################################
+# Candidate Verifier
+################################################
+
+
+class CandidateVerifier:
+
+    def __init__(self, model_path, top_k=4, threshold=None, drop_unverified=False):
+        model = np.load(model_path)
+        self.model_path = model_path
+        self.weights = model["weights"].astype(np.float32)
+        self.bias = float(model["bias"])
+        # feature standardisation from training, folded into the weights
+        mean, std = model["mean"].astype(np.float32), model["std"].astype(np.float32)
+        self.weights = self.weights / std
+        self.bias = self.bias - float(mean @ self.weights)
+        self.patch_size = int(model["patch_size"])
+        self.context = float(model["context"])
+        self.threshold = float(model["threshold"]) if threshold is None else threshold
+        self.top_k = top_k
+        self.drop_unverified = drop_unverified
+        if self.weights.shape[0] != feature_length(self.patch_size):
+            raise ValueError(f"{model_path} does not match the {self.patch_size}px patch descriptor")
+        # cached preprocessing, nothing is allocated per candidate
+        self.patch = np.empty((self.patch_size, self.patch_size, 3), dtype=np.uint8)
+        self.gray_patches = np.empty((top_k, self.patch_size, self.patch_size), dtype=np.uint8)
+        self.gray = np.empty((top_k, self.patch_size, self.patch_size), dtype=np.float32)
+        self.features = np.empty((top_k, self.weights.shape[0]), dtype=np.float32)
+        self.scores = np.empty(top_k, dtype=np.float32)
+
+    def probabilities(self, frame, candidates):
+        # ball probability for each candidate, the batch is described and scored together
+        n = len(candidates)
+        for i, (center, radius, _, _) in enumerate(candidates):
+            patch = extract_patch(frame, center, radius, self.patch, self.context)
+            cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY, dst=self.gray_patches[i])
+        np.copyto(self.gray[:n], self.gray_patches[:n])
+        features = patch_features(self.gray[:n], self.features)
+        scores = np.dot(features, self.weights, out=self.scores[:n])
+        scores += self.bias
+        return 1.0 / (1.0 + np.exp(-scores))
+
+    def verify(self, frame, candidates):
+        # the top K candidates are scored and the ones the classifier rejects are dropped,
+        # the rest follow unscored (or are dropped too with drop_unverified)
+        if not candidates:
+            return candidates
+        ranked = sorted(candidates, key=candidate_rank, reverse=True)
+        top, rest = ranked[:self.top_k], ranked[self.top_k:]
+        probabilities = self.probabilities(frame, top)
+        verified = [(center, radius, quality * p, sigma)
+                    for (center, radius, quality, sigma), p in zip(top, probabilities) if p >= self.threshold]
+        return verified if self.drop_unverified else verified + rest
+
+
+################################################
+# Benchmark
+################################################
+
+
+def random_model(path, patch_size=PATCH_SIZE, seed=0):
+    # untrained weights in the train_verifier.py layout, enough to time the stage
+    rng = np.random.default_rng(seed)
+    n = feature_length(patch_size)
+    np.savez(path, weights=rng.normal(0, 0.1, n), bias=0.0, mean=np.zeros(n), std=np.ones(n),
+             patch_size=patch_size, context=CONTEXT, threshold=0.5)
+    return path
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import tempfile
+    if len(sys.argv) > 1:
+        verifier = CandidateVerifier(sys.argv[1])
+    else:
+        print("no model given (python -m parsight.verifier model.npz), timing random weights")
+        verifier = CandidateVerifier(random_model(os.path.join(tempfile.mkdtemp(), "random_verifier.npz")))
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (128, 128, 3), dtype=np.uint8)
+    candidates = [((rng.uniform(10, 118), rng.uniform(10, 118)), rng.uniform(2, 8), 0.9, 0.1) for _ in range(8)]
+    iterations = 2000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        verifier.verify(frame, candidates)
+    print(f"top {verifier.top_k} of {len(candidates)} candidates: {(time.perf_counter() - start) / iterations * 1000:.3f} ms")
@@ -0,0 +1,98 @@
+import pytest
+
+from parsight.adaptive_resolution import AdaptiveResolutionController
+
+
+def controller(**kwargs):
+    # the node's ladder and budget, 128 to start
+    return AdaptiveResolutionController(**dict(dict(start_width=128, latency_budget_s=0.008, patience=5), **kwargs))
+
+
+def run(resolution, frames, radius, confidence, latency, sigma=None):
+    # widths after each frame
+    widths = []
+    for _ in range(frames):
+        resolution.update(radius, confidence, latency, sigma)
+        widths.append(resolution.width)
+    return widths
+
+
+def test_starts_at_the_nearest_level():
+    assert controller(start_width=120).width == 128
+    assert controller(start_width=1000).width == 256
+
+
+@pytest.mark.parametrize("radius, confidence", [(None, None), (6.0, 0.3)])
+def test_lost_or_unconfident_steps_up_when_the_budget_allows(radius, confidence):
+    resolution = controller()
+    # 2 ms at 128 predicts 2 * (192 / 128) ** 2 = 4.5 ms at 192
+    assert run(resolution, 5, radius, confidence, 0.002)[-1] == 192
+
+
+def test_no_step_up_when_the_predicted_latency_is_over_budget():
+    resolution = controller()
+    # 5 ms at 128 fits the 8 ms budget, but predicts 11.25 ms at 192
+    assert run(resolution, 20, None, None, 0.005) == [128] * 20
+
+
+def test_small_ball_steps_up():
+    resolution = controller()
+    assert run(resolution, 5, 2.0, 0.9, 0.002)[-1] == 192
+
+
+def test_imprecise_centre_steps_up():
+    resolution = controller(max_center_sigma=0.25)
+    assert run(resolution, 5, 6.0, 0.9, 0.002, sigma=0.5)[-1] == 192
+    assert run(controller(max_center_sigma=0.25), 20, 6.0, 0.9, 0.002, sigma=0.1)[-1] == 128
+
+
+def test_over_budget_steps_down():
+    resolution = controller()
+    # even a lost ball does not hold the scale up when the stage runs over budget
+    assert run(resolution, 5, None, None, 0.012)[-1] == 96
+
+
+def test_large_ball_steps_down():
+    resolution = controller()
+    assert run(resolution, 5, 20.0, 0.9, 0.002)[-1] == 96
+
+
+def test_step_up_stops_short_of_pushing_the_ball_past_max_radius():
+    resolution = controller(min_radius_px=4.0, max_radius_px=12.0, max_center_sigma=0.25)
+    # a 9 px ball would be 13.5 px at 192, so an imprecise centre does not scale it up
+    assert run(resolution, 20, 9.0, 0.9, 0.002, sigma=0.5) == [128] * 20
+    # 7 px becomes 10.5 px, which still fits
+    assert run(resolution, 5, 7.0, 0.9, 0.002, sigma=0.5)[-1] == 192
+
+
+def test_change_needs_patience_agreeing_frames():
+    resolution = controller(patience=5)
+    assert run(resolution, 4, None, None, 0.002) == [128] * 4
+    assert resolution.update(None, None, 0.002) is True
+    assert resolution.width == 192
+
+
+def test_disagreeing_frame_restarts_the_count():
+    resolution = controller(patience=5)
+    run(resolution, 4, None, None, 0.002)
+    # a well sized ball votes for no change
+    run(resolution, 1, 6.0, 0.9, 0.002)
+    assert run(resolution, 4, None, None, 0.002) == [128] * 4
+    run(resolution, 1, None, None, 0.002)
+    assert resolution.width == 192
+
+
+def test_clamped_at_both_ends_of_the_ladder():
+    top = controller(start_width=256)
+    assert run(top, 20, None, None, 0.001) == [256] * 20
+    assert top.votes == 0
+    bottom = controller(start_width=64)
+    assert run(bottom, 20, 30.0, 0.9, 0.020) == [64] * 20
+    assert bottom.votes == 0
+
+
+def test_reset_forgets_latency_and_votes():
+    resolution = controller()
+    run(resolution, 3, None, None, 0.020)
+    resolution.reset(192)
+    assert resolution.width == 192 and resolution.latency_s is None and resolution.votes == 0
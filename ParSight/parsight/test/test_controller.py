@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from parsight.controller import (PDController, PIDController, FeedForwardPDController,
+                                 SetpointRateLimiter, make_controller)
+
+
+def test_pd_is_proportional_without_history():
+    controller = PDController(Kp=0.02, Kd=0.002)
+    output = controller.update((10.0, -5.0), 0.02)
+    assert np.allclose(output, [0.2, -0.1])
+
+
+def test_first_observation_has_no_derivative():
+    controller = PDController(Kp=0.0, Kd=1.0)
+    controller.observe((10.0, 0.0), 1.0)
+    assert np.allclose(controller.update((10.0, 0.0), 0.02), 0.0)
+
+
+def test_derivative_uses_estimate_timestamps():
+    controller = PDController(Kp=0.0, Kd=1.0, derivative_tau=0.0)
+    controller.observe((0.0, 0.0), 1.0)
+    controller.observe((3.0, -6.0), 1.1)
+    assert np.allclose(controller.d_error, [30.0, -60.0])
+
+
+def test_derivative_is_held_between_ticks():
+    controller = PDController(Kp=0.0, Kd=1.0, derivative_tau=0.05)
+    controller.observe((0.0, 0.0), 1.0)
+    controller.observe((1.0, 0.0), 1.033)
+    held = controller.update((1.0, 0.0), 0.02)
+    # repeated ticks on the same estimate neither zero nor change the derivative term
+    for _ in range(5):
+        assert np.allclose(controller.update((1.0, 0.0), 0.02), held)
+    assert held[0] > 0
+
+
+def test_derivative_ignores_out_of_order_estimates():
+    controller = PDController(Kp=0.0, Kd=1.0, derivative_tau=0.0)
+    controller.observe((0.0, 0.0), 1.0)
+    controller.observe((1.0, 0.0), 1.1)
+    controller.observe((5.0, 0.0), 1.1)
+    assert np.allclose(controller.d_error, [10.0, 0.0])
+
+
+def test_reset_forgets_history():
+    controller = PDController(Kp=0.0, Kd=1.0, derivative_tau=0.0)
+    controller.observe((0.0, 0.0), 1.0)
+    controller.observe((1.0, 0.0), 1.1)
+    controller.reset()
+    controller.observe((50.0, 0.0), 5.0)
+    assert np.allclose(controller.d_error, 0.0)
+
+
+def test_pid_integral_is_clamped():
+    controller = PIDController(Kp=0.0, Ki=1.0, Kd=0.0, integral_limit=2.0)
+    for _ in range(100):
+        output = controller.update((10.0, -10.0), 0.02)
+    assert np.allclose(output, [2.0, -2.0])
+
+
+def test_feed_forward_adds_error_rate():
+    controller = FeedForwardPDController(Kp=0.0, Kd=0.0, Kff=0.5)
+    assert np.allclose(controller.update((1.0, 1.0), 0.02, error_rate=(4.0, -2.0)), [2.0, -1.0])
+    assert np.allclose(controller.update((1.0, 1.0), 0.02), 0.0)
+
+
+def test_make_controller():
+    assert type(make_controller("pd", 1.0, 0.1)) is PDController
+    assert type(make_controller("pid", 1.0, 0.1, Ki=0.5)) is PIDController
+    assert type(make_controller("pd_ff", 1.0, 0.1, Kff=0.5)) is FeedForwardPDController
+    with pytest.raises(ValueError):
+        make_controller("bang_bang", 1.0, 0.1)
+
+
+def test_rate_limiter_starts_at_first_target():
+    limiter = SetpointRateLimiter(max_velocity=1.0, max_acceleration=2.0)
+    assert np.allclose(limiter.step((1.0, 2.0), 0.02), [1.0, 2.0])
+
+
+def test_rate_limiter_bounds_velocity_and_acceleration():
+    dt = 0.02
+    limiter = SetpointRateLimiter(max_velocity=1.0, max_acceleration=2.0)
+    limiter.reset((0.0, 0.0))
+    positions = np.array([limiter.step((10.0, 0.0), dt) for _ in range(200)])
+    velocities = np.diff(np.vstack(([0.0, 0.0], positions)), axis=0) / dt
+    speeds = np.linalg.norm(velocities, axis=1)
+    assert speeds.max() <= 1.0 + 1e-9
+    assert np.abs(np.diff(speeds)).max() <= 2.0 * dt + 1e-9
+
+
+def test_rate_limiter_settles_on_target_without_overshoot():
+    dt = 0.02
+    limiter = SetpointRateLimiter(max_velocity=1.0, max_acceleration=2.0)
+    limiter.reset((0.0, 0.0))
+    positions = np.array([limiter.step((1.0, 0.0), dt) for _ in range(500)])
+    assert positions[:, 0].max() <= 1.0 + 0.02
+    assert np.allclose(positions[-1], [1.0, 0.0], atol=1e-3)
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+
+from parsight.color_profiles import DEFAULT_PROFILES
+from parsight.detector import ColorBlobDetector
+
+
+def two_balls():
+    # a red and a white ball on grass
+    frame = np.full((120, 160, 3), (40, 140, 60), dtype=np.uint8)
+    cv2.circle(frame, (40, 60), 10, (32, 29, 200), -1)
+    cv2.circle(frame, (110, 50), 8, (253, 253, 252), -1)
+    return frame
+
+
+def test_single_profile_finds_its_ball():
+    detector = ColorBlobDetector(DEFAULT_PROFILES["red_ball"])
+    (center, radius, quality, sigma), = detector.detect(two_balls())
+    assert np.allclose(center, (40, 60), atol=0.5)
+    assert 8 < radius < 12 and quality > 0.8 and sigma > 0
+
+
+def test_extra_profiles_match_their_own_detectors():
+    frame = two_balls()
+    multi = ColorBlobDetector(DEFAULT_PROFILES["red_ball"], extra_profiles=[DEFAULT_PROFILES["white_ball"]])
+    found = multi.detect_all(frame)
+    assert set(found) == {"red_ball", "white_ball"}
+    for name in found:
+        assert found[name] == ColorBlobDetector(DEFAULT_PROFILES[name]).detect(frame)
+    assert multi.detect(frame) == found["red_ball"]
+
+
+def test_switching_to_an_extra_profile():
+    frame = two_balls()
+    multi = ColorBlobDetector(DEFAULT_PROFILES["red_ball"], extra_profiles=[DEFAULT_PROFILES["white_ball"]])
+    multi.set_profile(DEFAULT_PROFILES["white_ball"])
+    assert list(multi.detect_all(frame)) == ["white_ball"]
+    assert multi.detect(frame) == ColorBlobDetector(DEFAULT_PROFILES["white_ball"]).detect(frame)
+
+
+def test_config_round_trip_keeps_the_extras():
+    multi = ColorBlobDetector(DEFAULT_PROFILES["red_ball"], extra_profiles=[DEFAULT_PROFILES["white_ball"]])
+    copy = ColorBlobDetector(**multi.config())
+    assert set(copy.detect_all(two_balls())) == {"red_ball", "white_ball"}
@@ -0,0 +1,37 @@
+import numpy as np
+
+from parsight.frame_buffers import FrameBufferPool
+
+
+def test_buffers_are_empty_until_sized():
+    pool = FrameBufferPool()
+    assert pool.shape is None
+    assert pool.hsv is None and pool.blurred_mask is None
+
+
+def test_ensure_allocates_once_per_shape():
+    pool = FrameBufferPool()
+    assert pool.ensure((48, 64, 3))
+    assert pool.hsv.shape == (48, 64, 3)
+    assert pool.target_mask.shape == (48, 64)
+    hsv = pool.hsv
+    assert not pool.ensure((48, 64, 3))
+    assert pool.hsv is hsv
+
+
+def test_switching_back_reuses_the_cached_set():
+    pool = FrameBufferPool()
+    pool.ensure((48, 64, 3))
+    small = (pool.hsv, pool.combined_mask)
+    assert pool.ensure([96, 128, 3])
+    assert pool.hsv.shape == (96, 128, 3)
+    assert not pool.ensure((48, 64, 3))
+    assert pool.hsv is small[0] and pool.combined_mask is small[1]
+    assert pool.shape == (48, 64, 3)
+
+
+def test_scaled_frame_is_cached_per_size():
+    pool = FrameBufferPool()
+    first = pool.scaled_frame(64, 48)
+    assert first.shape == (48, 64, 3) and first.dtype == np.uint8
+    assert pool.scaled_frame(64, 48) is first
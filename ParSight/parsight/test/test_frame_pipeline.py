@@ -0,0 +1,151 @@
+import queue
+import time
+
+import cv2
+import numpy as np
+
+from parsight.color_profiles import DEFAULT_PROFILES
+from parsight.detector import ColorBlobDetector
+from parsight.frame_pipeline import FramePipeline
+
+
+def config(profile="red_ball"):
+    return ColorBlobDetector(DEFAULT_PROFILES[profile]).config()
+
+
+def ball_frame(x):
+    frame = np.full((120, 160, 3), (40, 140, 60), dtype=np.uint8)
+    cv2.circle(frame, (x, 60), 10, (32, 29, 200), -1)
+    return frame
+
+
+def offline_pipeline(**kwargs):
+    # ordering state only, results are put on the queue by the test instead of workers
+    pipeline = FramePipeline(config(), (120, 160, 3), n_workers=2, **kwargs)
+    pipeline.result_queue = queue.Queue()
+    pipeline.task_queues = [queue.Queue(), queue.Queue()]
+    pipeline.ready_workers = {0, 1}
+    pipeline.shm = type("Shm", (), {"buf": bytearray(pipeline.slot_bytes * pipeline.n_slots)})()
+    return pipeline
+
+
+def finish(pipeline, seq, detections=()):
+    slot = pipeline.pending[seq][2]
+    pipeline.result_queue.put(("result", seq, slot, list(detections), 0.001, None))
+
+
+def test_results_are_released_in_order():
+    pipeline = offline_pipeline()
+    for k in range(3):
+        assert pipeline.submit(ball_frame(40), k)
+    finish(pipeline, 2)
+    finish(pipeline, 1)
+    assert pipeline.poll() == []
+    finish(pipeline, 0)
+    assert [r[0] for r in pipeline.poll()] == [0, 1, 2]
+    assert len(pipeline.free_slots) == pipeline.n_slots
+
+
+def test_frames_go_to_the_least_busy_worker():
+    pipeline = offline_pipeline()
+    for k in range(4):
+        pipeline.submit(ball_frame(40), k)
+    assert [pipeline.pending[k][4] for k in range(4)] == [0, 1, 0, 1]
+    finish(pipeline, 0)
+    finish(pipeline, 2)
+    pipeline.collect()
+    pipeline.submit(ball_frame(40), 4)
+    assert pipeline.pending[4][4] == 0
+
+
+def test_no_ready_worker_drops_frames():
+    pipeline = offline_pipeline()
+    pipeline.ready_workers = set()
+    assert not pipeline.ready
+    assert not pipeline.submit(ball_frame(40), 0)
+
+
+def test_full_ring_drops_frames():
+    pipeline = offline_pipeline()
+    for k in range(pipeline.n_slots):
+        assert pipeline.submit(ball_frame(40), k)
+    assert not pipeline.submit(ball_frame(40), "late")
+    assert pipeline.dropped == 1
+
+
+def test_missing_result_is_skipped_after_the_deadline():
+    pipeline = offline_pipeline(result_timeout=0.05)
+    for k in range(3):
+        pipeline.submit(ball_frame(40), k)
+    finish(pipeline, 1)
+    finish(pipeline, 2)
+    assert pipeline.poll() == []
+    time.sleep(0.06)
+    assert [r[0] for r in pipeline.poll()] == [1, 2]
+    assert pipeline.lost == 1
+    # the lost frame's slot is back, and its late result is ignored
+    assert len(pipeline.free_slots) == pipeline.n_slots
+    pipeline.result_queue.put(("result", 0, 0, [], 0.001, None))
+    pipeline.poll()
+    assert len(pipeline.free_slots) == pipeline.n_slots
+
+
+def test_results_from_a_replaced_config_are_discarded():
+    pipeline = offline_pipeline()
+    pipeline.submit(ball_frame(40), "old")
+    pipeline.reconfigure(config("white_ball"))
+    pipeline.submit(ball_frame(40), "new")
+    # the config sits between the old and the new frame on every worker's queue
+    tasks = [q.get_nowait() for q in pipeline.task_queues for _ in range(q.qsize())]
+    assert [t[0] for t in tasks] == ["frame", "config", "config", "frame"]
+    finish(pipeline, 0)
+    finish(pipeline, 1)
+    assert [r[0] for r in pipeline.poll()] == ["new"]
+
+
+def wait_ready(pipeline, timeout=30.0):
+    deadline = time.time() + timeout
+    while not pipeline.ready and time.time() < deadline:
+        pipeline.collect()
+        time.sleep(0.01)
+    return pipeline.ready
+
+
+def wait_results(pipeline, n, timeout=10.0):
+    results, deadline = [], time.time() + timeout
+    while len(results) < n and time.time() < deadline:
+        results += pipeline.poll()
+        time.sleep(0.005)
+    return results
+
+
+def test_workers_detect_reconfigure_and_get_revived():
+    pipeline = FramePipeline(config(), (120, 160, 3), n_workers=1, n_slots=4, max_restarts=1)
+    pipeline.start()
+    try:
+        assert not pipeline.ready
+        assert wait_ready(pipeline)
+        for x in (40, 80, 120):
+            pipeline.submit(ball_frame(x), x)
+        results = wait_results(pipeline, 3)
+        assert [r[0] for r in results] == [40, 80, 120]
+        assert all(len(r[1]) == 1 and abs(r[1][0][0][0] - r[0]) < 1 for r in results)
+
+        # a profile switch in place: the red ball is no white ball
+        pipeline.reconfigure(config("white_ball"))
+        pipeline.submit(ball_frame(40), "white")
+        results = wait_results(pipeline, 1)
+        assert results[0][0] == "white" and results[0][1] == []
+
+        # a dead worker is respawned once, the second death fails the pipeline
+        pipeline.workers[0].terminate()
+        pipeline.workers[0].join()
+        assert pipeline.revive() == 1 and not pipeline.failed
+        assert wait_ready(pipeline)
+        pipeline.submit(ball_frame(80), 80)
+        assert [r[0] for r in wait_results(pipeline, 1)] == [80]
+        pipeline.workers[0].terminate()
+        pipeline.workers[0].join()
+        assert pipeline.revive() == 1 and pipeline.failed and not pipeline.ready
+    finally:
+        pipeline.stop()
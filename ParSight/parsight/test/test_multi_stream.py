@@ -0,0 +1,92 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from parsight.color_profiles import DEFAULT_PROFILES
+from parsight.detector import ColorBlobDetector
+from parsight.multi_stream import CameraStream, fuse_estimates
+
+
+def two_balls():
+    # a red and a white ball on grass
+    frame = np.full((120, 160, 3), (40, 140, 60), dtype=np.uint8)
+    cv2.circle(frame, (40, 60), 10, (32, 29, 200), -1)
+    cv2.circle(frame, (110, 50), 8, (253, 253, 252), -1)
+    return frame
+
+
+class ListLogger:
+
+    def __init__(self):
+        self.messages = []
+
+    def error(self, message):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def stream():
+    config = ColorBlobDetector(DEFAULT_PROFILES["red_ball"]).config()
+    stream = CameraStream("wide", "/wide/image", config, process_width=160, hfov_deg=90.0,
+                          logger=ListLogger())
+    stream.start()
+    yield stream
+    stream.stop()
+
+
+def feed(stream, frame, count=1):
+    # hand the stream one frame at a time and wait until it has been handled
+    for _ in range(count):
+        handled = len(stream.stats.times) + stream.stats.errors
+        stream.submit(frame, time.time())
+        deadline = time.time() + 2.0
+        while len(stream.stats.times) + stream.stats.errors == handled:
+            assert time.time() < deadline, "stream thread stopped handling frames"
+            time.sleep(0.001)
+
+
+def test_fuse_keeps_agreeing_estimates_weighted_by_precision():
+    center, sigma, confidence = fuse_estimates([((10.0, 10.0), 1.0, 0.5), ((12.0, 10.0), 2.0, 0.9),
+                                                ((80.0, 80.0), 0.5, 0.2)], gate=5.0)
+    # the outlier is the most precise, so it anchors and the other two are left out
+    assert center == (80.0, 80.0) and confidence == 0.2
+    center, sigma, confidence = fuse_estimates([((10.0, 10.0), 1.0, 0.5), ((12.0, 10.0), 2.0, 0.9)], gate=5.0)
+    assert np.allclose(center, (10.4, 10.0)) and sigma < 1.0 and confidence == 0.9
+    assert fuse_estimates([], gate=5.0) is None
+
+
+def test_profile_switch_waits_for_the_next_frame(stream):
+    frame = two_balls()
+    feed(stream, frame, 4)
+    red = stream.latest(time.time(), 5.0)
+    assert red is not None
+    stream.set_profile(DEFAULT_PROFILES["white_ball"])
+    # nothing the stream's thread owns is touched until it takes the next frame
+    assert stream.detector.profile.name == "red_ball"
+    assert stream.latest(time.time(), 5.0) is red
+    feed(stream, frame)
+    assert stream.detector.profile.name == "white_ball"
+    feed(stream, frame, 4)
+    white = stream.latest(time.time(), 5.0)
+    assert white is not None and white[0][0] > red[0][0]
+
+
+def test_failed_frame_is_logged_and_the_stream_keeps_running(stream, monkeypatch):
+    frame = two_balls()
+    detect = stream.detector.detect
+    calls = []
+
+    def flaky(image):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("bad frame")
+        return detect(image)
+
+    monkeypatch.setattr(stream.detector, "detect", flaky)
+    feed(stream, frame, 5)
+    assert stream.stats.errors == 1
+    assert len(stream.logger.messages) == 1 and "bad frame" in stream.logger.messages[0]
+    assert stream.thread.is_alive() and len(stream.stats.times) == 4
+    assert stream.latest(time.time(), 5.0) is not None
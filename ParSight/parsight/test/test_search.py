@@ -0,0 +1,73 @@
+import numpy as np
+
+from parsight.search import SearchPlanner
+
+BOUNDS = {"x_min": -3.0, "x_max": 3.0, "y_min": -3.0, "y_max": 3.0}
+
+
+def row_order(waypoints):
+    # the x of each row, in the order the rows are flown
+    xs = [float(w[0]) for w in waypoints[::2]]
+    assert all(float(w[0]) == x for w, x in zip(waypoints[1::2], xs))
+    return xs
+
+
+def test_waypoints_stay_inside_bounds():
+    for pattern in ("spiral", "lawnmower"):
+        planner = SearchPlanner(BOUNDS, pattern=pattern)
+        planner.start((2.9, -2.9), half_width=0.5)
+        points = np.array(planner.waypoints)
+        assert len(points) > 4
+        assert points[:, 0].min() >= -3.0 and points[:, 0].max() <= 3.0
+        assert points[:, 1].min() >= -3.0 and points[:, 1].max() <= 3.0
+
+
+def test_spiral_starts_at_the_bias_point():
+    planner = SearchPlanner(BOUNDS, pattern="spiral")
+    planner.start((1.0, -0.5), half_width=0.5)
+    assert np.allclose(planner.waypoints[0], [1.0, -0.5])
+
+
+def test_lawnmower_sweeps_rows_in_order():
+    planner = SearchPlanner(BOUNDS, pattern="lawnmower")
+    planner.start((-1.0, 0.0), half_width=0.5)
+    xs = row_order(planner.waypoints)
+    # nearest row first, monotonic to the nearer edge, then one jump and monotonic to the far edge
+    assert abs(xs[0] - -1.0) == min(abs(x - -1.0) for x in xs)
+    turn = int(np.argmin(xs))
+    assert np.all(np.diff(xs[:turn + 1]) < 0)
+    assert np.all(np.diff(xs[turn + 1:]) > 0)
+    assert sorted(xs) == sorted(set(xs))
+
+
+def test_lawnmower_from_an_edge_is_one_sweep():
+    planner = SearchPlanner(BOUNDS, pattern="lawnmower")
+    planner.start((2.8, 0.0), half_width=0.5)
+    xs = row_order(planner.waypoints)
+    assert np.all(np.diff(xs) < 0)
+
+
+def test_lawnmower_rows_alternate_direction():
+    planner = SearchPlanner(BOUNDS, pattern="lawnmower")
+    planner.start((-2.8, -2.0), half_width=0.5)
+    ends = [float(w[1]) for w in planner.waypoints]
+    assert ends[:4] == [-3.0, 3.0, 3.0, -3.0]
+
+
+def test_covered_waypoints_are_skipped():
+    planner = SearchPlanner(BOUNDS, pattern="lawnmower")
+    planner.start((-2.8, -3.0), half_width=0.5)
+    first, second = planner.waypoints[0], planner.waypoints[1]
+    # fly the first row: its end waypoint is reached and its footprint seen
+    for y in np.linspace(-3.0, 3.0, 31):
+        planner.next_waypoint((first[0], y), 0.5)
+    assert not np.allclose(planner.next_waypoint(second, 0.5), second)
+
+
+def test_search_restarts_when_everything_is_covered():
+    planner = SearchPlanner(BOUNDS, pattern="spiral")
+    planner.start((0.0, 0.0), half_width=0.5)
+    planner.covered[:] = True
+    waypoint = planner.next_waypoint((0.0, 0.0), 0.5)
+    assert planner.active and len(planner.waypoints) > 0
+    assert waypoint is planner.waypoints[0]
@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+import pytest
+
+from parsight.color_profiles import DEFAULT_PROFILES
+from parsight.detector import ColorBlobDetector
+
+
+def search_frame(size, seed=0):
+    # noisy grass with one ball clear of the stripes' seams and one right on the first seam (h / 4)
+    width, height = size
+    rng = np.random.default_rng(seed)
+    frame = np.clip(rng.normal((40, 140, 60), 20, (height, width, 3)), 0, 255).astype(np.uint8)
+    cv2.circle(frame, (width // 3, height // 2 + height // 8), 20, (32, 29, 200), -1)
+    cv2.circle(frame, (width // 2, height // 4), 20, (32, 29, 200), -1)
+    return frame
+
+
+def detectors(mask_threads=4):
+    single = ColorBlobDetector(DEFAULT_PROFILES["red_ball"], tiled_min_height=100000, mask_threads=mask_threads)
+    tiled = ColorBlobDetector(**dict(single.config(), tiled_min_height=0))
+    return single, tiled
+
+
+@pytest.mark.parametrize("size, mask_threads", [((1280, 720), 4), ((1920, 1080), 4), ((640, 481), 3)])
+def test_stripe_mask_matches_the_single_threaded_mask(size, mask_threads):
+    single, tiled = detectors(mask_threads)
+    frame = search_frame(size)
+    assert np.array_equal(tiled.compute_mask(frame), single.compute_mask(frame))
+    assert tiled.tiled_masker is not None and single.tiled_masker is None
+    tiled.close()
+
+
+def test_ball_on_a_seam_is_found_once_in_the_same_place():
+    single, tiled = detectors()
+    frame = search_frame((1280, 720))
+    expected = sorted(single.detect(frame))
+    found = sorted(tiled.detect(frame))
+    assert len(found) == 2
+    for (center, radius, quality, sigma), (center_s, radius_s, quality_s, sigma_s) in zip(found, expected):
+        assert np.allclose(center, center_s) and np.isclose(radius, radius_s)
+    # the ball on the seam at y = 180 is one candidate, not one per stripe
+    assert sum(abs(center[1] - 180) < 5 for center, _, _, _ in found) == 1
+    tiled.close()
+
+
+def test_frames_below_the_threshold_skip_the_pool():
+    detector = ColorBlobDetector(DEFAULT_PROFILES["red_ball"])
+    detector.detect(search_frame((256, 256)))
+    assert detector.tiled_masker is None
+    detector.detect(search_frame((1280, 720)))
+    assert detector.tiled_masker is not None
+    detector.close()
+
+
+def test_close_shuts_the_pool_down():
+    _, tiled = detectors()
+    frame = search_frame((1280, 720))
+    expected = tiled.compute_mask(frame).copy()
+    executor = tiled.tiled_masker.executor
+    tiled.close()
+    assert tiled.tiled_masker is None
+    with pytest.raises(RuntimeError):
+        executor.submit(int)
+    # a later large frame starts a new pool
+    assert np.array_equal(tiled.compute_mask(frame), expected)
+    tiled.close()
+    tiled.close()
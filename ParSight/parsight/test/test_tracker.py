@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+import parsight.tracker as tracker_module
+from parsight.tracker import MultiTargetTracker, Track
+
+
+@pytest.fixture(params=["hungarian", "greedy"])
+def tracker(request, monkeypatch):
+    # both assignment paths, the greedy one is what runs without scipy
+    if request.param == "greedy":
+        monkeypatch.setattr(tracker_module, "linear_sum_assignment", None)
+    elif tracker_module.linear_sum_assignment is None:
+        pytest.skip("scipy not installed")
+    return MultiTargetTracker(gate_px=20.0, min_hits=3)
+
+
+def ball(x, y, quality=0.9):
+    return ((x, y), 5.0, quality, 0.1)
+
+
+def test_target_needs_min_hits(tracker):
+    assert tracker.update([ball(50, 50)], 0.0) is None
+    assert tracker.update([ball(51, 50)], 0.033) is None
+    target = tracker.update([ball(52, 50)], 0.066)
+    assert target is not None and target.hits == 3
+
+
+def test_association_follows_a_moving_ball(tracker):
+    for k in range(10):
+        target = tracker.update([ball(50 + 3 * k, 50)], k * 0.033)
+    assert target.track_id == 0
+    assert target.velocity[0] == pytest.approx(3 / 0.033, rel=0.2)
+
+
+def test_association_keeps_two_balls_apart(tracker):
+    for k in range(5):
+        tracker.update([ball(20 + 2 * k, 50), ball(80 - 2 * k, 50)], k * 0.033)
+    ids = {}
+    for track in tracker.tracks:
+        ids[track.track_id] = track.position[0]
+    assert len(tracker.tracks) == 2
+    assert ids[0] < ids[1]
+
+
+def test_gate_starts_a_new_track(tracker):
+    tracker.update([ball(50, 50)], 0.0)
+    tracker.update([ball(150, 50)], 0.033)
+    assert len(tracker.tracks) == 2
+
+
+def test_brief_distractor_cannot_steal_the_lock(tracker):
+    for k in range(5):
+        target = tracker.update([ball(50, 50, quality=0.8)], k * 0.033)
+    locked = target.track_id
+    # a perfect red blob somewhere else for two frames
+    for k in range(5, 7):
+        target = tracker.update([ball(50, 50, quality=0.8), ball(120, 120, quality=1.0)], k * 0.033)
+        assert target.track_id == locked
+
+
+def test_lost_ball_reports_no_target_and_expires(tracker):
+    for k in range(4):
+        tracker.update([ball(50, 50)], k * 0.033)
+    assert tracker.update([], 0.2) is None
+    for k in range(tracker.max_misses + 1):
+        tracker.update([], 0.2 + k * 0.033)
+    assert tracker.tracks == []
+
+
+def test_reset_forgets_tracks(tracker):
+    for k in range(4):
+        tracker.update([ball(50, 50)], k * 0.033)
+    tracker.reset()
+    assert tracker.tracks == [] and tracker.target_id is None
+
+
+def test_track_prediction_is_constant_velocity():
+    track = Track(0, (0.0, 0.0), 5.0, 0.9, 0.1, 0.0)
+    track.velocity = np.array([10.0, -5.0])
+    assert np.allclose(track.predict(0.5), [5.0, -2.5])
+    # never predicts backwards in time
+    assert np.allclose(track.predict(-1.0), [0.0, 0.0])
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from parsight.verifier import CandidateVerifier, candidate_rank, random_model
+
+
+@pytest.fixture
+def model(tmp_path):
+    return random_model(str(tmp_path / "verifier.npz"))
+
+
+def candidates(n, rng):
+    return [((rng.uniform(10, 118), rng.uniform(10, 118)), rng.uniform(2, 8), rng.uniform(0.5, 1.0), 0.1)
+            for _ in range(n)]
+
+
+def test_candidates_below_top_k_pass_unchanged(model):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (128, 128, 3), dtype=np.uint8)
+    found = candidates(8, rng)
+    verifier = CandidateVerifier(model, top_k=3, threshold=0.0)
+    verified = verifier.verify(frame, found)
+    ranked = sorted(found, key=candidate_rank, reverse=True)
+    assert len(verified) == 8
+    assert verified[3:] == ranked[3:]
+
+
+def test_rejected_top_candidates_are_dropped(model):
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 256, (128, 128, 3), dtype=np.uint8)
+    found = candidates(6, rng)
+    verifier = CandidateVerifier(model, top_k=2, threshold=1.1)
+    assert verifier.verify(frame, found) == sorted(found, key=candidate_rank, reverse=True)[2:]
+
+
+def test_drop_unverified_keeps_only_scored_candidates(model):
+    rng = np.random.default_rng(2)
+    frame = rng.integers(0, 256, (128, 128, 3), dtype=np.uint8)
+    verifier = CandidateVerifier(model, top_k=2, threshold=0.0, drop_unverified=True)
+    verified = verifier.verify(frame, candidates(6, rng))
+    assert len(verified) == 2
+
+
+def test_gray_patches_are_written_in_place(model):
+    rng = np.random.default_rng(3)
+    frame = rng.integers(0, 256, (128, 128, 3), dtype=np.uint8)
+    verifier = CandidateVerifier(model, top_k=2)
+    buffer = verifier.gray_patches
+    verifier.gray_patches[:] = 0
+    verifier.probabilities(frame, candidates(2, rng))
+    assert verifier.gray_patches is buffer and verifier.gray_patches.any()
+    assert np.array_equal(verifier.gray[:2], verifier.gray_patches[:2])
@@ -0,0 +1,368 @@
+import os
+import sqlite3
+import sys
+import numpy as np
+
+# Streams messages out of a rosbag2 sqlite3 bag without loading the topic into memory
+# rows come in timestamp order a batch at a time (fetchmany), so memory stays at a
+# few frames however long the flight was
+# frame ranges become LIMIT/OFFSET and time ranges timestamp bounds in the query,
+# so frames outside the range are never read off the disk
+# frame indices count the topic's messages in timestamp order (inside the time
+# range when one is given), the same numbering the scripts always printed
+# window() instead numbers frames over the whole topic and intersects frame and
+# time ranges, window_count() is its length (count() is the length of messages(),
+# the two only differ when a frame range and a time range are combined)
+# for random access (seek by time, windows around an event) a sidecar index
+# (bag.db3.idx.npz) keeps every topic's timestamps and row ids in order, it is
+# built once from the small columns only and rebuilt when the bag is newer, so
+# a seek is a binary search and a window reads only its own rows by primary key
+# MCAP bags (the newer rosbag2 default) are read through the mcap package with
+# the same interface, time ranges seek with the file's own chunk index; open_bag
+# picks the reader from the file, but only hands out an McapReader with
+# mcap=True (convert_bag.py and the tests): on a synthetic 60 s bag reading the
+# MCAP was 2-5x slower than the .db3 and a 1 s seek 4-8x slower, so the analysis
+# scripts stay on sqlite until the benchmark has been run on a real flight, an
+# MCAP recording is converted with convert_bag.py first
+# run on its own (python bag_reader.py bag.db3) it lists the topics in the bag
+
+MCAP_MAGIC = b"\x89MCAP0\r\n"
+
+
+def open_bag(path, batch_size=16, mcap=False):
+    # a .db3 file, or a bag folder holding one (an .mcap too with mcap=True)
+    extensions = (".db3", ".mcap") if mcap else (".db3",)
+    if os.path.isdir(path):
+        files = sorted(f for f in os.listdir(path) if f.endswith(extensions))
+        if not files:
+            raise FileNotFoundError(f"No {' or '.join(extensions)} file in '{path}'")
+        path = os.path.join(path, files[0])
+    with open(path, "rb") as f:
+        magic = f.read(len(MCAP_MAGIC))
+    if magic == MCAP_MAGIC:
+        if not mcap:
+            raise ValueError(f"'{path}' is an MCAP bag, convert it to .db3 with convert_bag.py first")
+        return McapReader(path, batch_size)
+    return BagReader(path, batch_size)
+
+
+class Bag:
+
+    # what both storage formats share: context manager, index, seeking and image decoding
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def index(self, topic):
+        # TopicIndex of the topic, from the sidecar file (built on first use)
+        if self.indexes is None:
+            self.indexes = load_index(self.db_file) or build_index(self)
+        if topic not in self.indexes:
+            raise KeyError(f"Topic '{topic}' not found in the bag")
+        return self.indexes[topic]
+
+    def seek(self, topic, time):
+        # frame index of the first message at or after time (ns)
+        return self.index(topic).frame_at(time)
+
+    def window_frames(self, topic, start_frame=None, end_frame=None, start_time=None, end_time=None):
+        # (index, first, last) frame span of a window, frames counted over the whole topic
+        index = self.index(topic)
+        first = max(start_frame or 0, index.frame_at(start_time) if start_time is not None else 0)
+        last = len(index) - 1 if end_frame is None else min(end_frame, len(index) - 1)
+        if end_time is not None:
+            last = min(last, index.frame_at(end_time + 1) - 1)
+        return index, first, last
+
+    def window_count(self, topic, **ranges):
+        # number of frames window() yields for the same ranges
+        _, first, last = self.window_frames(topic, **ranges)
+        return max(last - first + 1, 0)
+
+    def frames(self, topic, swap_8uc3=False, **ranges):
+        # (frame index, timestamp ns, BGR image), frames that fail to decode are reported and skipped
+        decoder = ImageDecoder(swap_8uc3)
+        for index, timestamp, data in self.messages(topic, **ranges):
+            try:
+                yield index, timestamp, decoder(data)
+            except Exception as e:
+                print(f"⚠️ Frame {index} skipped due to error: {e}")
+
+
+class BagReader(Bag):
+
+    def __init__(self, db_file, batch_size=16):
+        # read only, a bag is never written by the analysis scripts
+        self.conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.indexes = None
+
+    def close(self):
+        self.conn.close()
+
+    def topics(self):
+        # name -> (id, message type)
+        return {name: (topic_id, msg_type) for topic_id, name, msg_type in
+                self.conn.execute("SELECT id, name, type FROM topics")}
+
+    def topic_id(self, topic):
+        row = self.conn.execute("SELECT id FROM topics WHERE name = ?", (topic,)).fetchone()
+        return row[0] if row else None
+
+    def query(self, topic, columns, start_frame=None, end_frame=None, start_time=None, end_time=None):
+        # SELECT over one topic with the ranges pushed into the query (end_frame and end_time inclusive)
+        topic_id = self.topic_id(topic)
+        if topic_id is None:
+            raise KeyError(f"Topic '{topic}' not found in the bag")
+        sql, args = f"SELECT {columns} FROM messages WHERE topic_id = ?", [topic_id]
+        if start_time is not None:
+            sql += " AND timestamp >= ?"
+            args.append(int(start_time))
+        if end_time is not None:
+            sql += " AND timestamp <= ?"
+            args.append(int(end_time))
+        sql += " ORDER BY timestamp, id"
+        first = start_frame or 0
+        if end_frame is not None or first:
+            sql += " LIMIT ? OFFSET ?"
+            args += [end_frame - first + 1 if end_frame is not None else -1, first]
+        return sql, args, first
+
+    def count(self, topic, **ranges):
+        # the limit has to apply before counting, so count over a subquery
+        sql, args, _ = self.query(topic, "id", **ranges)
+        return self.conn.execute(f"SELECT COUNT(*) FROM ({sql})", args).fetchone()[0]
+
+    def timestamps(self, topic, **ranges):
+        # timestamps only, the image payloads are never read
+        sql, args, _ = self.query(topic, "timestamp", **ranges)
+        return [row[0] for row in self.conn.execute(sql, args)]
+
+    def messages(self, topic, **ranges):
+        # (frame index, timestamp ns, serialized message) in timestamp order
+        sql, args, first = self.query(topic, "timestamp, data", **ranges)
+        cursor = self.conn.execute(sql, args)
+        index = first
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                break
+            for timestamp, data in rows:
+                yield index, timestamp, data
+                index += 1
+
+    def merged(self, topics, start_time=None, end_time=None):
+        # (topic, timestamp ns, serialized message) over several topics in one timestamp ordered stream
+        ids = {}
+        for topic in topics:
+            topic_id = self.topic_id(topic)
+            if topic_id is None:
+                raise KeyError(f"Topic '{topic}' not found in the bag")
+            ids[topic_id] = topic
+        sql, args = f"SELECT topic_id, timestamp, data FROM messages WHERE topic_id IN ({','.join('?' * len(ids))})", list(ids)
+        if start_time is not None:
+            sql += " AND timestamp >= ?"
+            args.append(int(start_time))
+        if end_time is not None:
+            sql += " AND timestamp <= ?"
+            args.append(int(end_time))
+        cursor = self.conn.execute(sql + " ORDER BY timestamp, id", args)
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                break
+            for topic_id, timestamp, data in rows:
+                yield ids[topic_id], timestamp, data
+
+    def index_rows(self):
+        # (topic key, timestamp, row id) of every message, the payloads are never read
+        rows = np.array(self.conn.execute("SELECT topic_id, timestamp, id FROM messages").fetchall(), dtype=np.int64)
+        return rows.reshape(-1, 3)
+
+    def window(self, topic, **ranges):
+        # like messages(), but through the index: frames count over the whole topic and only the window is read
+        index, first, last = self.window_frames(topic, **ranges)
+        for batch_start in range(first, last + 1, self.batch_size):
+            batch_end = min(batch_start + self.batch_size, last + 1)
+            ids = index.rowids[batch_start:batch_end].tolist()
+            rows = dict(self.conn.execute(
+                f"SELECT id, data FROM messages WHERE id IN ({','.join('?' * len(ids))})", ids))
+            for i, rowid in enumerate(ids, batch_start):
+                yield i, int(index.timestamps[i]), rows[rowid]
+
+
+class McapReader(Bag):
+
+    def __init__(self, mcap_file, batch_size=16):
+        # only needed for MCAP bags
+        from mcap.reader import make_reader
+        self.file = open(mcap_file, "rb")
+        self.reader = make_reader(self.file)
+        self.summary = self.reader.get_summary()
+        if self.summary is None:
+            raise ValueError(f"'{mcap_file}' has no summary (recording cut short?), run `mcap recover` on it first")
+        self.db_file = mcap_file
+        self.batch_size = batch_size
+        self.indexes = None
+        # rosbag2 writes one channel per topic
+        self.channels = {channel.topic: channel for channel in self.summary.channels.values()}
+
+    def close(self):
+        self.file.close()
+
+    def topics(self):
+        # name -> (channel id, message type)
+        return {topic: (channel.id, self.summary.schemas[channel.schema_id].name) for topic, channel in self.channels.items()}
+
+    def topic_id(self, topic):
+        channel = self.channels.get(topic)
+        return channel.id if channel else None
+
+    def iterate(self, topics, start_time=None, end_time=None):
+        # the reader seeks to the chunks overlapping the time range through the chunk index (end_time inclusive)
+        for topic in topics:
+            if topic not in self.channels:
+                raise KeyError(f"Topic '{topic}' not found in the bag")
+        for _, channel, message in self.reader.iter_messages(
+                topics=list(topics), start_time=start_time, end_time=end_time + 1 if end_time is not None else None,
+                log_time_order=True):
+            yield channel.topic, message.log_time, message.data
+
+    def message_frames(self, topic, start_frame=None, end_frame=None, start_time=None, end_time=None):
+        # (index, first, last) span of what messages() yields: frame ranges count inside the time range,
+        # as the LIMIT/OFFSET of the sqlite reader's query does
+        index = self.index(topic)
+        begin = index.frame_at(start_time) if start_time is not None else 0
+        stop = index.frame_at(end_time + 1) if end_time is not None else len(index)
+        first = begin + (start_frame or 0)
+        last = stop - 1 if end_frame is None else min(begin + end_frame, stop - 1)
+        return index, first, last
+
+    def count(self, topic, **ranges):
+        if not any(value is not None for value in ranges.values()):
+            statistics = self.summary.statistics
+            if statistics is not None:
+                return statistics.channel_message_counts.get(self.topic_id(topic), 0)
+        _, first, last = self.message_frames(topic, **ranges)
+        return max(last - first + 1, 0)
+
+    def timestamps(self, topic, **ranges):
+        index, first, last = self.message_frames(topic, **ranges)
+        return index.timestamps[first:last + 1].tolist()
+
+    def messages(self, topic, start_frame=None, end_frame=None, start_time=None, end_time=None):
+        # frame ranges have no place in the file, so they are skipped past inside the time range
+        index = start_frame or 0
+        for i, (_, timestamp, data) in enumerate(self.iterate([topic], start_time, end_time)):
+            if i < index:
+                continue
+            if end_frame is not None and i > end_frame:
+                break
+            yield i, timestamp, data
+
+    def merged(self, topics, start_time=None, end_time=None):
+        yield from self.iterate(topics, start_time, end_time)
+
+    def index_rows(self):
+        # one pass over the whole file, the only way to number the messages of an MCAP
+        keys = {topic: channel.id for topic, channel in self.channels.items()}
+        rows = [(keys[topic], timestamp, i) for i, (topic, timestamp, _) in enumerate(self.iterate(list(keys)))]
+        return np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+    def window(self, topic, **ranges):
+        # the window's time span read through the chunk index, frames numbered from the sidecar
+        index, first, last = self.window_frames(topic, **ranges)
+        if last < first:
+            return
+        start, end = int(index.timestamps[first]), int(index.timestamps[last])
+        # frames sharing the first timestamp that belong before the window
+        i = index.frame_at(start)
+        for _, timestamp, data in self.iterate([topic], start, end):
+            if i > last:
+                break
+            if i >= first:
+                yield i, timestamp, data
+            i += 1
+
+
+class TopicIndex:
+
+    def __init__(self, timestamps, rowids):
+        self.timestamps = timestamps
+        self.rowids = rowids
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def frame_at(self, time):
+        # first frame at or after time (ns), len() past the end
+        return int(np.searchsorted(self.timestamps, time, side="left"))
+
+    @property
+    def start_time(self):
+        return int(self.timestamps[0]) if len(self) else None
+
+
+def index_file(db_file):
+    return db_file + ".idx.npz"
+
+
+def load_index(db_file):
+    # None when there is no sidecar or the bag changed after it was written
+    path = index_file(db_file)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(db_file):
+        return None
+    with np.load(path) as data:
+        names = [str(name) for name in data["names"]]
+        return {name: TopicIndex(data[f"t{k}"], data[f"r{k}"]) for k, name in enumerate(names)}
+
+
+def build_index(bag):
+    # one pass over (topic key, timestamp, row id)
+    ids = {topic_id: name for name, (topic_id, _) in bag.topics().items()}
+    rows = bag.index_rows()
+    rows = rows[np.lexsort((rows[:, 2], rows[:, 1], rows[:, 0]))]
+    indexes, arrays = {}, {}
+    for k, (topic_id, name) in enumerate(ids.items()):
+        topic_rows = rows[rows[:, 0] == topic_id]
+        indexes[name] = TopicIndex(topic_rows[:, 1].copy(), topic_rows[:, 2].copy())
+        arrays[f"t{k}"], arrays[f"r{k}"] = indexes[name].timestamps, indexes[name].rowids
+    # a bag on a read only disk still works, the index is just rebuilt next time
+    try:
+        np.savez(index_file(bag.db_file), names=np.array(list(ids.values())), **arrays)
+    except OSError as e:
+        print(f"⚠️ Could not write the bag index: {e}")
+    return indexes
+
+
+class ImageDecoder:
+
+    def __init__(self, swap_8uc3=False):
+        # ROS imports only where images are actually decoded
+        from cv_bridge import CvBridge
+        from rclpy.serialization import deserialize_message
+        from rosidl_runtime_py.utilities import get_message
+        self.bridge = CvBridge()
+        self.deserialize = deserialize_message
+        self.msg_type = get_message("sensor_msgs/msg/Image")
+        # our camera node publishes 8UC3, some recordings of it are RGB ordered
+        self.swap_8uc3 = swap_8uc3
+
+    def __call__(self, data):
+        img_msg = self.deserialize(data, self.msg_type)
+        if img_msg.encoding == "8UC3":
+            img = self.bridge.imgmsg_to_cv2(img_msg, desired_encoding="passthrough")
+            if self.swap_8uc3:
+                img = img[:, :, ::-1].copy()
+            return img
+        return self.bridge.imgmsg_to_cv2(img_msg, desired_encoding="bgr8")
+
+
+if __name__ == "__main__":
+    with open_bag(sys.argv[1], mcap=True) as bag:
+        for name, (topic_id, msg_type) in sorted(bag.topics().items()):
+            print(f"{name:40s} {msg_type:35s} {bag.count(name)} messages")
@@ -0,0 +1,112 @@
+import os
+import sys
+import sqlite3
+import time
+
+# Per-topic health report of a sqlite3 bag, computed by SQL alone
+# counts, rate, inter-arrival mean and jitter, the largest gaps, dropped messages
+# (gaps longer than gap_factor nominal periods, the median period) and payload
+# sizes, all from the timestamp column and length(data), which sqlite reads from
+# the record header: no payload is loaded or deserialized, so a multi-GB bag
+# takes seconds and camera frame drops or vicon dropouts show up straight away
+# (the bag is scanned once into a temp table of (topic, timestamp, size), a window
+# function straight over messages would drag every payload through its sorter)
+# MCAP bags carry their own statistics, `mcap info` reports those
+# run as python bag_stats.py [bag.db3], without an argument it uses db_file
+
+# === CONFIG ===
+bag_folder = "/home/jetson/flyrs_ws/rosbag_catapult_working"   # folder containing metadata.yaml and data_0.db3
+db_file = os.path.join(bag_folder, "rosbag2_2025_04_11-11_16_18_0.db3")
+gap_factor = 1.5        # a gap longer than this many median periods counts as dropped messages
+largest_gaps = 3        # gaps listed per topic
+percentiles = (50, 95, 99)
+
+# inter-arrival time and payload size of every message, per topic
+DELTAS = """
+    SELECT topic_id, timestamp, size,
+           timestamp - LAG(timestamp) OVER (PARTITION BY topic_id ORDER BY timestamp) AS dt
+    FROM temp.sizes
+"""
+
+
+def scan(conn):
+    # the one pass over the bag, the payload sizes come from the record headers
+    conn.execute("CREATE TEMP TABLE sizes AS SELECT topic_id, timestamp, length(data) AS size FROM messages")
+
+
+def topic_summary(conn):
+    # count, span, mean and mean square inter-arrival, byte totals
+    rows = conn.execute(f"""
+        SELECT topics.name, topics.type, COUNT(*), MIN(timestamp), MAX(timestamp), AVG(dt), AVG(dt * dt), MAX(dt),
+               SUM(size), MIN(size), MAX(size)
+        FROM ({DELTAS}) AS d JOIN topics ON topics.id = d.topic_id
+        GROUP BY topic_id ORDER BY topics.name""")
+    return {row[0]: row[1:] for row in rows}
+
+
+def ranked(conn, column, fractions):
+    # the values of column at the given fractions of each topic's sorted messages
+    wanted = ", ".join(str(f) for f in fractions)
+    rows = conn.execute(f"""
+        SELECT name, fraction, {column} FROM (
+            SELECT topic_id, {column}, ROW_NUMBER() OVER (PARTITION BY topic_id ORDER BY {column}) AS rank,
+                   COUNT(*) OVER (PARTITION BY topic_id) AS n
+            FROM ({DELTAS}) WHERE {column} IS NOT NULL) AS r
+        JOIN topics ON topics.id = r.topic_id
+        JOIN (SELECT value AS fraction FROM json_each('[{wanted}]'))
+        WHERE rank = MAX(1, CAST(ROUND(fraction * n) AS INTEGER))""")
+    values = {}
+    for name, fraction, value in rows:
+        values.setdefault(name, {})[fraction] = value
+    return values
+
+
+def gaps(conn, median_dt):
+    # dropped messages and the largest gaps of each topic
+    dropped, largest = {}, {}
+    for name, median in median_dt.items():
+        if not median:
+            continue
+        topic_id = conn.execute("SELECT id FROM topics WHERE name = ?", (name,)).fetchone()[0]
+        dropped[name] = conn.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(CAST(ROUND(CAST(dt AS REAL) / ?) AS INTEGER) - 1), 0)
+            FROM ({DELTAS}) WHERE topic_id = ? AND dt > ?""", (median, topic_id, gap_factor * median)).fetchone()
+        largest[name] = conn.execute(f"""
+            SELECT timestamp - dt, dt FROM ({DELTAS}) WHERE topic_id = ? AND dt > ?
+            ORDER BY dt DESC LIMIT ?""", (topic_id, gap_factor * median, largest_gaps)).fetchall()
+    return dropped, largest
+
+
+def report(path):
+    start = time.perf_counter()
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    scan(conn)
+    summary = topic_summary(conn)
+    fractions = [p / 100 for p in percentiles]
+    median_dt = {name: values.get(0.5) for name, values in ranked(conn, "dt", [0.5]).items()}
+    sizes = ranked(conn, "size", fractions)
+    dropped, largest = gaps(conn, median_dt)
+    conn.close()
+
+    bag_start = min(row[2] for row in summary.values()) if summary else 0
+    for name, (msg_type, count, first, last, mean_dt, mean_dt2, max_dt, total, min_size, max_size) in summary.items():
+        print(f"\n{name} ({msg_type})")
+        span = (last - first) / 1e9
+        print(f"  {count} messages over {span:.1f} s | {(count - 1) / span if span > 0 else 0:.1f} Hz")
+        if mean_dt is not None:
+            jitter = max(mean_dt2 - mean_dt ** 2, 0) ** 0.5
+            print(f"  inter-arrival mean {mean_dt / 1e6:.2f} ms | median {median_dt[name] / 1e6:.2f} ms | "
+                  f"jitter {jitter / 1e6:.2f} ms | max {max_dt / 1e6:.1f} ms")
+        if name in dropped:
+            gap_count, missing = dropped[name]
+            print(f"  {gap_count} gaps over {gap_factor}x the median period, ~{missing} messages missing "
+                  f"({missing / (count + missing) * 100 if count + missing else 0:.1f}%)")
+            for gap_start, dt in largest[name]:
+                print(f"    gap of {dt / 1e6:.1f} ms at {(gap_start - bag_start) / 1e9:.2f} s")
+        size_text = " | ".join(f"p{p} {sizes[name][p / 100] / 1e3:.1f} kB" for p in percentiles)
+        print(f"  payload {total / 1e6:.1f} MB | {min_size / 1e3:.1f}-{max_size / 1e3:.1f} kB | {size_text}")
+    print(f"\nReport on {os.path.getsize(path) / 1e6:.0f} MB in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    report(sys.argv[1] if len(sys.argv) > 1 else db_file)
@@ -0,0 +1,116 @@
+import os
+import csv
+from collections import deque
+import numpy as np
+from bag_reader import open_bag
+
+# Time-synchronised records over several topics of one bag
+# one topic drives the records (usually the camera), every other topic is aligned
+# to each of its messages: "nearest" takes the closer of the messages just before
+# and just after, "interpolate" blends the two linearly (poses: position lerp,
+# quaternion nlerp), either only within tolerance of the driving message
+# the bag is read once as a single timestamp ordered stream (the reader's merged()),
+# a driving message waits only until every other topic has a message after it or
+# it falls out of tolerance, so memory holds a tolerance-wide window, not the bag
+# run on its own it writes the camera frames with the drone, setpoint and vicon
+# poses next to them as a CSV
+
+# === CONFIG ===
+bag_folder = "/home/jetson/flyrs_ws/rosbag_catapult_working"   # folder containing metadata.yaml and data_0.db3
+db_file = os.path.join(bag_folder, "rosbag2_2025_04_11-11_16_18_0.db3")
+image_topic = "/camera/image_raw"
+pose_topics = ["/vicon/ROB498_Drone/ROB498_Drone", "/mavros/setpoint_position/local", "/mavros/local_position/pose"]
+policy = "interpolate"  # "nearest" or "interpolate"
+tolerance = 0.05        # seconds between a frame and a pose before the pose counts as missing
+output_csv = "synced_poses.csv"
+
+
+class PoseDecoder:
+
+    def __init__(self):
+        # ROS imports only where messages are actually decoded
+        from rclpy.serialization import deserialize_message
+        from rosidl_runtime_py.utilities import get_message
+        self.deserialize = deserialize_message
+        self.msg_type = get_message("geometry_msgs/msg/PoseStamped")
+
+    def __call__(self, data):
+        # x, y, z, qx, qy, qz, qw
+        pose = self.deserialize(data, self.msg_type).pose
+        return np.array([pose.position.x, pose.position.y, pose.position.z,
+                         pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w])
+
+
+def interpolate_pose(before, after, w):
+    # position lerp, quaternion nlerp along the shorter arc
+    q0, q1 = before[3:], (after[3:] if np.dot(before[3:], after[3:]) >= 0 else -after[3:])
+    q = (1 - w) * q0 + w * q1
+    return np.concatenate(((1 - w) * before[:3] + w * after[:3], q / np.linalg.norm(q)))
+
+
+def align(t, before, after, policy, tolerance_ns, decoders, topic):
+    # value for one topic at time t from its neighbours (timestamp, data), None when both are too far
+    near = [m for m in (before, after) if m is not None and abs(m[0] - t) <= tolerance_ns]
+    if not near:
+        return None
+    if policy == "interpolate" and len(near) == 2 and after[0] > before[0]:
+        w = (t - before[0]) / (after[0] - before[0])
+        return interpolate_pose(decoders[topic](before[1]), decoders[topic](after[1]), w)
+    return decoders[topic](min(near, key=lambda m: abs(m[0] - t))[1])
+
+
+def synchronized(bag, primary, others, policy="nearest", tolerance=0.05, decoders=None, start_time=None, end_time=None):
+    # (frame index, timestamp ns, primary message, {topic: aligned value or None}) in timestamp order
+    if policy not in ("nearest", "interpolate"):
+        raise ValueError(f"Unknown alignment policy '{policy}'")
+    decoders = decoders or {topic: PoseDecoder() for topic in others}
+    tolerance_ns = int(tolerance * 1e9)
+    latest = {topic: None for topic in others}
+    # driving messages waiting for the other topics: [index, timestamp, data, before, after]
+    pending = deque()
+    index = 0
+
+    def finish(entry):
+        i, t, data, before, after = entry
+        return i, t, data, {topic: align(t, before[topic], after[topic], policy, tolerance_ns, decoders, topic) for topic in others}
+
+    for topic, timestamp, data in bag.merged([primary] + list(others), start_time, end_time):
+        if topic == primary:
+            pending.append([index, timestamp, data, dict(latest), {}])
+            index += 1
+        else:
+            latest[topic] = (timestamp, data)
+            for entry in pending:
+                entry[4].setdefault(topic, latest[topic])
+        # a driving message is done once every topic has a message after it, or nothing later can be in tolerance
+        while pending and (len(pending[0][4]) == len(others) or timestamp - pending[0][1] > tolerance_ns):
+            entry = pending.popleft()
+            entry[4] = {topic: entry[4].get(topic) for topic in others}
+            yield finish(entry)
+    for entry in pending:
+        entry[4] = {topic: entry[4].get(topic) for topic in others}
+        yield finish(entry)
+
+
+if __name__ == "__main__":
+    fields = ["x", "y", "z", "qx", "qy", "qz", "qw"]
+    names = [topic.strip("/").replace("/", "_") for topic in pose_topics]
+    matched = {topic: 0 for topic in pose_topics}
+    frames = 0
+    with open_bag(db_file) as bag, open(output_csv, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["frame_index", "timestamp"] + [f"{name}_{field}" for name in names for field in fields])
+        for i, timestamp, _, poses in synchronized(bag, image_topic, pose_topics, policy, tolerance):
+            row = [i, timestamp]
+            for topic in pose_topics:
+                if poses[topic] is None:
+                    row += [None] * len(fields)
+                else:
+                    row += poses[topic].tolist()
+                    matched[topic] += 1
+            writer.writerow(row)
+            frames += 1
+
+    for topic in pose_topics:
+        print(f"{topic}: aligned to {matched[topic]}/{frames} frames")
+    print(f"\n✅ Saved {frames} synchronised frames to '{output_csv}'")
@@ -0,0 +1,97 @@
+import os
+import sys
+import cv2
+import numpy as np
+
+# camera model is shared with the onboard node
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsight"))
+from parsight.camera_model import CameraModel
+from bag_reader import open_bag, ImageDecoder
+
+# Calibrates the camera intrinsics and lens distortion from checkerboard frames
+# the frames come from a rosbag image topic or, if video_file is set, from a video
+# calibrate on the frames the compute node actually receives (/camera/image_raw),
+# or on raw captures, the node rescales the result to its frame size either way
+# the result is the JSON the compute node loads through camera_calibration
+
+# === CONFIG ===
+bag_folder = "/home/jetson/flyrs_ws/rosbag_checkerboard"   # folder containing metadata.yaml and data_0.db3
+image_topic = "/camera/image_raw"
+db_file = os.path.join(bag_folder, "rosbag_checkerboard_0.db3")
+video_file = None               # e.g. "checkerboard.mp4", used instead of the bag when set
+output_file = "camera_calibration.json"
+
+board_size = (9, 6)             # inner corners per row and column
+square_size = 0.025             # metres per square (only scales the board poses)
+frame_step = 5                  # look at every n-th frame, neighbouring frames add little
+max_views = 60                  # enough views for a stable solution, keeps the solve quick
+min_views = 10
+
+
+def frames_from_bag():
+    with open_bag(db_file) as bag:
+        if bag.topic_id(image_topic) is None:
+            print(f"❌ Topic '{image_topic}' not found in rosbag.")
+            exit()
+        # the skipped frames are still streamed past, but never decoded
+        decode = ImageDecoder()
+        for i, timestamp, data in bag.messages(image_topic):
+            if i % frame_step == 0:
+                yield i, decode(data)
+
+
+def frames_from_video():
+    cap = cv2.VideoCapture(video_file)
+    i = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if i % frame_step == 0:
+            yield i, frame
+        i += 1
+    cap.release()
+
+
+def find_corners(gray):
+    found, corners = cv2.findChessboardCorners(gray, board_size, cv2.CALIB_CB_ADAPTIVE_THRESH | cv2.CALIB_CB_NORMALIZE_IMAGE)
+    if not found:
+        return None
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_MAX_ITER, 30, 1e-3)
+    return cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)
+
+
+def calibrate(frames):
+    # board corners in the board's own plane
+    board = np.zeros((board_size[0] * board_size[1], 3), np.float32)
+    board[:, :2] = np.mgrid[0:board_size[0], 0:board_size[1]].T.reshape(-1, 2) * square_size
+
+    object_points, image_points, image_size = [], [], None
+    for i, frame in frames:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        image_size = gray.shape[::-1]
+        corners = find_corners(gray)
+        if corners is None:
+            continue
+        object_points.append(board)
+        image_points.append(corners)
+        print(f"Frame {i}: board found ({len(image_points)} views)")
+        if len(image_points) >= max_views:
+            break
+
+    if len(image_points) < min_views:
+        print(f"❌ Only {len(image_points)} views with the board, need {min_views}.")
+        exit()
+
+    rms, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(object_points, image_points, image_size, None, None)
+    return CameraModel(camera_matrix, dist_coeffs, image_size), rms, len(image_points)
+
+
+if __name__ == "__main__":
+    frames = frames_from_video() if video_file else frames_from_bag()
+    model, rms, views = calibrate(frames)
+    print(f"\nReprojection RMS: {rms:.3f} px over {views} views")
+    print(f"Camera matrix:\n{model.camera_matrix}")
+    print(f"Distortion: {model.dist_coeffs}")
+    model.save(output_file, rms=rms, views=views)
+    print(f"\n✅ Saved calibration to '{output_file}'")
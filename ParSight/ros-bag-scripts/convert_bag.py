@@ -0,0 +1,125 @@
+import os
+import sqlite3
+import time
+from bag_reader import open_bag, BagReader
+
+# Converts a bag between the sqlite3 (.db3) and MCAP (.mcap) storage formats and
+# benchmarks reading both
+# the direction follows the input: a .db3 becomes an .mcap and the other way round,
+# messages are copied as serialized bytes in timestamp order, never deserialized
+# the converted .db3 has no metadata.yaml, run `ros2 bag reindex <folder>` before
+# playing it with ros2 bag play (the scripts here do not need one)
+# the MCAP schemas carry the type names only, not the message definitions, which
+# rosbag2 does not need but tools like Foxglove do for decoding
+# the benchmark reads every message of both files and a one second window in the
+# middle of the image topic (a time seek) from each; on a synthetic 60 s bag
+# (256x256 frames and segmented frames at 30 Hz, poses at 100 Hz, 710 MB) with a
+# warm page cache:
+#   .db3                 710 MB | ~30k msgs/s | 1 s seek  4-5 ms
+#   .mcap zstd           233 MB |  ~9k msgs/s | 1 s seek   ~22 ms
+#   .mcap lz4            709 MB |  ~6k msgs/s | 1 s seek   ~35 ms
+#   .mcap uncompressed   709 MB | ~15k msgs/s | 1 s seek   ~17 ms
+# so MCAP only wins on disk, the analysis scripts keep reading .db3 (see open_bag)
+# until this has been run on a real flight
+
+# === CONFIG ===
+input_bag = "/home/jetson/flyrs_ws/rosbag_catapult_working/rosbag2_2025_04_11-11_16_18_0.db3"
+output_bag = None               # None puts the other format next to the input
+mcap_compression = "zstd"       # "zstd", "lz4" or "none" for MCAP output
+mcap_chunk_size = 4 * 1024 * 1024
+image_topic = "/camera/image_raw"   # topic the seek benchmark reads
+benchmark = True
+batch_size = 256                # rows per insert when writing a .db3
+
+
+def topic_metadata(bag):
+    # name -> (type, serialization format, offered qos profiles) from either format
+    if isinstance(bag, BagReader):
+        return {name: (msg_type, fmt, qos) for name, msg_type, fmt, qos in
+                bag.conn.execute("SELECT name, type, serialization_format, offered_qos_profiles FROM topics")}
+    return {topic: (bag.summary.schemas[channel.schema_id].name, channel.message_encoding,
+                    channel.metadata.get("offered_qos_profiles", "")) for topic, channel in bag.channels.items()}
+
+
+def to_mcap(bag, path):
+    from mcap.writer import Writer, CompressionType
+    compression = {"zstd": CompressionType.ZSTD, "lz4": CompressionType.LZ4, "none": CompressionType.NONE}[mcap_compression]
+    with open(path, "wb") as f:
+        writer = Writer(f, chunk_size=mcap_chunk_size, compression=compression)
+        writer.start(profile="ros2", library="parsight convert_bag")
+        channels = {}
+        for topic, (msg_type, fmt, qos) in topic_metadata(bag).items():
+            schema_id = writer.register_schema(name=msg_type, encoding="ros2msg", data=b"")
+            channels[topic] = writer.register_channel(topic=topic, message_encoding=fmt, schema_id=schema_id,
+                                                      metadata={"offered_qos_profiles": qos})
+        count = 0
+        for topic, timestamp, data in bag.merged(list(channels)):
+            writer.add_message(channel_id=channels[topic], log_time=timestamp, data=data, publish_time=timestamp, sequence=count)
+            count += 1
+        writer.finish()
+    return count
+
+
+def to_db3(bag, path):
+    # the rosbag2 sqlite3 layout the readers (and ros2 bag) expect
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE topics(id INTEGER PRIMARY KEY, name TEXT NOT NULL, type TEXT NOT NULL, "
+                 "serialization_format TEXT NOT NULL, offered_qos_profiles TEXT NOT NULL)")
+    conn.execute("CREATE TABLE messages(id INTEGER PRIMARY KEY, topic_id INTEGER NOT NULL, "
+                 "timestamp INTEGER NOT NULL, data BLOB NOT NULL)")
+    ids = {}
+    for topic_id, (topic, (msg_type, fmt, qos)) in enumerate(topic_metadata(bag).items(), 1):
+        conn.execute("INSERT INTO topics VALUES (?, ?, ?, ?, ?)", (topic_id, topic, msg_type, fmt, qos))
+        ids[topic] = topic_id
+    count, rows = 0, []
+    for topic, timestamp, data in bag.merged(list(ids)):
+        rows.append((ids[topic], timestamp, data))
+        if len(rows) == batch_size:
+            conn.executemany("INSERT INTO messages (topic_id, timestamp, data) VALUES (?, ?, ?)", rows)
+            count += len(rows)
+            rows = []
+    conn.executemany("INSERT INTO messages (topic_id, timestamp, data) VALUES (?, ?, ?)", rows)
+    count += len(rows)
+    # the index rosbag2 creates, after the inserts so they stay fast
+    conn.execute("CREATE INDEX timestamp_idx ON messages (timestamp ASC)")
+    conn.commit()
+    conn.close()
+    return count
+
+
+def benchmark_read(path):
+    with open_bag(path, mcap=True) as bag:
+        topics = list(bag.topics())
+        start = time.perf_counter()
+        count, size = 0, 0
+        for _, _, data in bag.merged(topics):
+            count += 1
+            size += len(data)
+        full = time.perf_counter() - start
+
+        seek = None
+        if image_topic in topics:
+            stamps = bag.timestamps(image_topic)
+            if stamps:
+                middle = stamps[len(stamps) // 2]
+                start = time.perf_counter()
+                window = sum(1 for _ in bag.messages(image_topic, start_time=middle, end_time=middle + 1000000000))
+                seek = (time.perf_counter() - start, window)
+    print(f"{os.path.basename(path):45s} {os.path.getsize(path) / 1e6:8.1f} MB on disk | "
+          f"{count / full:8.0f} msgs/s | {size / full / 1e6:7.1f} MB/s", end="")
+    print(f" | 1 s seek: {seek[1]} frames in {seek[0] * 1000:.1f} ms" if seek else "")
+
+
+if __name__ == "__main__":
+    with open_bag(input_bag, mcap=True) as bag:
+        to_format = ".mcap" if isinstance(bag, BagReader) else ".db3"
+        output = output_bag or os.path.splitext(input_bag)[0] + to_format
+        start = time.perf_counter()
+        count = to_mcap(bag, output) if to_format == ".mcap" else to_db3(bag, output)
+        print(f"✅ Converted {count} messages to '{output}' in {time.perf_counter() - start:.1f} s")
+
+    if benchmark:
+        benchmark_read(input_bag)
+        benchmark_read(output)
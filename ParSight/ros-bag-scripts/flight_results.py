@@ -0,0 +1,94 @@
+import sys
+import csv
+import glob
+import time
+import numpy as np
+
+# Columnar per-frame analysis results of one flight, stored as a .npz
+# one typed array per column (frame_index, timestamp, ball_x, ball_y, dx, dy,
+# distance_from_center), a frame without the ball has NaN in the float columns,
+# so misses need no special rows and every metric is a numpy reduction
+# np.load of a flight is a handful of array reads, so summarising dozens of
+# flights takes milliseconds instead of re-parsing their CSVs
+# run on its own (python flight_results.py results/*.npz) it prints the
+# summary of every flight and of all of them together
+
+COLUMNS = {
+    "frame_index": np.int32,
+    "timestamp": np.int64,
+    "ball_x": np.float32,
+    "ball_y": np.float32,
+    "dx": np.float32,
+    "dy": np.float32,
+    "distance_from_center": np.float32,
+}
+
+lock_radius = 10.0      # pixels from the centre that count as locked on
+
+
+def empty_results(n):
+    # preallocated columns for n frames, everything missed until filled in
+    results = {name: np.zeros(n, dtype=dtype) for name, dtype in COLUMNS.items()}
+    for name in ("ball_x", "ball_y", "dx", "dy", "distance_from_center"):
+        results[name][:] = np.nan
+    return results
+
+
+def finish_results(results, center):
+    # offsets and distances for every frame at once, NaN stays NaN
+    results["dx"][:] = results["ball_x"] - center[0]
+    results["dy"][:] = results["ball_y"] - center[1]
+    results["distance_from_center"][:] = np.hypot(results["dx"], results["dy"])
+    return results
+
+
+def save_results(path, results, **meta):
+    np.savez(path, **results, **{f"meta_{key}": value for key, value in meta.items()})
+
+
+def load_results(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def save_csv(path, results):
+    # the old ball_distances.csv layout, empty cells for misses
+    names = list(COLUMNS)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name in names if name != "timestamp"])
+        for row in zip(*(results[name].tolist() for name in names if name != "timestamp")):
+            writer.writerow(["" if value != value else value for value in row])
+
+
+def summary(results):
+    # tracking metrics over all frames of a flight (or several concatenated)
+    distance = results["distance_from_center"]
+    found = ~np.isnan(distance)
+    frames = len(distance)
+    seen = distance[found]
+    return {
+        "frames": frames,
+        "detected": found.mean() if frames else 0.0,
+        "locked": (seen <= lock_radius).sum() / frames if frames else 0.0,
+        "rms": float(np.sqrt(np.mean(seen ** 2))) if len(seen) else float("nan"),
+        "p50": float(np.percentile(seen, 50)) if len(seen) else float("nan"),
+        "p95": float(np.percentile(seen, 95)) if len(seen) else float("nan"),
+    }
+
+
+def print_summary(name, s):
+    print(f"{name:40s} {s['frames']:6d} frames | detected {s['detected'] * 100:5.1f}% | locked {s['locked'] * 100:5.1f}% | "
+          f"rms {s['rms']:6.2f} px | p50 {s['p50']:6.2f} | p95 {s['p95']:6.2f}")
+
+
+if __name__ == "__main__":
+    paths = sorted(p for pattern in sys.argv[1:] for p in glob.glob(pattern))
+    start = time.perf_counter()
+    flights = [(path, load_results(path)) for path in paths]
+    for path, results in flights:
+        print_summary(path, summary(results))
+    if len(flights) > 1:
+        combined = {"distance_from_center": np.concatenate([r["distance_from_center"] for _, r in flights])}
+        print_summary("all flights", summary(combined))
+    print(f"\n{len(flights)} flights loaded and summarised in {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,126 @@
+import os
+import time
+import cv2
+import numpy as np
+from bag_reader import open_bag, ImageDecoder
+
+# Decoded frames of one image topic in a single memory-mapped .npy file
+# the bag's CDR images are deserialized once into frames x H x W x 3 (uint8) and
+# the frame numbers and timestamps go next to it in a .npz, after that every
+# analysis opens the store with np.load(mmap_mode="r"): a frame is a view into the
+# page cache, no copy and no decoding, so a detector run over the flight is
+# limited by the detector alone
+# frames with another size than the first are resized to it, frames that fail to
+# decode stay black and are marked in valid
+# run on its own it builds the store from the config below and times a pass over it
+
+# === CONFIG ===
+bag_folder = "/home/jetson/flyrs_ws/rosbag_catapult_working"   # folder containing metadata.yaml and data_0.db3
+image_topic = "/camera/image_raw"
+db_file = os.path.join(bag_folder, "rosbag2_2025_04_11-11_16_18_0.db3")
+output_store = "flight_frames"  # writes flight_frames.npy and flight_frames.npz
+swap_8uc3 = False               # as ImageDecoder, set if the colours of 8UC3 frames look wrong
+
+
+def store_paths(path):
+    base = path[:-4] if path.endswith((".npy", ".npz")) else path
+    return base + ".npy", base + ".npz"
+
+
+def build_store(bag, topic, path, swap_8uc3=False, **ranges):
+    # decodes the topic (or a window of it) once into the store, returns the FrameStore
+    frames_path, meta_path = store_paths(path)
+    # sized from the same window that is read, frame and time ranges intersect
+    n = bag.window_count(topic, **ranges)
+    decode = ImageDecoder(swap_8uc3)
+    frames = None
+    frame_index = np.zeros(n, dtype=np.int32)
+    timestamps = np.zeros(n, dtype=np.int64)
+    valid = np.zeros(n, dtype=bool)
+    for k, (i, timestamp, data) in enumerate(bag.window(topic, **ranges)):
+        frame_index[k], timestamps[k] = i, timestamp
+        try:
+            img = decode(data)
+        except Exception as e:
+            print(f"⚠️ Frame {i} skipped due to error: {e}")
+            continue
+        if frames is None:
+            # the first decoded frame fixes the size of the whole store
+            frames = np.lib.format.open_memmap(frames_path, mode="w+", dtype=np.uint8, shape=(n,) + img.shape)
+        if img.shape != frames.shape[1:]:
+            img = cv2.resize(img, (frames.shape[2], frames.shape[1]))
+        frames[k] = img
+        valid[k] = True
+    if frames is None:
+        raise ValueError(f"No frame of '{topic}' could be decoded")
+    frames.flush()
+    del frames
+    np.savez(meta_path, frame_index=frame_index, timestamps=timestamps, valid=valid, topic=topic, source=bag.db_file)
+    return FrameStore(path)
+
+
+class FrameStore:
+
+    def __init__(self, path):
+        frames_path, meta_path = store_paths(path)
+        self.images = np.load(frames_path, mmap_mode="r")
+        with np.load(meta_path) as meta:
+            self.frame_index = meta["frame_index"]
+            self.timestamps = meta["timestamps"]
+            self.valid = meta["valid"]
+            self.topic = str(meta["topic"])
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, k):
+        # read only view into the mapped file
+        return self.images[k]
+
+    def position(self, frame):
+        # position in the store of a bag frame number
+        return int(np.searchsorted(self.frame_index, frame, side="left"))
+
+    def seek(self, time):
+        # position of the first frame at or after time (ns)
+        return int(np.searchsorted(self.timestamps, time, side="left"))
+
+    def window(self, start_frame=None, end_frame=None, start_time=None, end_time=None):
+        # store positions covering a window given in bag frame numbers and/or ns, end inclusive
+        first = max(self.position(start_frame) if start_frame is not None else 0,
+                    self.seek(start_time) if start_time is not None else 0)
+        last = len(self)
+        if end_frame is not None:
+            last = min(last, self.position(end_frame + 1))
+        if end_time is not None:
+            last = min(last, self.seek(end_time + 1))
+        return range(first, last)
+
+    def frames(self, with_invalid=False, **ranges):
+        # (frame index, timestamp ns, BGR view) like the bag readers' frames(), minus the decoding
+        # (frames that failed to decode are skipped, or come as None with with_invalid)
+        for k in self.window(**ranges):
+            if self.valid[k]:
+                yield int(self.frame_index[k]), int(self.timestamps[k]), self.images[k]
+            elif with_invalid:
+                yield int(self.frame_index[k]), int(self.timestamps[k]), None
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    with open_bag(db_file) as bag:
+        store = build_store(bag, image_topic, output_store, swap_8uc3)
+    print(f"✅ Stored {len(store)} frames {store.images.shape[1:]} in {time.perf_counter() - start:.1f} s "
+          f"({store.images.nbytes / 1e6:.0f} MB)")
+
+    # a full pass and random access, the cost every later analysis pays per frame
+    start = time.perf_counter()
+    for _, _, frame in store.frames():
+        frame[::8, ::8].sum()
+    full = time.perf_counter() - start
+    order = np.random.default_rng(0).permutation(len(store))[:1000]
+    start = time.perf_counter()
+    for k in order:
+        store[k][::8, ::8].sum()
+    random_access = (time.perf_counter() - start) / len(order)
+    print(f"full pass {len(store) / full:.0f} frames/s | random frame {random_access * 1e6:.0f} us")
@@ -0,0 +1,181 @@
+import os
+import csv
+import numpy as np
+from bag_reader import open_bag
+from bag_sync import PoseDecoder
+from flight_results import load_results
+
+# Measures the system reaction time (ball moves -> drone moves) over whole flights
+# the ball's offset from the image centre (the analysis results of
+# rosbag_convert_to_vid.py, .npz or the old CSV) and the drone's pose from the bag
+# are resampled onto one uniform time grid; a ball-motion event is the ball's
+# offset speed crossing ball_speed_threshold after quiet_time of calm, and each
+# event gets two latency estimates:
+#   onset: first time the drone's horizontal speed rises drone_speed_threshold
+#          above its pre-event level
+#   xcorr: lag of the peak cross-correlation between the rising edge (positive
+#          rate of change) of the ball's offset speed over the edge_window after
+#          the event and the rising edge of the drone's horizontal speed, lags up to
+#          max_latency; every lag is normalised by the same drone segment (a
+#          per-lag normalisation rewards lags past the drone's peak acceleration,
+#          where its decaying edge looks alike at every scale), so the peak sits
+#          where the drone starts accelerating and does not move with its rise time,
+#          and an event without an onset response gets no xcorr latency either
+# everything runs on whole-flight arrays (cumulative sums, sliding windows), no
+# per-sample python loops, and the latencies of every flight are saved together
+# so the effect of each latency optimization can be compared flight by flight
+
+# === CONFIG ===
+bag_folder = "/home/jetson/flyrs_ws/rosbag_catapult_working"   # folder containing metadata.yaml and data_0.db3
+flights = [
+    # analysis results and the bag they came from (the bag gives the poses, and the frame times for a CSV)
+    {"results": "ball_distances.npz", "bag": os.path.join(bag_folder, "rosbag2_2025_04_11-11_16_18_0.db3")},
+]
+image_topic = "/camera/image_raw"
+pose_topic = "/mavros/local_position/pose"  # or "/vicon/ROB498_Drone/ROB498_Drone"
+grid_hz = 100.0                 # common time grid of both signals
+max_gap = 0.2                   # seconds a signal is interpolated across before it counts as missing
+smoothing = 0.05                # seconds of moving average on both signals
+ball_speed_threshold = 40.0     # pixels/s of ball offset motion that starts an event
+quiet_time = 0.5                # seconds of calm needed before an event
+drone_speed_threshold = 0.15    # m/s above the pre-event speed that counts as the response
+max_latency = 1.5               # seconds searched for the response
+edge_window = 0.3               # seconds of the ball's rising edge matched against the drone's
+hand_measured = 0.350           # seconds, the reaction time measured by hand from video, for comparison
+output_file = "reaction_times.npz"
+
+
+def load_ball(path, bag):
+    # (times s, offsets N x 2 pixels with NaN for misses)
+    if path.endswith(".npz"):
+        results = load_results(path)
+        frame_index, timestamps = results["frame_index"], results["timestamp"]
+        offsets = np.stack([results["dx"], results["dy"]], axis=1).astype(np.float64)
+    else:
+        # the old CSV has no times, they come from the bag's frame index
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        frame_index = np.array([int(row["frame_index"]) for row in rows])
+        offsets = np.array([[float(row["dx"] or "nan"), float(row["dy"] or "nan")] for row in rows])
+        timestamps = np.zeros(len(rows), dtype=np.int64)
+    if not timestamps.any():
+        timestamps = bag.index(image_topic).timestamps[frame_index]
+    return timestamps / 1e9, offsets
+
+
+def load_pose(bag):
+    # (times s, positions N x 3)
+    decode = PoseDecoder()
+    times, positions = [], []
+    for _, timestamp, data in bag.messages(pose_topic):
+        times.append(timestamp)
+        positions.append(decode(data)[:3])
+    return np.array(times) / 1e9, np.array(positions).reshape(-1, 3)
+
+
+def resample(times, values, grid):
+    # linear interpolation onto the grid, NaN where the nearest sample is more than max_gap away
+    valid = ~np.isnan(values).any(axis=1)
+    times, values = times[valid], values[valid]
+    if len(times) < 2:
+        return np.full((len(grid), values.shape[1]), np.nan)
+    out = np.stack([np.interp(grid, times, values[:, k]) for k in range(values.shape[1])], axis=1)
+    after = np.clip(np.searchsorted(times, grid), 1, len(times) - 1)
+    nearest = np.minimum(np.abs(grid - times[after - 1]), np.abs(times[after] - grid))
+    out[nearest > max_gap] = np.nan
+    return out
+
+
+def smooth(x, n):
+    # moving average, a NaN spreads over its window
+    if n <= 1:
+        return x
+    return np.convolve(x, np.ones(n) / n, mode="same")
+
+
+def speed(values, n, dt):
+    # smoothed magnitude of the rate of change of a N x D signal
+    rate = np.gradient(values, dt, axis=0)
+    return smooth(np.linalg.norm(rate, axis=1), n)
+
+
+def find_events(ball_speed, quiet, horizon, window):
+    # grid indices where the ball starts moving after quiet samples of calm
+    moving = np.nan_to_num(ball_speed) > ball_speed_threshold
+    counts = np.concatenate(([0], np.cumsum(moving)))
+    idx = np.arange(quiet, len(moving) - horizon - window)
+    calm_before = counts[idx] - counts[idx - quiet] == 0
+    return idx[moving[idx] & calm_before & ~np.isnan(ball_speed[idx])]
+
+
+def onset_latencies(events, drone_speed, quiet, horizon):
+    # samples from each event to the drone's speed rising above its pre-event level
+    filled = np.nan_to_num(drone_speed)
+    counts = np.concatenate(([0], np.cumsum(filled)))
+    baseline = (counts[events] - counts[events - quiet]) / quiet
+    # events x horizon matrix of the drone's speed after each event, the first sample over its threshold wins
+    after = filled[events[:, None] + np.arange(1, horizon + 1)[None, :]]
+    hit = after > (baseline + drone_speed_threshold)[:, None]
+    return np.where(hit.any(axis=1), hit.argmax(axis=1) + 1, np.nan)
+
+
+def xcorr_latencies(events, ball_speed, drone_speed, horizon, window, dt):
+    # lag of the peak cross-correlation after each event, NaN when the drone's speed never rises
+    ball = np.maximum(np.gradient(np.nan_to_num(ball_speed), dt), 0)
+    drone = np.maximum(np.gradient(np.nan_to_num(drone_speed), dt), 0)
+    ball_windows = np.lib.stride_tricks.sliding_window_view(ball, window)[events]
+    # the drone's edge over every lag, events x (horizon + 1) lags x window
+    segments = np.lib.stride_tricks.sliding_window_view(drone, horizon + window)[events]
+    shifted = np.lib.stride_tricks.sliding_window_view(segments, window, axis=1)
+    corr = np.einsum("ew,elw->el", ball_windows, shifted)
+    norm = np.linalg.norm(ball_windows, axis=1) * np.linalg.norm(segments, axis=1)
+    return np.where(norm > 0, corr.argmax(axis=1), np.nan)
+
+
+def flight_latencies(ball_times, offsets, pose_times, positions):
+    # (event times s, onset latencies s, xcorr latencies s) of one flight
+    dt = 1.0 / grid_hz
+    start, end = max(ball_times[0], pose_times[0]), min(ball_times[-1], pose_times[-1])
+    grid = np.arange(start, end, dt)
+    n = max(int(round(smoothing * grid_hz)), 1)
+    ball_speed = speed(resample(ball_times, offsets, grid), n, dt)
+    drone_speed = speed(resample(pose_times, positions[:, :2], grid), n, dt)
+    quiet, horizon = int(round(quiet_time * grid_hz)), int(round(max_latency * grid_hz))
+    window = max(int(round(edge_window * grid_hz)), 1)
+    events = find_events(ball_speed, quiet, horizon, window)
+    if len(events) == 0:
+        return grid[:0], np.array([]), np.array([])
+    onset = onset_latencies(events, drone_speed, quiet, horizon) * dt
+    xcorr = xcorr_latencies(events, ball_speed, drone_speed, horizon, window, dt) * dt
+    # no response within max_latency, the correlation peak would be noise
+    xcorr[np.isnan(onset)] = np.nan
+    return grid[events], onset, xcorr
+
+
+def describe(name, latencies):
+    latencies = latencies[~np.isnan(latencies)]
+    if len(latencies) == 0:
+        return f"{name:6s} no responses"
+    p25, p50, p75, p95 = np.percentile(latencies, [25, 50, 75, 95]) * 1000
+    return (f"{name:6s} {len(latencies):3d} events | median {p50:5.0f} ms | iqr {p25:4.0f}-{p75:4.0f} ms | "
+            f"p95 {p95:5.0f} ms | mean {latencies.mean() * 1000:5.0f} ms")
+
+
+if __name__ == "__main__":
+    saved = {}
+    for k, flight in enumerate(flights):
+        with open_bag(flight["bag"]) as bag:
+            ball_times, offsets = load_ball(flight["results"], bag)
+            pose_times, positions = load_pose(bag)
+        event_times, onset, xcorr = flight_latencies(ball_times, offsets, pose_times, positions)
+        print(f"\n{flight['results']}: {len(event_times)} ball-motion events")
+        print("  " + describe("onset", onset))
+        print("  " + describe("xcorr", xcorr))
+        for name, latencies in (("onset", onset), ("xcorr", xcorr)):
+            if not np.isnan(latencies).all():
+                print(f"  {name} median {(np.nanmedian(latencies) - hand_measured) * 1000:+.0f} ms against the hand measured "
+                      f"{hand_measured * 1000:.0f} ms")
+        saved[f"event_times_{k}"], saved[f"onset_{k}"], saved[f"xcorr_{k}"] = event_times, onset, xcorr
+
+    np.savez(output_file, flights=np.array([flight["results"] for flight in flights]), **saved)
+    print(f"\n✅ Saved reaction times to '{output_file}'")
@@ -1,63 +1,79 @@
-import sqlite3
 import os
 import cv2
-import csv
 import numpy as np
-from cv_bridge import CvBridge
-from rclpy.serialization import deserialize_message
-from rosidl_runtime_py.utilities import get_message
+from bag_reader import open_bag, ImageDecoder
+from frame_store import FrameStore
+from flight_results import empty_results, finish_results, save_results, save_csv, summary, print_summary
 
 # === CONFIG ===
 bag_folder = "/home/jetson/flyrs_ws/rosbag_catapult_working"   # folder containing metadata.yaml and data_0.db3
 image_topic = "/camera/image_raw"       # topic used during flight
 db_file = os.path.join(bag_folder, "rosbag2_2025_04_11-11_16_18_0.db3")
-output_csv = "ball_distances.csv"
+output_results = "ball_distances.npz"  # columnar results, summarise flights with flight_results.py
+output_csv = None                       # e.g. "ball_distances.csv" to also write the old CSV
 output_img_dir = "extracted_frames_raw"
+frame_store = None                      # frames from frame_store.py instead of decoding the bag, e.g. "flight_frames"
 
 start_frame = 454
 end_frame = 1078
 
-bridge = CvBridge()
-os.makedirs(output_img_dir, exist_ok=True)
-
-# Connect to SQLite3 DB
-conn = sqlite3.connect(db_file)
-cursor = conn.cursor()
+# or a window around an event, e.g. the catapult launch (seconds after the first frame),
+# found by a seek in the bag index instead of counting frames
+event_time = None
+before_event = 2.0
+after_event = 5.0
 
-# Get topic ID
-cursor.execute("SELECT id FROM topics WHERE name = ?", (image_topic,))
-row = cursor.fetchone()
-if not row:
-    print(f"❌ Topic '{image_topic}' not found in rosbag.")
-    exit()
-
-topic_id = row[0]
-msg_type = get_message("sensor_msgs/msg/Image")
-cursor.execute("SELECT timestamp, data FROM messages WHERE topic_id = ?", (topic_id,))
-rows = cursor.fetchall()
+os.makedirs(output_img_dir, exist_ok=True)
 
-# Distance results
-results = []
 
-for i, (timestamp, data) in enumerate(rows):
-    if i < start_frame:
+def decoded_frames(bag, window):
+    # Stream only the window out of the bag, a frame at a time (None for a frame that fails to decode)
+    # If colors look wrong, use ImageDecoder(swap_8uc3=True)
+    decode = ImageDecoder()
+    for i, timestamp, data in bag.window(image_topic, **window):
+        try:
+            yield i, timestamp, decode(data)
+        except Exception as e:
+            print(f"⚠️ Frame {i} error: {e}")
+            yield i, timestamp, None
+
+
+if frame_store:
+    # already decoded, the frames are read only views into the store
+    source = FrameStore(frame_store)
+else:
+    source = open_bag(db_file)
+    if source.topic_id(image_topic) is None:
+        print(f"❌ Topic '{image_topic}' not found in rosbag.")
+        exit()
+
+if event_time is not None:
+    first_time = int(source.timestamps[0]) if frame_store else source.index(image_topic).start_time
+    event_ns = first_time + int(event_time * 1e9)
+    window = dict(start_time=event_ns - int(before_event * 1e9), end_time=event_ns + int(after_event * 1e9))
+else:
+    window = dict(start_frame=start_frame, end_frame=end_frame)
+
+# one row per frame the window yields, counted from the same window that is iterated
+if frame_store:
+    n = len(source.window(**window))
+    frames = source.frames(with_invalid=True, **window)
+else:
+    n = source.window_count(image_topic, **window)
+    frames = decoded_frames(source, window)
+
+# Distance results, one column per quantity with NaN for frames without the ball
+results = empty_results(n)
+center = None
+
+for k, (i, timestamp, img) in enumerate(frames):
+    results["frame_index"][k] = i
+    results["timestamp"][k] = timestamp
+    if img is None:
         continue
-    if i > end_frame:
-        break
-
     try:
-        img_msg = deserialize_message(data, msg_type)
-
-        # === FIX for 8UC3 encoding ===
-        if img_msg.encoding == "8UC3":
-            img = bridge.imgmsg_to_cv2(img_msg, desired_encoding="passthrough")
-            # If colors look wrong, uncomment this:
-            # img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-        else:
-            img = bridge.imgmsg_to_cv2(img_msg, desired_encoding="bgr8")
-
         height, width = img.shape[:2]
-        cx, cy = width // 2, height // 2
+        center = (width // 2, height // 2)
 
         # === Green dot detection ===
         hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
@@ -70,32 +86,28 @@ for i, (timestamp, data) in enumerate(rows):
             largest = max(contours, key=cv2.contourArea)
             M = cv2.moments(largest)
             if M["m00"] > 0:
-                bx = int(M["m10"] / M["m00"])
-                by = int(M["m01"] / M["m00"])
-                dx = bx - cx
-                dy = by - cy
-                dist = np.sqrt(dx**2 + dy**2)
-
-                results.append([i, bx, by, dx, dy, dist])
+                bx = M["m10"] / M["m00"]
+                by = M["m01"] / M["m00"]
+                results["ball_x"][k] = bx
+                results["ball_y"][k] = by
 
                 # Optional: save visualization
-                cv2.circle(img, (bx, by), 3, (255, 255, 255), -1)
+                img = img.copy()
+                cv2.circle(img, (int(bx), int(by)), 3, (255, 255, 255), -1)
                 cv2.imwrite(os.path.join(output_img_dir, f"frame_{i:05d}.jpg"), img)
-            else:
-                results.append([i, None, None, None, None, None])
-        else:
-            results.append([i, None, None, None, None, None])
 
     except Exception as e:
         print(f"⚠️ Frame {i} error: {e}")
-        results.append([i, None, None, None, None, None])
 
-conn.close()
+if not frame_store:
+    source.close()
 
-# === Save CSV ===
-with open(output_csv, "w", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(["frame_index", "ball_x", "ball_y", "dx", "dy", "distance_from_center"])
-    writer.writerows(results)
+# === Save results ===
+# offsets and distances for all frames at once
+finish_results(results, center or (0, 0))
+save_results(output_results, results, image_topic=image_topic, db_file=db_file)
+print_summary(output_results, summary(results))
+if output_csv:
+    save_csv(output_csv, results)
 
-print(f"\n✅ Saved {len(results)} entries to '{output_csv}'")
+print(f"\n✅ Saved {len(results['frame_index'])} entries to '{output_results}'")
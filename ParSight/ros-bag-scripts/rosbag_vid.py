@@ -1,61 +1,247 @@
-import sqlite3
 import os
+import time
+import queue
+import multiprocessing as mp
 import cv2
-from cv_bridge import CvBridge
-from rclpy.serialization import deserialize_message
-from rosidl_runtime_py.utilities import get_message
+import numpy as np
+from bag_reader import open_bag, ImageDecoder
+from frame_store import FrameStore
 
 # === CONFIG ===
 bag_folder = "/home/jetson/flyrs_ws/rosbag2_2025_04_02-14_03_16"  # directory containing metadata.yaml and data_0.db3
 image_topic = "/camera/segmented"  # Replace with your actual image topic
 output_dir = "yolo_seg"
 db_file = os.path.join(bag_folder, "rosbag2_2025_04_02-14_03_16_0.db3")
+start_frame = None      # first frame to save, None for the start of the bag
+end_frame = None        # last frame to save (inclusive), None for the end of the bag
+frame_store = None      # frames from frame_store.py instead of decoding the bag, e.g. "flight_frames"
+output_format = "video" # "video" writes one file at the bag's timing, "jpeg" a file per frame into output_dir
+output_video = "yolo_seg.mp4"
+video_fourcc = "mp4v"
+video_fps = None        # None uses the bag's median frame interval
+default_fps = 30.0      # when the bag gives no interval (a single frame, or every stamp the same)
+workers = max(os.cpu_count() - 1, 1)    # jpeg output: processes decoding and encoding, 0 exports on this process alone
+queue_depth = 4         # raw messages waiting per worker before the reader blocks
+jpeg_quality = 95
+report_period = 2.0     # seconds between progress lines
+worker_check_period = 1.0   # seconds a blocked queue waits before checking the workers are alive
 
-# === SETUP ===
-os.makedirs(output_dir, exist_ok=True)
-bridge = CvBridge()
 
-# Connect to ROS 2 bag database
-conn = sqlite3.connect(db_file)
-cursor = conn.cursor()
+def save_frame(i, cv_image):
+    ok, jpeg = cv2.imencode(".jpg", cv_image, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    with open(os.path.join(output_dir, f"frame_{i:05d}.jpg"), "wb") as f:
+        f.write(jpeg)
+    return len(jpeg)
 
-# Get topic ID for the image topic
-cursor.execute("SELECT id FROM topics WHERE name = ?", (image_topic,))
-row = cursor.fetchone()
 
-if not row:
-    print(f"Topic '{image_topic}' not found in the bag.")
-    exit()
+def source_frames(source):
+    # (frame index, timestamp, bytes read, BGR image or the decode error) from a bag or a frame store
+    if isinstance(source, FrameStore):
+        for i, timestamp, cv_image in source.frames(start_frame=start_frame, end_frame=end_frame):
+            yield i, timestamp, cv_image.nbytes, cv_image
+        return
+    # 8UC3 is treated as RGB-ish and swapped to BGR by the decoder
+    decode = ImageDecoder(swap_8uc3=True)
+    for i, timestamp, data in source.messages(image_topic, start_frame=start_frame, end_frame=end_frame):
+        try:
+            yield i, timestamp, len(data), decode(data)
+        except Exception as e:
+            yield i, timestamp, len(data), e
 
-topic_id = row[0]
-msg_type = get_message("sensor_msgs/msg/Image")
 
-# Query and save frames
-cursor.execute("SELECT timestamp, data FROM messages WHERE topic_id = ?", (topic_id,))
-rows = cursor.fetchall()
+def video_rate(stamps):
+    # frames per second from the median interval between distinct stamps, duplicated stamps say nothing about it
+    intervals = np.diff(np.asarray(stamps, dtype=np.int64))
+    intervals = intervals[intervals > 0]
+    return 1e9 / np.median(intervals) if len(intervals) else default_fps
 
-print(f"Found {len(rows)} image messages. Saving...")
 
-for i, (timestamp, data) in enumerate(rows):
-    try:
-        img_msg = deserialize_message(data, msg_type)
+def export_video(source, progress):
+    # one sequential stream, each frame held until the next one's time so gaps and bursts keep real timing
+    if isinstance(source, FrameStore):
+        window = source.window(start_frame=start_frame, end_frame=end_frame)
+        stamps = source.timestamps[window.start:window.stop]
+    else:
+        stamps = source.timestamps(image_topic, start_frame=start_frame, end_frame=end_frame)
+    fps = video_fps or video_rate(stamps)
+    writer, size, written, dropped, duplicated = None, None, 0, 0, 0
+    last = None
+    for i, timestamp, nbytes, cv_image in source_frames(source):
+        if isinstance(cv_image, Exception):
+            progress.add(i, nbytes, 0, str(cv_image))
+            continue
+        if writer is None:
+            size = (cv_image.shape[1], cv_image.shape[0])
+            writer = cv2.VideoWriter(output_video, cv2.VideoWriter_fourcc(*video_fourcc), fps, size)
+            if not writer.isOpened():
+                print(f"Could not open '{output_video}' for writing.")
+                exit()
+        elif (cv_image.shape[1], cv_image.shape[0]) != size:
+            cv_image = cv2.resize(cv_image, size)
+        # the video slot this frame falls in
+        slot = int(round((timestamp - stamps[0]) * fps / 1e9))
+        if slot < written:
+            # a second frame in a slot that is already written, read but not saved
+            dropped += 1
+            progress.drop(nbytes)
+            continue
+        # a gap in the bag, the last frame stays up until this one is due
+        while last is not None and written < slot:
+            writer.write(last)
+            written += 1
+            duplicated += 1
+        writer.write(cv_image)
+        written += 1
+        last = cv_image
+        progress.add(i, nbytes, 0, None)
+    if writer is not None:
+        writer.release()
+        progress.bytes_out = os.path.getsize(output_video)
+    print(f"{written} video frames at {fps:.2f} fps | {duplicated} duplicated for gaps | {dropped} dropped")
 
-        # Handle the encoding manually if needed
-        if img_msg.encoding == "8UC3":
-            # Treat as BGR manually
-            cv_image = bridge.imgmsg_to_cv2(img_msg, desired_encoding="passthrough")
-            cv_image = cv2.cvtColor(cv_image, cv2.COLOR_RGB2BGR)  # Assuming it's RGB-ish
+
+def export_worker(tasks, results):
+    # deserialize, convert and encode until the reader sends None
+    decode = ImageDecoder(swap_8uc3=True)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        i, data = task
+        try:
+            # 8UC3 is treated as RGB-ish and swapped to BGR by the decoder
+            results.put((i, len(data), save_frame(i, decode(data)), None))
+        except Exception as e:
+            results.put((i, len(data), 0, str(e)))
+
+
+class Progress:
+
+    def __init__(self, total):
+        self.total = total
+        self.saved, self.dropped, self.bytes_in, self.bytes_out = 0, 0, 0, 0
+        self.start = self.last_report = time.perf_counter()
+
+    def add(self, i, bytes_in, bytes_out, error):
+        if error is not None:
+            print(f"Frame {i} skipped due to error: {error}")
+        else:
+            self.saved += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.tick()
+
+    def drop(self, bytes_in):
+        # a frame that was read but deliberately left out
+        self.dropped += 1
+        self.bytes_in += bytes_in
+        self.tick()
+
+    def tick(self):
+        now = time.perf_counter()
+        if now - self.last_report > report_period:
+            self.last_report = now
+            self.report(f"{self.saved}/{self.total}")
+
+    def report(self, label):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        print(f"{label} frames | {self.saved / elapsed:.1f} frames/s | "
+              f"{self.bytes_in / elapsed / 1e6:.1f} MB/s read | {self.bytes_out / elapsed / 1e6:.1f} MB/s written")
+
+
+def export_sequential(source, progress):
+    for i, timestamp, nbytes, cv_image in source_frames(source):
+        if isinstance(cv_image, Exception):
+            progress.add(i, nbytes, 0, str(cv_image))
         else:
-            # Normal handling
-            cv_image = bridge.imgmsg_to_cv2(img_msg, desired_encoding="bgr8")
+            progress.add(i, nbytes, save_frame(i, cv_image), None)
+
+
+def check_pool(pool):
+    # a worker that died (OOM kill, crash in cv_bridge) took its frame with it, the export cannot finish
+    for p in pool:
+        if p.exitcode not in (None, 0):
+            for other in pool:
+                if other.is_alive():
+                    other.terminate()
+            print(f"❌ Export worker {p.pid} died with exit code {p.exitcode}, stopping the export.")
+            exit(1)
+
+
+def export_parallel(bag, progress):
+    # bounded task queue: the reader blocks once the workers fall behind, so memory stays flat
+    tasks = mp.Queue(maxsize=queue_depth * workers)
+    results = mp.Queue()
+    pool = [mp.Process(target=export_worker, args=(tasks, results), daemon=True) for _ in range(workers)]
+    for p in pool:
+        p.start()
+    sent, done = 0, 0
+    # every blocking call wakes up now and then to check that the workers are still there
+    for i, timestamp, data in bag.messages(image_topic, start_frame=start_frame, end_frame=end_frame):
+        while True:
+            try:
+                tasks.put((i, data), timeout=worker_check_period)
+                break
+            except queue.Full:
+                check_pool(pool)
+        sent += 1
+        # collect whatever finished meanwhile so the progress stays current
+        while not results.empty():
+            progress.add(*results.get())
+            done += 1
+    for _ in pool:
+        tasks.put(None)
+    while done < sent:
+        try:
+            progress.add(*results.get(timeout=worker_check_period))
+            done += 1
+        except queue.Empty:
+            check_pool(pool)
+    for p in pool:
+        p.join()
+
+
+def export_bag():
+    # Stream frames out of the ROS 2 bag database, only the requested range is read
+    with open_bag(db_file) as bag:
+        if bag.topic_id(image_topic) is None:
+            print(f"Topic '{image_topic}' not found in the bag.")
+            exit()
+
+        total = bag.count(image_topic, start_frame=start_frame, end_frame=end_frame)
+        progress = Progress(total)
+        if output_format == "video":
+            print(f"Found {total} image messages. Writing '{output_video}'...")
+            export_video(bag, progress)
+        elif workers:
+            print(f"Found {total} image messages. Saving on {workers} processes...")
+            export_parallel(bag, progress)
+        else:
+            print(f"Found {total} image messages. Saving...")
+            export_sequential(bag, progress)
+    return progress
+
+
+def export_store():
+    # frames already decoded into a store, read straight from the mapped file
+    store = FrameStore(frame_store)
+    total = len(store.window(start_frame=start_frame, end_frame=end_frame))
+    progress = Progress(total)
+    print(f"Found {total} stored frames. Saving...")
+    if output_format == "video":
+        export_video(store, progress)
+    else:
+        export_sequential(store, progress)
+    return progress
 
-        filename = f"frame_{i:05d}.jpg"
-        cv2.imwrite(os.path.join(output_dir, filename), cv_image)
-        print(f"Saved {filename}")
 
-    except Exception as e:
-        print(f"Frame {i} skipped due to error: {e}")
+if __name__ == "__main__":
+    # === SETUP ===
+    if output_format == "jpeg":
+        os.makedirs(output_dir, exist_ok=True)
 
+    progress = export_store() if frame_store else export_bag()
 
-conn.close()
-print(f"Saved {len(rows)} frames to '{output_dir}'")
+    progress.report(f"Saved {progress.saved}")
+    print(f"Saved {progress.saved} frames to '{output_video if output_format == 'video' else output_dir}'"
+          + (f", {progress.dropped} dropped" if progress.dropped else ""))
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from bag_sync import interpolate_pose, synchronized
+
+
+class MergedBag:
+
+    # the merged() stream of a bag, from (topic, timestamp ns, value) messages
+    def __init__(self, messages):
+        self.messages = sorted(messages, key=lambda m: m[1])
+
+    def merged(self, topics, start_time=None, end_time=None):
+        for topic, timestamp, data in self.messages:
+            if topic in topics and (start_time is None or timestamp >= start_time) \
+                    and (end_time is None or timestamp <= end_time):
+                yield topic, timestamp, data
+
+
+def pose(x):
+    # position x along a line, identity orientation
+    return np.array([x, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0])
+
+
+def flight(seed=0):
+    # 30 Hz frames, a 100 Hz and a jittery 20 Hz pose topic with a dropout in the middle
+    rng = np.random.default_rng(seed)
+    frames = np.arange(0, 3_000_000_000, 33_333_333)
+    fast = np.arange(5_000_000, 3_000_000_000, 10_000_000)
+    slow = np.sort(rng.integers(0, 3_000_000_000, 60))
+    slow = slow[(slow < 1_200_000_000) | (slow > 1_800_000_000)]
+    messages = [("/camera", int(t), b"frame") for t in frames]
+    messages += [("/fast", int(t), pose(t / 1e9)) for t in fast]
+    messages += [("/slow", int(t), pose(t / 1e9)) for t in slow]
+    return MergedBag(messages), frames, {"/fast": fast, "/slow": slow}
+
+
+def expected(t, times, policy, tolerance_ns):
+    # the neighbours of t found by a search over the whole topic
+    k = np.searchsorted(times, t, side="right")
+    before = times[k - 1] if k > 0 else None
+    after = times[k] if k < len(times) else None
+    near = [s for s in (before, after) if s is not None and abs(s - t) <= tolerance_ns]
+    if not near:
+        return None
+    if policy == "interpolate" and len(near) == 2 and after > before:
+        return interpolate_pose(pose(before / 1e9), pose(after / 1e9), (t - before) / (after - before))
+    return pose(min(near, key=lambda s: abs(s - t)) / 1e9)
+
+
+@pytest.mark.parametrize("policy", ["nearest", "interpolate"])
+def test_streaming_join_matches_a_full_search(policy):
+    bag, frames, topics = flight()
+    decoders = {topic: (lambda value: value) for topic in topics}
+    records = list(synchronized(bag, "/camera", list(topics), policy, 0.05, decoders))
+    assert [r[0] for r in records] == list(range(len(frames)))
+    assert [r[1] for r in records] == frames.tolist()
+    for _, t, _, values in records:
+        for topic, times in topics.items():
+            want = expected(t, times, policy, 50_000_000)
+            if want is None:
+                assert values[topic] is None
+            else:
+                assert np.allclose(values[topic], want)
+
+
+def test_dropout_leaves_frames_unmatched():
+    bag, frames, topics = flight()
+    decoders = {topic: (lambda value: value) for topic in topics}
+    records = list(synchronized(bag, "/camera", list(topics), "nearest", 0.05, decoders))
+    inside = [values for _, t, _, values in records if 1_300_000_000 < t < 1_700_000_000]
+    assert inside and all(values["/slow"] is None and values["/fast"] is not None for values in inside)
+
+
+def test_interpolated_orientation_is_normalised():
+    before = np.array([0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0])
+    after = np.array([2.0, 0.0, 0.0, 0.0, 0.0, -1.0, 0.0])
+    halfway = interpolate_pose(before, after, 0.5)
+    assert np.allclose(halfway[:3], [1.0, 0.0, 0.0])
+    assert np.isclose(np.linalg.norm(halfway[3:]), 1.0)
+
+
+def test_unknown_policy_is_rejected():
+    bag, _, topics = flight()
+    with pytest.raises(ValueError):
+        next(synchronized(bag, "/camera", list(topics), "latest"))
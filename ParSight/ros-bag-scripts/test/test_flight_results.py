@@ -0,0 +1,58 @@
+import csv
+
+import numpy as np
+
+from flight_results import (COLUMNS, empty_results, finish_results, load_results, save_csv, save_results,
+                            summary)
+
+
+def flight():
+    # 6 frames, the ball missed in two of them
+    results = empty_results(6)
+    results["frame_index"][:] = np.arange(100, 106)
+    results["timestamp"][:] = 1_000_000_000 + np.arange(6) * 33_333_333
+    results["ball_x"][:] = [64.0, 67.0, np.nan, 94.0, np.nan, 64.0]
+    results["ball_y"][:] = [64.0, 68.0, np.nan, 64.0, np.nan, 60.0]
+    return finish_results(results, (64, 64))
+
+
+def test_empty_results_are_typed_and_missed():
+    results = empty_results(3)
+    assert {name: results[name].dtype for name in results} == {name: np.dtype(t) for name, t in COLUMNS.items()}
+    assert np.isnan(results["distance_from_center"]).all()
+
+
+def test_finish_results_keeps_misses():
+    results = flight()
+    assert np.allclose(results["distance_from_center"], [0.0, 5.0, np.nan, 30.0, np.nan, 4.0], equal_nan=True)
+
+
+def test_npz_round_trip(tmp_path):
+    results = flight()
+    path = str(tmp_path / "ball_distances.npz")
+    save_results(path, results, image_topic="/camera/image_raw", db_file="flight.db3")
+    loaded = load_results(path)
+    for name in COLUMNS:
+        assert loaded[name].dtype == results[name].dtype
+        assert np.array_equal(loaded[name], results[name], equal_nan=True)
+    assert str(loaded["meta_image_topic"]) == "/camera/image_raw"
+    assert summary(loaded) == summary(results)
+
+
+def test_csv_has_the_old_layout(tmp_path):
+    path = tmp_path / "ball_distances.csv"
+    save_csv(path, flight())
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == ["frame_index", "ball_x", "ball_y", "dx", "dy", "distance_from_center"]
+    assert [row["frame_index"] for row in rows] == [str(i) for i in range(100, 106)]
+    assert rows[2]["dx"] == "" and float(rows[1]["distance_from_center"]) == 5.0
+
+
+def test_summary_counts_misses_as_frames():
+    s = summary(flight())
+    assert s["frames"] == 6
+    assert np.isclose(s["detected"], 4 / 6)
+    # 0, 5 and 4 px are within the 10 px lock radius, 30 px is not
+    assert np.isclose(s["locked"], 3 / 6)
+    assert np.isclose(s["rms"], np.sqrt((0 + 25 + 900 + 16) / 4))
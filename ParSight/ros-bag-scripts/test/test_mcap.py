@@ -0,0 +1,82 @@
+import pytest
+
+from bag_reader import BagReader, McapReader, open_bag
+from test_windows import RANGES, TIMESTAMPS, make_bag
+
+pytest.importorskip("mcap")
+
+import convert_bag  # noqa: E402
+
+TOPIC = "/camera/image_raw"
+
+
+@pytest.fixture
+def bags(tmp_path):
+    # the sqlite bag, its MCAP conversion and that converted back to sqlite
+    db3 = make_bag(tmp_path / "flight.db3")
+    with open_bag(db3) as bag:
+        convert_bag.to_mcap(bag, str(tmp_path / "flight.mcap"))
+    with open_bag(str(tmp_path / "flight.mcap"), mcap=True) as bag:
+        convert_bag.to_db3(bag, str(tmp_path / "back.db3"))
+    return [str(tmp_path / name) for name in ("flight.db3", "flight.mcap", "back.db3")]
+
+
+def read_all(path, ranges):
+    with open_bag(path, mcap=True) as bag:
+        return {
+            "count": bag.count(TOPIC, **ranges),
+            "window_count": bag.window_count(TOPIC, **ranges),
+            "timestamps": list(bag.timestamps(TOPIC, **ranges)),
+            "messages": [(i, t, bytes(d)) for i, t, d in bag.messages(TOPIC, **ranges)],
+            "window": [(i, t, bytes(d)) for i, t, d in bag.window(TOPIC, **ranges)],
+        }
+
+
+def test_open_bag_picks_the_reader(bags):
+    db3, mcap, back = bags
+    for path, reader in ((db3, BagReader), (mcap, McapReader), (back, BagReader)):
+        with open_bag(path, mcap=True) as bag:
+            assert type(bag) is reader
+            assert set(bag.topics()) == {TOPIC, "/drone/pose"}
+
+
+@pytest.mark.parametrize("ranges", [{}] + RANGES)
+def test_mcap_reads_like_sqlite(bags, ranges):
+    db3, mcap, back = bags
+    expected = read_all(db3, ranges)
+    assert read_all(mcap, ranges) == expected
+    assert read_all(back, ranges) == expected
+
+
+def test_merged_stream_survives_the_round_trip(bags):
+    streams = []
+    for path in bags:
+        with open_bag(path, mcap=True) as bag:
+            streams.append([(topic, t, bytes(d)) for topic, t, d in bag.merged([TOPIC, "/drone/pose"])])
+    assert streams[0] == streams[1] == streams[2]
+    with open_bag(bags[1], mcap=True) as bag:
+        assert convert_bag.topic_metadata(bag)[TOPIC] == ("sensor_msgs/msg/Image", "cdr", "")
+
+
+def test_scripts_only_read_mcap_when_asked(bags, tmp_path):
+    with pytest.raises(ValueError, match="convert_bag.py"):
+        open_bag(bags[1])
+    # a folder holding both formats opens the .db3
+    (tmp_path / "flight.db3.idx.npz").unlink(missing_ok=True)
+    with open_bag(str(tmp_path)) as bag:
+        assert type(bag) is BagReader
+
+
+def test_mcap_window_numbers_frames_sharing_a_timestamp(tmp_path):
+    # frames 3 to 6 share one stamp, a window starting inside them must not start at the first of them
+    stamps = TIMESTAMPS[:3] + [TIMESTAMPS[3]] * 4 + TIMESTAMPS[7:]
+    db3 = make_bag(tmp_path / "dup.db3", stamps)
+    with open_bag(db3) as bag:
+        convert_bag.to_mcap(bag, str(tmp_path / "dup.mcap"))
+    with open_bag(str(tmp_path / "dup.mcap"), mcap=True) as bag:
+        for first, last in ((5, 9), (3, 6), (4, 4), (6, 8)):
+            window = [(i, bytes(d)[0]) for i, _, d in bag.window(TOPIC, start_frame=first, end_frame=last)]
+            assert window == [(i, i) for i in range(first, last + 1)]
+            assert bag.window_count(TOPIC, start_frame=first, end_frame=last) == len(window)
+        # a time window over the shared stamp holds all four
+        assert [i for i, _, _ in bag.window(TOPIC, start_time=stamps[4], end_time=stamps[4])] == [3, 4, 5, 6]
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import reaction_time
+
+
+def simulated_flight(dead_time, time_constant, dt=0.001):
+    # the ball moves off for 1.5 s every 6 s, the drone's velocity follows it through a
+    # dead time and a first order lag, the camera sees the difference at 30 Hz, the pose comes at 50 Hz
+    t = np.arange(0.0, 60.0, dt)
+    ball_velocity = np.zeros_like(t)
+    for start in np.arange(2.0, 58.0, 6.0):
+        ball_velocity[(t >= start) & (t < start + 1.5)] = 0.6
+    command = np.interp(t - dead_time, t, ball_velocity, left=0.0)
+    drone_velocity = np.zeros_like(t)
+    for k in range(1, len(t)):
+        drone_velocity[k] = drone_velocity[k - 1] + dt / time_constant * (command[k - 1] - drone_velocity[k - 1])
+    ball, drone = np.cumsum(ball_velocity) * dt, np.cumsum(drone_velocity) * dt
+    frames, poses = slice(None, None, 33), slice(None, None, 20)
+    offsets = np.stack([(ball - drone)[frames] * 400.0, np.zeros(len(t[frames]))], axis=1)
+    positions = np.stack([drone[poses], np.zeros(len(t[poses])), np.ones(len(t[poses]))], axis=1)
+    return t[frames], offsets, t[poses], positions
+
+
+@pytest.mark.parametrize("time_constant", [0.05, 0.1, 0.3, 0.5])
+def test_xcorr_finds_the_dead_time_whatever_the_rise_time(time_constant):
+    event_times, onset, xcorr = reaction_time.flight_latencies(*simulated_flight(0.35, time_constant))
+    assert len(event_times) >= 10
+    # within the 30 Hz frame period (plus a grid step) of the dead time
+    assert 0.35 <= np.nanmedian(xcorr) <= 0.35 + 0.033 + 0.02
+    # the onset waits for the speed to clear its threshold, so it reads later on a slow rise
+    assert np.nanmedian(onset) >= np.nanmedian(xcorr)
+
+
+def test_xcorr_follows_the_dead_time():
+    medians = [np.nanmedian(reaction_time.flight_latencies(*simulated_flight(dead, 0.2))[2]) for dead in (0.2, 0.35, 0.6)]
+    assert np.allclose(np.diff(medians), [0.15, 0.25], atol=0.02)
+
+
+def test_no_response_gives_no_latencies():
+    ball_times, offsets, pose_times, positions = simulated_flight(0.35, 0.2)
+    positions[:] = (0.0, 0.0, 1.0)
+    event_times, onset, xcorr = reaction_time.flight_latencies(ball_times, offsets, pose_times, positions)
+    assert len(event_times) > 0 and np.isnan(onset).all() and np.isnan(xcorr).all()
@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+import pytest
+
+import rosbag_vid
+from frame_store import FrameStore, store_paths
+
+
+def make_store(path, timestamps):
+    frames_path, meta_path = store_paths(str(path))
+    n = len(timestamps)
+    frames = np.zeros((n, 64, 64, 3), dtype=np.uint8)
+    frames[:, :, :, 2] = np.arange(n)[:, None, None] * 10
+    np.save(frames_path, frames)
+    np.savez(meta_path, frame_index=np.arange(n, dtype=np.int32), timestamps=np.array(timestamps, dtype=np.int64),
+             valid=np.ones(n, dtype=bool), topic="/camera/segmented", source="test.db3")
+    return FrameStore(str(path))
+
+
+def test_video_rate_ignores_duplicated_stamps():
+    stamps = [0, 0, 33_333_333, 33_333_333, 66_666_666, 100_000_000]
+    assert np.isclose(rosbag_vid.video_rate(stamps), 30.0)
+    assert rosbag_vid.video_rate([5, 5, 5]) == rosbag_vid.default_fps
+    assert rosbag_vid.video_rate([5]) == rosbag_vid.default_fps
+
+
+def test_frames_dropped_into_a_written_slot_are_not_counted_as_saved(tmp_path, monkeypatch):
+    # 10 fps, frame 3 shares frame 2's slot and frame 5 comes after a one slot gap
+    stamps = [0, 100_000_000, 200_000_000, 210_000_000, 300_000_000, 500_000_000]
+    store = make_store(tmp_path / "frames", stamps)
+    monkeypatch.setattr(rosbag_vid, "output_video", str(tmp_path / "out.avi"))
+    monkeypatch.setattr(rosbag_vid, "video_fourcc", "MJPG")
+    progress = rosbag_vid.Progress(len(store))
+    rosbag_vid.export_video(store, progress)
+    assert progress.saved == 5 and progress.dropped == 1
+    assert progress.bytes_in == 6 * 64 * 64 * 3
+    # the video holds the 5 saved frames plus one repeat for the gap
+    video = cv2.VideoCapture(str(tmp_path / "out.avi"))
+    assert int(video.get(cv2.CAP_PROP_FRAME_COUNT)) == 6
+    video.release()
+
+
+class MessageBag:
+
+    def __init__(self, n):
+        self.n = n
+
+    def messages(self, topic, start_frame=None, end_frame=None):
+        for i in range(self.n):
+            yield i, i * 33_333_333, bytes(100)
+
+
+def working_export(tasks, results):
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        results.put((task[0], len(task[1]), 10, None))
+
+
+def dying_export(tasks, results):
+    # killed on its third frame, as by the OOM killer
+    import os
+    for _ in range(2):
+        task = tasks.get()
+        results.put((task[0], len(task[1]), 10, None))
+    tasks.get()
+    os._exit(9)
+
+
+def test_parallel_export_finishes(monkeypatch):
+    monkeypatch.setattr(rosbag_vid, "export_worker", working_export)
+    monkeypatch.setattr(rosbag_vid, "workers", 2)
+    progress = rosbag_vid.Progress(40)
+    rosbag_vid.export_parallel(MessageBag(40), progress)
+    assert progress.saved == 40
+
+
+def test_parallel_export_stops_when_a_worker_dies(monkeypatch):
+    monkeypatch.setattr(rosbag_vid, "export_worker", dying_export)
+    monkeypatch.setattr(rosbag_vid, "workers", 2)
+    monkeypatch.setattr(rosbag_vid, "worker_check_period", 0.1)
+    with pytest.raises(SystemExit):
+        rosbag_vid.export_parallel(MessageBag(40), rosbag_vid.Progress(40))
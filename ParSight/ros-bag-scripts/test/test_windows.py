@@ -0,0 +1,77 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from bag_reader import open_bag
+from frame_store import FrameStore, store_paths
+
+# 20 frames 100 ms apart, plus a second topic interleaved so row ids are not frame numbers
+TIMESTAMPS = [1_000_000_000 + k * 100_000_000 for k in range(20)]
+
+
+def make_bag(path, timestamps=TIMESTAMPS):
+    # the rosbag2 sqlite3 layout, every image's payload is its frame number
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE topics (id INTEGER PRIMARY KEY, name TEXT, type TEXT, "
+                 "serialization_format TEXT, offered_qos_profiles TEXT)")
+    conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY, topic_id INTEGER, timestamp INTEGER, data BLOB)")
+    conn.executemany("INSERT INTO topics VALUES (?, ?, ?, 'cdr', '')", [(1, "/camera/image_raw", "sensor_msgs/msg/Image"),
+                                                                       (2, "/drone/pose", "geometry_msgs/msg/PoseStamped")])
+    for k, t in enumerate(timestamps):
+        conn.execute("INSERT INTO messages (topic_id, timestamp, data) VALUES (1, ?, ?)", (t, bytes([k])))
+        conn.execute("INSERT INTO messages (topic_id, timestamp, data) VALUES (2, ?, ?)", (t + 50_000_000, b""))
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def make_store(path, first_frame=0):
+    # a store as build_store writes it, holding bag frames first_frame.. onwards
+    frames_path, meta_path = store_paths(str(path))
+    n = len(TIMESTAMPS) - first_frame
+    np.save(frames_path, np.zeros((n, 4, 4, 3), dtype=np.uint8))
+    np.savez(meta_path, frame_index=np.arange(first_frame, len(TIMESTAMPS), dtype=np.int32),
+             timestamps=np.array(TIMESTAMPS[first_frame:], dtype=np.int64), valid=np.ones(n, dtype=bool),
+             topic="/camera/image_raw", source="test.db3")
+    return FrameStore(str(path))
+
+
+RANGES = [
+    dict(start_frame=5, end_frame=15),
+    dict(start_time=TIMESTAMPS[3], end_time=TIMESTAMPS[9]),
+    dict(start_time=TIMESTAMPS[3] + 1, end_time=TIMESTAMPS[9] - 1),
+    dict(start_frame=5, end_frame=15, start_time=TIMESTAMPS[8], end_time=TIMESTAMPS[18]),
+    dict(start_frame=10, start_time=TIMESTAMPS[2]),
+    dict(end_frame=40),
+    dict(start_frame=12, end_frame=15, end_time=TIMESTAMPS[6]),
+]
+
+
+@pytest.mark.parametrize("ranges", RANGES)
+def test_window_count_matches_the_frames_the_window_yields(tmp_path, ranges):
+    with open_bag(make_bag(tmp_path / "flight.db3")) as bag:
+        frames = [i for i, _, _ in bag.window("/camera/image_raw", **ranges)]
+        assert bag.window_count("/camera/image_raw", **ranges) == len(frames)
+        # frames are numbered over the whole topic, the payload is the frame's own
+        assert [data[0] for _, _, data in bag.window("/camera/image_raw", **ranges)] == frames
+
+
+@pytest.mark.parametrize("ranges", RANGES)
+def test_store_window_matches_the_bag_window(tmp_path, ranges):
+    store = make_store(tmp_path / "frames")
+    with open_bag(make_bag(tmp_path / "flight.db3")) as bag:
+        expected = [i for i, _, _ in bag.window("/camera/image_raw", **ranges)]
+    assert [i for i, _, _ in store.frames(**ranges)] == expected
+    assert len(store.window(**ranges)) == len(expected)
+
+
+def test_store_window_of_a_partial_store(tmp_path):
+    # a store built from a window keeps the bag's frame numbers
+    store = make_store(tmp_path / "frames", first_frame=10)
+    assert list(store.window(start_frame=12, end_frame=14)) == [2, 3, 4]
+    assert list(store.window(start_frame=0, end_frame=11)) == [0, 1]
+    assert list(store.window(start_time=TIMESTAMPS[15], end_time=TIMESTAMPS[15])) == [5]
+    assert list(store.window(start_frame=12, start_time=TIMESTAMPS[16])) == list(range(6, 10))
+    assert len(store.window(start_frame=15, end_frame=12)) == 0
+    assert len(store.window(end_time=TIMESTAMPS[5])) == 0
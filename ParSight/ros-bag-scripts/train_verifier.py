@@ -0,0 +1,160 @@
+import os
+import sys
+import csv
+import cv2
+import numpy as np
+from bag_reader import open_bag, ImageDecoder
+from flight_results import load_results
+from frame_store import FrameStore
+
+# detector and patch descriptor are shared with the onboard node
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parsight"))
+from parsight.color_profiles import load_profiles
+from parsight.detector import ColorBlobDetector
+from parsight.verifier import PATCH_SIZE, CONTEXT, extract_patch, patch_features
+
+# Trains the candidate verifier (parsight/verifier.py) on frames from our rosbags
+# every blob the detector finds becomes a training patch: the blob at the labelled
+# ball position is a positive, every other blob (flags, tees, clothing) a negative
+# labels are a CSV of frame_index, ball_x, ball_y in full frame pixels (the format
+# of ball_distances.csv, or its .npz), a row with an empty ball_x marks a frame without the ball
+# and frames without a row are skipped
+
+# === CONFIG ===
+bag_folder = "/home/jetson/flyrs_ws/rosbag_catapult_working"   # folder containing metadata.yaml and data_0.db3
+image_topic = "/camera/image_raw"       # topic used during flight
+db_file = os.path.join(bag_folder, "rosbag2_2025_04_11-11_16_18_0.db3")
+labels_csv = "ball_labels.csv"
+output_model = "verifier_model.npz"
+frame_store = None              # frames from frame_store.py instead of decoding the bag, e.g. "flight_frames"
+
+color_profile = "red_ball"      # profile the detector runs with
+process_width = 128             # width frames are resized to before detection (as on the drone)
+match_tol = 3.0                 # processing pixels between a blob and the label to count as the ball
+min_recall = 0.98               # threshold is picked to keep at least this many true balls
+l2 = 1e-2                       # weight decay of the logistic regression
+epochs = 500
+learning_rate = 0.5
+seed = 0
+
+
+def load_labels(path):
+    labels = {}
+    # columnar results from rosbag_convert_to_vid.py, NaN marks a frame without the ball
+    if path.endswith(".npz"):
+        results = load_results(path)
+        for i, x, y in zip(results["frame_index"].tolist(), results["ball_x"].tolist(), results["ball_y"].tolist()):
+            labels[i] = None if x != x else (x, y)
+        return labels
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            if row["ball_x"] in ("", "None"):
+                labels[int(row["frame_index"])] = None
+            else:
+                labels[int(row["frame_index"])] = (float(row["ball_x"]), float(row["ball_y"]))
+    return labels
+
+
+def frame_patches(img, label, detector, patch):
+    # (grey patch, is_ball) for every candidate in the frame, mirrored copies included
+    scale = process_width / img.shape[1]
+    small = cv2.resize(img, (process_width, int(round(img.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+    samples = []
+    for center, radius, _, _ in detector.detect(small):
+        is_ball = label is not None and np.hypot(center[0] - label[0] * scale, center[1] - label[1] * scale) <= max(match_tol, radius)
+        gray = cv2.cvtColor(extract_patch(small, center, radius, patch, CONTEXT), cv2.COLOR_BGR2GRAY)
+        samples.append((gray.astype(np.float32), is_ball))
+        samples.append((gray[:, ::-1].astype(np.float32), is_ball))
+    return samples
+
+
+def train_logistic(X, y):
+    # full batch gradient descent on the standardised features
+    mean, std = X.mean(axis=0), X.std(axis=0) + 1e-6
+    Xs = (X - mean) / std
+    # balance the classes, negatives vastly outnumber the ball
+    sample_weight = np.where(y == 1, 0.5 / max(y.mean(), 1e-6), 0.5 / max(1 - y.mean(), 1e-6))
+    weights, bias = np.zeros(X.shape[1]), 0.0
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-(Xs @ weights + bias)))
+        grad = sample_weight * (p - y)
+        weights -= learning_rate * (Xs.T @ grad / len(y) + l2 * weights)
+        bias -= learning_rate * grad.mean()
+    return weights, bias, mean, std
+
+
+def predict(X, weights, bias, mean, std):
+    return 1.0 / (1.0 + np.exp(-(((X - mean) / std) @ weights + bias)))
+
+
+def pick_threshold(p, y):
+    # highest threshold that still keeps min_recall of the balls
+    positives = np.sort(p[y == 1])
+    if len(positives) == 0:
+        return 0.5
+    return float(positives[int(np.floor((1 - min_recall) * len(positives)))])
+
+
+if __name__ == "__main__":
+    labels = load_labels(labels_csv)
+    detector = ColorBlobDetector(load_profiles()[color_profile])
+    patch = np.empty((PATCH_SIZE, PATCH_SIZE, 3), dtype=np.uint8)
+
+    samples, groups = [], []
+
+    def add_frame(i, img):
+        frame_samples = frame_patches(img, labels[i], detector, patch)
+        samples.extend(frame_samples)
+        groups.extend([i] * len(frame_samples))
+
+    if frame_store:
+        # the labelled frames straight out of the mapped store
+        store = FrameStore(frame_store)
+        for i in sorted(labels):
+            k = store.position(i)
+            if k < len(store) and store.frame_index[k] == i and store.valid[k]:
+                add_frame(i, store[k])
+    else:
+        bag = open_bag(db_file)
+        if bag.topic_id(image_topic) is None:
+            print(f"❌ Topic '{image_topic}' not found in rosbag.")
+            exit()
+
+        # only the labelled stretch of the bag is read, and only labelled frames decoded
+        decode = ImageDecoder()
+        for i, timestamp, data in bag.messages(image_topic, start_frame=min(labels), end_frame=max(labels)):
+            if i not in labels:
+                continue
+            try:
+                add_frame(i, decode(data))
+            except Exception as e:
+                print(f"⚠️ Frame {i} error: {e}")
+
+        bag.close()
+
+    if not samples:
+        print("❌ No candidates found in the labelled frames.")
+        exit()
+
+    X = patch_features(np.stack([gray for gray, _ in samples])).astype(np.float64)
+    y = np.array([is_ball for _, is_ball in samples], dtype=np.float64)
+    print(f"{len(y)} patches: {int(y.sum())} ball, {int(len(y) - y.sum())} other")
+
+    # hold out whole frames so mirrored copies never straddle the split
+    frames = np.unique(groups)
+    rng = np.random.default_rng(seed)
+    val_frames = rng.choice(frames, size=max(len(frames) // 5, 1), replace=False)
+    val = np.isin(groups, val_frames)
+
+    weights, bias, mean, std = train_logistic(X[~val], y[~val])
+    threshold = pick_threshold(predict(X[~val], weights, bias, mean, std), y[~val])
+
+    p_val = predict(X[val], weights, bias, mean, std)
+    accepted = p_val >= threshold
+    recall = accepted[y[val] == 1].mean() * 100 if (y[val] == 1).any() else 0
+    fpr = accepted[y[val] == 0].mean() * 100 if (y[val] == 0).any() else 0
+    print(f"Validation: recall {recall:.2f}% | false positives kept {fpr:.2f}% | threshold {threshold:.3f}")
+
+    np.savez(output_model, weights=weights, bias=bias, mean=mean, std=std, threshold=threshold,
+             patch_size=PATCH_SIZE, context=CONTEXT, color_profile=color_profile)
+    print(f"\n✅ Saved verifier to '{output_model}'")